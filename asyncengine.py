@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import random
+import time
+
+from edgedetect import PIRWatcher
+from ledscheduler import fade, flicker
+from errorhandling import SystemState
+
+
+class LoopQueue:
+    """
+    queue.Queue-like put() that hands items from any thread to an asyncio.Queue on a loop.
+    Lets the GPIO callback thread feed PIRWatcher events straight into the event loop.
+    """
+    def __init__(self, loop, queue=None):
+        self.loop = loop
+        self.queue = queue if queue is not None else asyncio.Queue()
+
+    def put(self, item):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class AsyncStateMachine:
+    """
+    asyncio implementation of the IntrusionDetectionSystem state machine. Each state is a
+    coroutine returning the next state, PIR edges arrive through deliver(), and sounds and
+    LED effects (rendered by the shared LEDScheduler) are awaited through their futures.
+    The delays after the unauthorized and warning sounds are cancelled the moment the PIR
+    goes quiet, moving straight to POWERING_DOWN.
+    """
+    def __init__(self, name, gpio, pir_pin, led, sounds, audio,
+                 unauthorized_pause=(0.5, 1), warning_delay=3, alarm_delay=5, journal=None):
+        # name is None for the single-zone system, otherwise it prefixes every status line
+        self.name = name
+        self.gpio = gpio
+        self.pir_pin = pir_pin
+        self.led = led
+        self.sounds = sounds
+        self.audio = audio
+        self.unauthorized_pause = unauthorized_pause
+        self.warning_delay = warning_delay
+        self.alarm_delay = alarm_delay
+        self.journal = journal
+        self.state = SystemState.STANDBY
+        self.present = False
+        self.armed = True
+        self.motion_detected_at = None
+        self._armed = None
+        self._handler_task = None
+        self._interrupted = False
+        self._occupied = None
+        self._vacated = None
+        # Called as listener(machine, old_state, new_state) on the loop after every transition
+        self.listeners = []
+        self._handlers = {
+            SystemState.STANDBY: self.handle_standby,
+            SystemState.POWERING_ON: self.handle_powering_on,
+            SystemState.UNAUTHORIZED: self.handle_unauthorized,
+            SystemState.WARNING: self.handle_warning,
+            SystemState.ALARM: self.handle_alarm,
+            SystemState.POWERING_DOWN: self.power_down_sequence,
+        }
+
+    @classmethod
+    def from_system(cls, system):
+        return cls(None, system.gpio, system.PIR_PIN, system.led, system.sounds, system.audio,
+                   system.unauthorized_pause, system.warning_delay, system.alarm_delay, system.journal)
+
+    def deliver(self, event):
+        """
+        Feeds a PIR or voice command SensorEvent to the machine. Must be called on the loop thread.
+        """
+        if event.kind == 'motion':
+            self._set_presence(event.value, event.timestamp)
+        elif event.value == 'disarm' and self.armed:
+            self._log('Voice command: sentry mode disarmed')
+            self.armed = False
+            self._armed.clear()
+            # Abandon an escalation in progress, run() moves on to POWERING_DOWN
+            if self.state not in (SystemState.STANDBY, SystemState.POWERING_DOWN) and self._handler_task:
+                self._interrupted = True
+                self._handler_task.cancel()
+        elif event.value == 'arm' and not self.armed:
+            self._log('Voice command: sentry mode armed')
+            self.armed = True
+            self._armed.set()
+
+    def _set_presence(self, present, timestamp=None):
+        self.present = present
+        if present:
+            self._vacated.clear()
+            self._occupied.set()
+            if self.state == SystemState.STANDBY:
+                self.motion_detected_at = timestamp
+        else:
+            self._occupied.clear()
+            self._vacated.set()
+
+    def _log(self, message):
+        if self.name is not None:
+            message = f"[{self.name}] {message}"
+        if self.journal is not None:
+            self.journal.status(message, zone=self.name, state=self.state.name)
+        else:
+            logging.info(message)
+            print(f"Status: {message}")
+
+    def _record(self, event, **fields):
+        if self.journal is not None:
+            self.journal.record(event, zone=self.name, **fields)
+
+    async def run(self):
+        self._occupied = asyncio.Event()
+        self._vacated = asyncio.Event()
+        self._armed = asyncio.Event()
+        if self.armed:
+            self._armed.set()
+        self._set_presence(bool(self.gpio.input(self.pir_pin)), time.monotonic())
+        while True:
+            old_state = self.state
+            self._handler_task = asyncio.ensure_future(self._handlers[old_state]())
+            try:
+                self.state = await self._handler_task
+            except asyncio.CancelledError:
+                if not self._interrupted:
+                    raise
+                self._interrupted = False
+                self.state = SystemState.POWERING_DOWN
+            if self.state != old_state:
+                self._record('state', state=self.state.name, previous=old_state.name)
+            for listener in self.listeners:
+                listener(self, old_state, self.state)
+
+    async def play(self, file_path):
+        playback = self.audio.play(file_path)
+        self._record('sound', state=self.state.name, path=file_path)
+        completed = await asyncio.wrap_future(playback.future)
+        self._record('sound_end', path=file_path, completed=completed,
+                     duration=round((playback.finished_at or playback.started_at) - playback.started_at, 3))
+        return completed
+
+    async def hold(self, delay):
+        """
+        Waits up to delay seconds and returns True if the intruder is still there at the
+        end, or False as soon as the PIR goes quiet.
+        """
+        if not self.present:
+            return False
+        try:
+            await asyncio.wait_for(self._vacated.wait(), delay)
+            return False
+        except asyncio.TimeoutError:
+            # An edge inside the bouncetime is never reported, so confirm with the pin itself
+            return self._read_pin()
+
+    async def show(self, effect):
+        # Playing a new effect on the channel preempts whatever it was showing
+        return await asyncio.wrap_future(self.led.play(effect))
+
+    def _read_pin(self):
+        present = bool(self.gpio.input(self.pir_pin))
+        if present != self.present:
+            self._set_presence(present, time.monotonic())
+        return present
+
+    async def handle_standby(self):
+        while True:
+            await self._armed.wait()
+            await self._occupied.wait()
+            if self.armed and self._read_pin():
+                return SystemState.POWERING_ON
+
+    async def handle_powering_on(self):
+        self._log('Motion detected, system powering on')
+        await asyncio.gather(self.show(flicker(2, 100)), self.play(self.sounds['power_on']))
+        return SystemState.UNAUTHORIZED
+
+    async def handle_unauthorized(self):
+        await asyncio.sleep(random.uniform(*self.unauthorized_pause))
+        await self.play(random.choice(self.sounds['unauthorized']))
+        if await self.hold(self.warning_delay):
+            return SystemState.WARNING
+        return SystemState.POWERING_DOWN
+
+    async def handle_warning(self):
+        self._log('Movement still detected, playing warning')
+        await self.play(random.choice(self.sounds['warning']))
+        if await self.hold(self.alarm_delay):
+            return SystemState.ALARM
+        return SystemState.POWERING_DOWN
+
+    async def handle_alarm(self):
+        self._log('Intruder refuses to leave, triggering alarm')
+        await self.play(self.sounds['alarm'])
+        return SystemState.POWERING_DOWN
+
+    async def power_down_sequence(self):
+        self._log('No movement detected, powering down')
+        duration = self.audio.sound_bank.duration(self.sounds['power_down'])
+        await asyncio.gather(self.show(fade(duration)), self.play(self.sounds['power_down']))
+        return SystemState.STANDBY
+
+
+class SensorDispatcher:
+    """
+    One PIR interrupt watcher per machine, all feeding a single queue on the event loop
+    that routes each edge to the machine owning that pin. Voice commands put on the same
+    queue go to every machine.
+    """
+    def __init__(self, gpio, bouncetime=50):
+        self.gpio = gpio
+        self.bouncetime = bouncetime
+        self.machines = {}
+        self.watchers = []
+        self.events = None
+
+    def add(self, machine):
+        self.machines[machine.pir_pin] = machine
+
+    async def run(self):
+        self.events = LoopQueue(asyncio.get_running_loop())
+        for pin in self.machines:
+            watcher = PIRWatcher(self.gpio, pin, events=self.events, bouncetime=self.bouncetime)
+            watcher.start()
+            self.watchers.append(watcher)
+        try:
+            while True:
+                event = await self.events.get()
+                if event.kind == 'command':
+                    for machine in self.machines.values():
+                        machine.deliver(event)
+                else:
+                    self.machines[event.source].deliver(event)
+        finally:
+            for watcher in self.watchers:
+                watcher.stop()
+            self.watchers = []
+
+
+async def run_machines(machines, gpio, bouncetime=50, voice=None):
+    """
+    Runs AsyncStateMachines side by side on the current loop, sharing one SensorDispatcher.
+    A voicepipeline.VoicePipeline, if given, delivers its commands through the dispatcher.
+    """
+    dispatcher = SensorDispatcher(gpio, bouncetime)
+    for machine in machines:
+        dispatcher.add(machine)
+    dispatch_task = asyncio.ensure_future(dispatcher.run())
+    # Let the dispatcher arm the PIR interrupts before the machines read their pins
+    await asyncio.sleep(0)
+    if voice is not None:
+        voice.events = dispatcher.events
+        voice.start()
+    try:
+        await asyncio.gather(*(machine.run() for machine in machines))
+    finally:
+        if voice is not None:
+            voice.stop()
+        dispatch_task.cancel()
+        await asyncio.gather(dispatch_task, return_exceptions=True)
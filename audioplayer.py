@@ -0,0 +1,215 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent import futures
+
+import pygame
+
+from audiopriority import PriorityLanes
+
+# How often a channel still busy past its sound's length is checked again: the mixer
+# drains its last buffer or a fade-out runs on
+END_RECHECK = 0.005
+
+
+class PlaybackHandle:
+    """
+    Returned by AudioPlayer.play() as soon as a sound starts. Resolves to True when the
+    sound plays to the end and False when it is stopped or could not be played.
+    """
+    def __init__(self, path, channel=None):
+        self.path = path
+        self.channel = channel
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.stopped = False
+        self.future = futures.Future()
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until playback ends. Returns the playback result, or None on timeout.
+        """
+        try:
+            return self.future.result(timeout)
+        except futures.TimeoutError:
+            return None
+
+    def add_done_callback(self, fn):
+        """
+        Calls fn(handle) once playback ends, straight away if it already has.
+        """
+        self.future.add_done_callback(lambda future: fn(self))
+
+    def stop(self):
+        if self.channel is not None and not self.done():
+            self.stopped = True
+            self.channel.stop()
+
+    def _finish(self, completed):
+        if not self.future.done():
+            self.finished_at = time.monotonic()
+            self.future.set_result(completed)
+
+
+class _MixerChannel:
+    """
+    The mixer channel a PlaybackHandle plays on. Stopping or fading it out also moves the
+    player's end timer for it, so the handle resolves as soon as the channel goes quiet.
+    """
+    def __init__(self, player, index):
+        self.player = player
+        self.index = index
+
+    def get_busy(self):
+        return self.player.channels[self.index].get_busy()
+
+    def stop(self):
+        self.player.channels[self.index].stop()
+        self.player._end_at(self.index, time.monotonic())
+
+    def fadeout(self, ms):
+        self.player.channels[self.index].fadeout(ms)
+        self.player._end_at(self.index, time.monotonic() + ms / 1000)
+
+
+class AudioPlayer:
+    """
+    Non-blocking sound playback on top of the pygame mixer. Each sound's length is known
+    when it starts, so a dispatcher thread sleeps on a condition until the first sound is
+    due to end and resolves its PlaybackHandle once the channel is quiet. With nothing
+    playing it waits without a timeout and uses no CPU; SDL's event queue, which the dummy
+    video driver polls, is not used. Sounds played with a priority follow the rules in
+    audiopriority.PriorityLanes.
+    """
+    def __init__(self, sound_bank, num_channels=None):
+        self.sound_bank = sound_bank
+        self.num_channels = num_channels
+        self.lanes = PriorityLanes()
+        self.channels = []
+        self._playing = {}
+        # (when, tiebreak, channel index, handle) for every end to check, earliest first
+        self._ends = []
+        self._order = itertools.count()
+        # Reentrant: a preemption inside play() moves the end timers of the sounds it stops
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._dispatcher = None
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        if self.num_channels is not None:
+            pygame.mixer.set_num_channels(self.num_channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(pygame.mixer.get_num_channels())]
+        self._running = True
+        self._dispatcher = threading.Thread(target=self._dispatch, name='audio-events', daemon=True)
+        self._dispatcher.start()
+
+    def stop(self):
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+            playing = list(self._playing.values())
+        for handle in playing:
+            handle.stop()
+            handle._finish(False)
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout=1)
+            self._dispatcher = None
+
+    def play(self, path, priority=None, layer=False, fade_ms=0):
+        """
+        Starts playing path on a free channel and returns its PlaybackHandle immediately.
+        With a priority, the sounds it preempts are stopped in the same mixer lock as it
+        starts, so it cuts in within one audio buffer. fade_ms crossfades instead: the
+        preempted sounds fade out while this one fades in.
+        """
+        handle = PlaybackHandle(path)
+        try:
+            sound = self.sound_bank.get(path)
+        except (pygame.error, FileNotFoundError) as e:
+            logging.error(f"Failed to play sound {path}: {e}")
+            handle._finish(False)
+            return handle
+        with self._lock:
+            if priority is not None:
+                victims = self.lanes.admit(priority, layer)
+                if victims is None:
+                    logging.info(f"Not playing {path}, a higher priority sound is playing")
+                    handle._finish(False)
+                    return handle
+                for victim in victims:
+                    self._preempt(victim, fade_ms)
+                self.lanes.add(handle, priority, layer)
+            index = self._free_channel()
+            previous = self._playing.get(index)
+            cut_off = self.channels[index].get_busy()
+            handle.channel = _MixerChannel(self, index)
+            self._playing[index] = handle
+            self.channels[index].play(sound, fade_ms=fade_ms)
+            self._end_at(index, handle.started_at + sound.get_length())
+        if previous is not None:
+            # Either its end timer has not fired yet or every channel was busy and the
+            # oldest sound was cut off to make room
+            previous._finish(not cut_off and not previous.stopped)
+        return handle
+
+    def _preempt(self, handle, fade_ms):
+        if handle.channel is None or handle.done():
+            return
+        handle.stopped = True
+        if fade_ms:
+            # Keeps its channel until the fade ends, the new sound takes another one
+            handle.channel.fadeout(fade_ms)
+        else:
+            handle.channel.stop()
+
+    def _free_channel(self):
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return index
+        if not self._playing:
+            return 0
+        return min(self._playing, key=lambda index: self._playing[index].started_at)
+
+    def _end_at(self, index, when):
+        # Checks whether the sound on channel index is over at when
+        with self._wakeup:
+            handle = self._playing.get(index)
+            if handle is None:
+                return
+            entry = (when, next(self._order), index, handle)
+            heapq.heappush(self._ends, entry)
+            if self._ends[0] is entry:
+                self._wakeup.notify()
+
+    def _dispatch(self):
+        while True:
+            with self._wakeup:
+                handle = None
+                while self._running and handle is None:
+                    if not self._ends:
+                        self._wakeup.wait()
+                        continue
+                    when, _, index, expected = self._ends[0]
+                    delay = when - time.monotonic()
+                    if delay > 0:
+                        self._wakeup.wait(delay)
+                        continue
+                    heapq.heappop(self._ends)
+                    # A timer of a sound since replaced on this channel, or already resolved
+                    if self._playing.get(index) is not expected:
+                        continue
+                    if self.channels[index].get_busy():
+                        heapq.heappush(self._ends, (time.monotonic() + END_RECHECK, next(self._order), index, expected))
+                        continue
+                    handle = self._playing.pop(index)
+                if not self._running:
+                    return
+            handle._finish(not handle.stopped)
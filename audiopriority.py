@@ -0,0 +1,47 @@
+import threading
+
+# Higher ranks cut in over lower ones; sounds played without a priority sit outside the rules
+PRIORITIES = {'ambient': 0, 'unauthorized': 1, 'warning': 2, 'alarm': 3}
+
+
+class PriorityLanes:
+    """
+    Tracks the prioritised sounds that are playing and decides what a new one does to
+    them. A foreground sound preempts every sound of its own or a lower priority, and is
+    itself dropped while a higher-priority foreground sound plays. A layered sound, such as
+    a voice line over an alarm bed, plays alongside whatever is on and preempts nothing,
+    but is preempted like any other sound of its priority.
+    """
+    def __init__(self):
+        self.preempted = 0
+        self.suppressed = 0
+        self._playing = {}
+        self._lock = threading.Lock()
+
+    def admit(self, priority, layer=False):
+        """
+        Returns the handles a new sound of priority preempts, or None if it must not play.
+        """
+        rank = PRIORITIES[priority]
+        with self._lock:
+            playing = [(handle, entry) for handle, entry in self._playing.items() if not handle.done()]
+        if layer:
+            return []
+        if any(other > rank and not layered for _, (other, layered) in playing):
+            self.suppressed += 1
+            return None
+        victims = [handle for handle, (other, _) in playing if other <= rank]
+        self.preempted += len(victims)
+        return victims
+
+    def add(self, handle, priority, layer=False):
+        with self._lock:
+            self._playing[handle] = (PRIORITIES[priority], layer)
+        handle.add_done_callback(self._remove)
+
+    def stats(self):
+        return {'preempted': self.preempted, 'suppressed': self.suppressed}
+
+    def _remove(self, handle):
+        with self._lock:
+            self._playing.pop(handle, None)
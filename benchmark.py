@@ -0,0 +1,1109 @@
+"""
+Benchmarks for the sentry state machine, run against the fake GPIO backend so they work
+on any Linux box. Usage: python benchmark.py <benchmark> [options]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+# No sound card or display is needed for benchmarking
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from fakegpio import FakeGPIO  # noqa: E402
+
+
+def make_system(**overrides):
+    """
+    Builds an IntrusionDetectionSystem on a FakeGPIO from config.json plus overrides.
+    """
+    from errorhandling import IntrusionDetectionSystem
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')) as f:
+        config = json.load(f)
+    # Systems here are never shut down, a snapshot would resume one run's state in the next
+    config['state_snapshot'] = None
+    config.update(overrides)
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(config, f)
+    try:
+        gpio = FakeGPIO()
+        return IntrusionDetectionSystem(f.name, gpio=gpio), gpio
+    finally:
+        os.unlink(f.name)
+
+
+def write_sounds(directory, length=0.05):
+    """
+    Writes short silent WAVs for every sound slot and returns a config "sounds" mapping.
+    """
+    sounds = {}
+    for name in ('power_on', 'unauthorized', 'warning', 'alarm', 'power_down'):
+        path = os.path.join(directory, f"{name}.wav")
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(22050)
+            f.writeframes(b'\0\0' * int(22050 * length))
+        sounds[name] = [path] if name in ('unauthorized', 'warning') else path
+    return sounds
+
+
+def report(name, samples, unit='ms', scale=1000):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name}: n={len(samples)} min={samples[0] * scale:.3f}{unit} "
+          f"median={statistics.median(samples) * scale:.3f}{unit} "
+          f"p99={p99 * scale:.3f}{unit} max={samples[-1] * scale:.3f}{unit}")
+
+
+def run_until_cancelled(loop, task):
+    try:
+        loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        pass
+
+
+def run_standby(system, reacted=None):
+    from errorhandling import SystemState
+    while system.state == SystemState.STANDBY:
+        system.handle_standby()
+    if reacted is not None:
+        reacted.append(time.monotonic())
+
+
+def bench_pir_latency(args):
+    """
+    Motion-to-reaction latency of handle_standby: time from a PIR edge being injected to
+    the state machine leaving STANDBY, plus CPU burned while idle in STANDBY.
+    """
+    from errorhandling import SystemState
+    system, gpio = make_system(detection_mode=args.mode)
+    latencies = []
+    for _ in range(args.iterations):
+        system.state = SystemState.STANDBY
+        gpio.set_input(system.PIR_PIN, gpio.LOW)
+        reacted = []
+        worker = threading.Thread(target=run_standby, args=(system, reacted))
+        worker.start()
+        time.sleep(args.idle)
+        injected = time.monotonic()
+        gpio.inject_edge(system.PIR_PIN)
+        worker.join()
+        latencies.append(reacted[0] - injected)
+    report(f"pir-latency ({args.mode})", latencies)
+
+    # CPU used by a standby wait with no motion at all
+    system.state = SystemState.STANDBY
+    gpio.set_input(system.PIR_PIN, gpio.LOW)
+    worker = threading.Thread(target=run_standby, args=(system,))
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    worker.start()
+    time.sleep(args.idle_window)
+    cpu_used = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+    gpio.inject_edge(system.PIR_PIN)
+    worker.join()
+    print(f"pir-idle-cpu ({args.mode}): {100 * cpu_used / wall:.2f}% of one core over {wall:.1f}s")
+
+
+def bench_zones(args):
+    """
+    CPU use and motion-to-reaction latency of ZoneManager as the number of zones grows.
+    Every round raises the PIR in all zones at once, waits for each to react, then clears them.
+    """
+    from errorhandling import SystemState
+    from zones import ZoneManager
+    with tempfile.TemporaryDirectory() as directory:
+        sounds = write_sounds(directory)
+        for count in args.zones:
+            config = {
+                'pir_pin': 0, 'led_pin': 0, 'sounds': sounds,
+                'unauthorized_pause': [0, 0], 'warning_delay': 0.05, 'alarm_delay': 0.05,
+                'zones': [{'name': f"z{i}", 'pir_pin': 100 + i, 'led_pin': 1000 + i} for i in range(count)],
+                'journal': {'path': os.path.join(directory, 'events.jsonl'), 'text_log': False},
+            }
+            config_file = os.path.join(directory, 'zones.json')
+            with open(config_file, 'w') as f:
+                json.dump(config, f)
+            gpio = FakeGPIO()
+            manager = ZoneManager(config_file, gpio=gpio)
+            reacted = {}
+
+            def on_transition(machine, old_state, new_state):
+                if new_state == SystemState.POWERING_ON:
+                    reacted[machine.pir_pin] = time.monotonic()
+
+            for machine in manager.machines:
+                machine.listeners.append(on_transition)
+            loop = asyncio.new_event_loop()
+            runner = loop.create_task(manager.run_async())
+            worker = threading.Thread(target=run_until_cancelled, args=(loop, runner), daemon=True)
+            worker.start()
+            time.sleep(0.2)
+
+            cpu_start, wall_start = time.process_time(), time.monotonic()
+            time.sleep(args.idle_window)
+            idle_cpu = (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+
+            latencies = []
+            cpu_start, wall_start = time.process_time(), time.monotonic()
+            for _ in range(args.rounds):
+                reacted.clear()
+                injected = {}
+                for machine in manager.machines:
+                    injected[machine.pir_pin] = time.monotonic()
+                    gpio.inject_edge(machine.pir_pin)
+                while len(reacted) < count:
+                    time.sleep(0.001)
+                latencies.extend(reacted[pin] - injected[pin] for pin in injected)
+                # Stay clear of the PIR bouncetime between edges on the same pin
+                time.sleep(0.1)
+                for machine in manager.machines:
+                    gpio.inject_edge(machine.pir_pin, rising=False)
+                while any(machine.state != SystemState.STANDBY for machine in manager.machines):
+                    time.sleep(0.01)
+                time.sleep(0.1)
+            busy_cpu = (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+
+            loop.call_soon_threadsafe(runner.cancel)
+            worker.join()
+            manager.shutdown()
+            report(f"zones={count} reaction", latencies)
+            print(f"zones={count} cpu: idle={100 * idle_cpu:.2f}% busy={100 * busy_cpu:.2f}% of one core, "
+                  f"threads={threading.active_count()}")
+
+
+def bench_leds(args):
+    """
+    Frame jitter, GPIO writes saved and CPU of the LED scheduler driving a mix of
+    flicker, fade and pulse effects on several channels at once.
+    """
+    import ledscheduler
+    gpio = FakeGPIO()
+    scheduler = ledscheduler.LEDScheduler(args.fps)
+    channels = [scheduler.add_channel(f"led{i}", gpio.PWM(i, 100)) for i in range(args.channels)]
+    scheduler.start()
+    effects = [
+        lambda: ledscheduler.flicker(2, fps=args.fps),
+        lambda: ledscheduler.fade(3, fps=args.fps),
+        lambda: ledscheduler.pulse(3, fps=args.fps),
+    ]
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    pending = [channel.play(effects[i % len(effects)]()) for i, channel in enumerate(channels)]
+    for future in pending:
+        future.result()
+    cpu = (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+    scheduler.stop()
+    stats = scheduler.stats()
+    print(f"leds channels={args.channels} fps={args.fps}: frames={stats['frames']} writes={stats['writes']} "
+          f"saved={stats['writes_saved']} jitter mean={stats['jitter_mean_ms']:.3f}ms max={stats['jitter_max_ms']:.3f}ms "
+          f"cpu={100 * cpu:.2f}% of one core")
+
+
+def bench_rgb(args):
+    """
+    GPIO writes made by RGBLed for a power-on flicker, a state color and a power-down
+    fade, against the three writes per frame the module-level set_led_color always made.
+    """
+    import rgbpipeline
+    gpio = FakeGPIO()
+    led = rgbpipeline.RGBLed(*(gpio.PWM(pin, 100) for pin in (17, 22, 24)))
+    effects = [
+        rgbpipeline.rgb_flicker(2, (100, 100, 0), fps=args.fps),
+        rgbpipeline.rgb_solid((100, 0, 0)),
+        rgbpipeline.rgb_fade(3, (100, 0, 0), fps=args.fps),
+    ]
+    frames = 0
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    for effect in effects:
+        led.play(effect)
+        frames += len(effect.frames)
+    cpu = (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+    print(f"rgb fps={args.fps}: frames={frames} gpio writes={led.writes} (naive {3 * frames}) "
+          f"saved={led.writes_saved} cpu={100 * cpu:.2f}% of one core")
+
+
+def bench_keywords(args):
+    """
+    Streams recorded WAV fixtures (16 kHz, 16-bit mono) through the offline KeywordSpotter
+    frame by frame. Reports where each phrase was detected, how long the frame completing
+    it took to decode, and CPU seconds spent per second of audio.
+    """
+    from keywordspot import FRAME_SAMPLES, SAMPLE_RATE, KeywordSpotter
+    spotter = KeywordSpotter(args.model)
+    for path in args.wav:
+        with wave.open(path, 'rb') as f:
+            if (f.getframerate(), f.getsampwidth(), f.getnchannels()) != (SAMPLE_RATE, 2, 1):
+                raise SystemExit(f"{path}: fixtures must be {SAMPLE_RATE} Hz 16-bit mono")
+            audio = f.readframes(f.getnframes())
+        spotter.reset()
+        spotter.samples_seen = 0
+        frame_times = []
+        detections = []
+        cpu_start = time.process_time()
+        for offset in range(0, len(audio), FRAME_SAMPLES * 2):
+            started = time.perf_counter()
+            detection = spotter.process(audio[offset:offset + FRAME_SAMPLES * 2])
+            frame_times.append(time.perf_counter() - started)
+            if detection is not None:
+                detections.append((detection, frame_times[-1]))
+        cpu = time.process_time() - cpu_start
+        seconds = len(audio) / 2 / SAMPLE_RATE
+        print(f"{path}: {seconds:.1f}s audio, cpu={cpu / seconds:.3f}s per audio second")
+        report(f"{path} frame decode", frame_times)
+        for detection, decode_time in detections:
+            print(f"  '{detection.phrase}' -> {detection.command} at {detection.audio_time:.2f}s, "
+                  f"reported {1000 * decode_time:.1f}ms after its last frame arrived")
+
+
+def bench_filter(args):
+    """
+    Throughput of the vectorized PIR filters (pirfilter.py) on a synthetic signal with
+    real visits, sub-window glitches and dropouts: samples filtered per CPU second on one
+    core, and how many false onsets each filter lets through compared with the raw pin.
+    Then the live sampler thread at --rate on a FakeGPIO, checked against --budget.
+    """
+    import numpy as np
+    from pirfilter import METHODS, PIRFilter, PresenceFilter
+    rng = np.random.default_rng(args.seed)
+    window = int(args.window * args.rate)
+    truth = np.zeros(args.samples, np.uint8)
+    for start in rng.integers(0, args.samples, args.samples // (args.rate * 60)):
+        truth[start:start + int(rng.uniform(2, 30) * args.rate)] = 1
+    signal = truth.copy()
+    glitches = rng.integers(0, args.samples, args.samples // (args.rate * 10))
+    for start in glitches:
+        # A blip well inside the window: on when the room is empty, off while someone is there
+        signal[start:start + max(1, window // 5)] ^= 1
+
+    def onsets(levels):
+        levels = levels.astype(np.int8)
+        return int(np.count_nonzero(np.diff(levels) == 1))
+
+    print(f"filter: {args.samples} samples at {args.rate} Hz ({args.samples / args.rate / 3600:.1f}h), "
+          f"window {window} samples, {onsets(truth)} real visits, {glitches.size} glitches, "
+          f"raw pin onsets={onsets(signal)}")
+    for method in METHODS:
+        presence_filter = PresenceFilter(method, window)
+        output = np.empty(args.samples, bool)
+        cpu_start = time.process_time()
+        for offset in range(0, args.samples, args.block):
+            output[offset:offset + args.block] = presence_filter.process(signal[offset:offset + args.block])[0]
+        cpu = time.process_time() - cpu_start
+        print(f"  {method}: {args.samples / cpu / 1e6:.1f}M samples/s per core, onsets={onsets(output)}, "
+              f"samples disagreeing with truth={100 * np.count_nonzero(output != truth) / args.samples:.2f}%")
+
+    gpio = FakeGPIO()
+    pir_filter = PIRFilter(gpio, 27, rate=args.rate, window=args.window)
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    pir_filter.start()
+    time.sleep(args.live)
+    pir_filter.stop()
+    cpu = (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+    wall = time.monotonic() - wall_start
+    verdict = 'within' if 100 * cpu <= args.budget else 'OVER'
+    print(f"  live sampler at {args.rate} Hz: {pir_filter.samples / wall:.0f} samples/s, "
+          f"cpu={100 * cpu:.2f}% of one core, {verdict} the {args.budget:g}% budget")
+    if verdict == 'OVER':
+        raise SystemExit(1)
+
+
+# Runs in a fresh interpreter so imports are timed too; argv is the launch time on the
+# parent's monotonic clock (system-wide on Linux) and the config file
+STARTUP_PROBE = '''
+import json, os, sys, time
+launched = float(sys.argv[1])
+from fakegpio import FakeGPIO
+from errorhandling import IntrusionDetectionSystem
+system = IntrusionDetectionSystem(sys.argv[2], gpio=FakeGPIO())
+armed = time.monotonic() - launched
+system.warmed_up.wait()
+ready = time.monotonic() - launched
+print(json.dumps({'armed': armed, 'ready': ready, 'phases': system.profile.report()}))
+sys.stdout.flush()
+os._exit(0)
+'''
+
+
+# The daemon with a fake PIR that reports an intruder who never leaves; argv is the config file
+INTRUDER_PROBE = '''
+import sys
+from fakegpio import FakeGPIO
+from errorhandling import IntrusionDetectionSystem
+gpio = FakeGPIO()
+system = IntrusionDetectionSystem(sys.argv[1], gpio=gpio)
+gpio.set_input(system.PIR_PIN, 1)
+system.run()
+'''
+
+
+def _wait_for_event(journal, match, since=0.0, timeout=30.0):
+    # Polls the journal file for the first event after since for which match(event) is true
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(journal) as f:
+                for line in f:
+                    event = json.loads(line)
+                    if event['ts'] >= since and match(event):
+                        return event
+        except (FileNotFoundError, ValueError):
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"no matching event in {journal}")
+
+
+def bench_shutdown(args):
+    """
+    SIGTERM in the middle of a warning, with the power-down played through (no deadline)
+    and with each --deadlines value: time from the signal to the process exiting. Then
+    SIGKILL in the middle of an alarm and a restart: time from relaunch to the alarm
+    resumed from the state snapshot, and to the alarm sound playing again, imports included.
+    """
+    import timeit
+    from statesnapshot import StateSnapshot
+    root = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        sounds = write_sounds(directory, args.sound_length)
+        journal = os.path.join(directory, 'events.jsonl')
+        config = {
+            'pir_pin': 27, 'led_pin': 17, 'detection_mode': 'poll', 'sounds': sounds, 'config_reload': False,
+            'unauthorized_pause': [0, 0], 'warning_delay': 0.2, 'alarm_delay': 0.2,
+            'journal': {'path': journal, 'text_log': False},
+            'state_snapshot': os.path.join(directory, 'state.snap'),
+        }
+
+        probes = []
+
+        def launch(deadline):
+            config_file = os.path.join(directory, 'config.json')
+            with open(config_file, 'w') as f:
+                json.dump(dict(config, shutdown_deadline=deadline), f)
+            probe = subprocess.Popen([sys.executable, '-c', INTRUDER_PROBE, config_file], cwd=directory,
+                                     env=dict(os.environ, PYTHONPATH=root), stdout=subprocess.DEVNULL)
+            probes.append(probe)
+            return probe
+
+        try:
+            for deadline in [None] + args.deadlines:
+                exits = []
+                for _ in range(args.runs):
+                    launched = time.time()
+                    process = launch(deadline)
+                    _wait_for_event(journal, lambda e: e['event'] == 'sound' and e['state'] == 'WARNING', launched)
+                    signalled = time.monotonic()
+                    process.terminate()
+                    process.wait()
+                    exits.append(time.monotonic() - signalled)
+                report(f"shutdown_deadline={deadline} SIGTERM->exit", exits, 's', 1)
+
+            resumed, alarmed = [], []
+            for _ in range(args.runs):
+                # Timed from this launch: the previous relaunch played an alarm sound of its own
+                started = time.time()
+                process = launch(args.deadlines[0] if args.deadlines else None)
+                _wait_for_event(journal, lambda e: e['event'] == 'sound' and e['state'] == 'ALARM', started)
+                process.kill()
+                process.wait()
+                launched = time.time()
+                process = launch(args.deadlines[0] if args.deadlines else None)
+                resume = _wait_for_event(journal, lambda e: e['event'] == 'resume', launched)
+                alarm = _wait_for_event(journal, lambda e: e['event'] == 'sound' and e['state'] == 'ALARM', launched)
+                process.terminate()
+                process.wait()
+                resumed.append(resume['ts'] - launched)
+                alarmed.append(alarm['ts'] - launched)
+            report("SIGKILL mid-alarm, relaunch->resumed ALARM", resumed)
+            report("SIGKILL mid-alarm, relaunch->alarm sound", alarmed)
+        finally:
+            # A probe left behind by a failed wait would keep its intruder going forever
+            for probe in probes:
+                if probe.poll() is None:
+                    probe.kill()
+                    probe.wait()
+
+        snapshot = StateSnapshot(os.path.join(directory, 'bench.snap'))
+        snapshot.open()
+        save = min(timeit.repeat(lambda: snapshot.save(state='ALARM', armed=True, incident_started=time.time(),
+                                                       saved=time.time(), pid=1), number=10_000, repeat=5)) / 10_000
+        snapshot.close()
+        load = min(timeit.repeat(lambda: StateSnapshot(os.path.join(directory, 'bench.snap')).open(),
+                                 number=1000, repeat=5)) / 1000
+        print(f"state snapshot: save={save * 1e6:.1f}us, open and load={load * 1e6:.1f}us")
+
+
+def bench_startup(args):
+    """
+    Time from launching the daemon to armed (PIR watched) and to ready (mixer, sounds
+    decoded and audio player up), for the default eager startup and "startup": "fast".
+    Each run is a fresh interpreter, so import time counts.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        sounds = write_sounds(directory, args.sound_length)
+        for mode in args.modes:
+            config = {
+                'pir_pin': 27, 'led_pin': 17, 'detection_mode': 'edge', 'sounds': sounds, 'startup': mode,
+                'journal': {'path': os.path.join(directory, 'events.jsonl'), 'text_log': False}, 'state_snapshot': None,
+            }
+            config_file = os.path.join(directory, f"{mode}.json")
+            with open(config_file, 'w') as f:
+                json.dump(config, f)
+            armed, ready = [], []
+            for _ in range(args.runs):
+                launched = time.monotonic()
+                # Run from the temporary directory so the probe's intrusion_log.log lands there
+                output = subprocess.run([sys.executable, '-c', STARTUP_PROBE, str(launched), config_file],
+                                        cwd=directory, env=dict(os.environ, PYTHONPATH=root),
+                                        capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                armed.append(result['armed'])
+                ready.append(result['ready'])
+            report(f"startup={mode} armed", armed)
+            report(f"startup={mode} ready", ready)
+            print(f"  last run: {result['phases']}")
+
+
+def _hog():
+    while True:
+        pass
+
+
+def _step_until_stopped(system):
+    while not system.stopped:
+        system.step()
+
+
+def _keep_decoding(sound_bank, path, stop):
+    # Rewrites path's mtime so every refresh decodes it again, wherever the sound bank lives
+    while not stop.is_set():
+        os.utime(path)
+        sound_bank.refresh([path])
+
+
+def _wait_until(predicate, timeout, what, interval=0.005):
+    # Polls predicate() until it is true; a trial that never gets there fails instead of hanging
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{what} not within {timeout:g}s")
+        time.sleep(interval)
+
+
+def _motion_trials(system, gpio, trials, idle, timeout=10.0):
+    """
+    Raises the PIR trials times and returns the seconds from each edge to the power-on
+    sound starting on the mixer. The state machine runs on its own thread meanwhile.
+    Raises TimeoutError if a trial takes longer than timeout seconds.
+    """
+    from errorhandling import SystemState
+    playbacks = []
+    play_sound_async = system.play_sound_async
+
+    def recording(path, *args, **kwargs):
+        playback = play_sound_async(path, *args, **kwargs)
+        playbacks.append(playback)
+        return playback
+    system.play_sound_async = recording
+
+    latencies = []
+    try:
+        for _ in range(trials):
+            _wait_until(lambda: system.state == SystemState.STANDBY, timeout, "back in STANDBY", 0.01)
+            time.sleep(idle)
+            del playbacks[:]
+            raised = time.monotonic()
+            gpio.set_input(system.PIR_PIN, True)
+            _wait_until(lambda: playbacks and playbacks[0].done(), timeout, "power-on sound played")
+            latencies.append(playbacks[0].started_at - raised)
+            gpio.set_input(system.PIR_PIN, False)
+    finally:
+        system.play_sound_async = play_sound_async
+    return latencies
+
+
+def bench_workers(args):
+    """
+    Motion-to-audio latency, from a PIR edge to the power-on sound starting on the mixer,
+    with everything in one process ('threaded') and with the PIR, audio and LEDs in
+    supervised worker processes ('process'), idle and with a busy loop on every core.
+    Then kills each worker once and times how long it takes to be back.
+    """
+    import multiprocessing
+    from errorhandling import IntrusionDetectionSystem
+    from workers import Supervisor
+    with tempfile.TemporaryDirectory() as directory:
+        config = {
+            'pir_pin': 27, 'led_pin': 17, 'detection_mode': 'edge', 'sounds': write_sounds(directory),
+            'unauthorized_pause': [0, 0], 'warning_delay': 0, 'alarm_delay': 0, 'config_reload': False,
+            'journal': {'path': os.path.join(directory, 'events.jsonl'), 'text_log': False}, 'state_snapshot': None,
+        }
+        config_file = os.path.join(directory, 'config.json')
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+        # Decoded over and over by the 'decode' stress, in whichever process owns the sound bank
+        long_directory = os.path.join(directory, 'long')
+        os.makedirs(long_directory)
+        long_sound = write_sounds(long_directory, args.decode_length)['alarm']
+
+        for mode in args.modes:
+            supervisor = None
+            if mode == 'process':
+                supervisor = Supervisor(config, fake_gpio=True)
+                supervisor.start()
+                supervisor.wait_ready(30)
+                gpio = supervisor.gpio
+                system = IntrusionDetectionSystem(config_file, gpio=gpio, audio=supervisor.audio, leds=supervisor.leds)
+            else:
+                gpio = FakeGPIO()
+                system = IntrusionDetectionSystem(config_file, gpio=gpio)
+            threading.Thread(target=_step_until_stopped, args=(system,), daemon=True).start()
+
+            for stress in ('none', 'cpu', 'decode'):
+                hogs = [multiprocessing.Process(target=_hog, daemon=True) for _ in range(args.stress)]
+                stop = threading.Event()
+                decoder = threading.Thread(target=_keep_decoding, args=(system.sound_bank, long_sound, stop))
+                if stress == 'cpu':
+                    for hog in hogs:
+                        hog.start()
+                elif stress == 'decode':
+                    decoder.start()
+                try:
+                    latencies = _motion_trials(system, gpio, args.trials, args.idle)
+                finally:
+                    stop.set()
+                    if stress == 'cpu':
+                        for hog in hogs:
+                            hog.kill()
+                    elif stress == 'decode':
+                        decoder.join()
+                report(f"workers={mode} stress={stress} motion->audio", latencies)
+
+            if supervisor is not None:
+                for name, worker in supervisor.workers.items():
+                    killed = time.monotonic()
+                    restarts = worker.restarts
+                    os.kill(worker.process.pid, 9)
+                    _wait_until(lambda: worker.restarts != restarts and worker.ready.is_set(), 30, f"{name} worker back")
+                    back = time.monotonic() - killed
+                    recovered = _motion_trials(system, gpio, 1, args.idle)
+                    print(f"workers=process kill {name}: back in {back * 1000:.0f}ms, "
+                          f"next motion->audio {recovered[0] * 1000:.1f}ms, armed={system.armed}")
+            try:
+                system.shutdown()
+            except SystemExit:
+                pass
+            if supervisor is not None:
+                supervisor.stop()
+
+
+def bench_preempt(args):
+    """
+    An alarm cutting in over a warning clip on the real mixer, for each mixer buffer size.
+    'call' is how long play() takes to stop the warning and start the alarm. The alarm is
+    a blip shorter than one buffer, so the mixer reports it finished from the callback that
+    mixes it: 'mixed' is from the call to that callback, the time until the alarm is in a
+    buffer on its way to the sound card. Also checks a layered voice line leaves the alarm
+    bed playing.
+    """
+    import random
+    import pygame
+    from audioplayer import AudioPlayer
+    from soundbank import SoundBank
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, 'bed'))
+        os.makedirs(os.path.join(directory, 'blip'))
+        bed = write_sounds(os.path.join(directory, 'bed'), 10.0)
+        blip = write_sounds(os.path.join(directory, 'blip'), args.blip)
+        for buffer in args.buffers:
+            pygame.mixer.init(44100, -16, 2, buffer)
+            player = AudioPlayer(SoundBank())
+            player.start()
+            player.sound_bank.preload([bed['warning'][0], bed['alarm'], blip['alarm'], blip['warning'][0]])
+            for fade_ms in args.fade_ms:
+                calls, mixed, faded = [], [], []
+                for _ in range(args.trials):
+                    warning = player.play(bed['warning'][0], 'warning')
+                    time.sleep(rng.uniform(0.05, 0.15))
+                    called = time.monotonic()
+                    alarm = player.play(blip['alarm'], 'alarm', fade_ms=fade_ms)
+                    calls.append(time.monotonic() - called)
+                    alarm.wait(5)
+                    warning.wait(5)
+                    mixed.append(alarm.finished_at - called)
+                    faded.append(warning.finished_at - called)
+                name = f"buffer={buffer} ({1000 * buffer / 44100:.1f}ms) fade={fade_ms}ms"
+                report(f"{name} preempt call", calls)
+                report(f"{name} preempt mixed", mixed)
+                if fade_ms:
+                    report(f"{name} warning faded out", faded)
+
+            layered = 0
+            for _ in range(args.trials):
+                alarm = player.play(bed['alarm'], 'alarm')
+                voice = player.play(blip['warning'][0], 'alarm', layer=True)
+                voice.wait(5)
+                layered += not alarm.done() and voice.future.result()
+                alarm.stop()
+                alarm.wait(5)
+            print(f"buffer={buffer} layered voice over the alarm bed: {layered}/{args.trials} with the bed still playing")
+            print(f"  {player.lanes.stats()}")
+            player.stop()
+            pygame.mixer.quit()
+
+
+def _simulated_cpu(scenarios, seed, max_stay, **overrides):
+    import random
+    from simulation import Simulation, random_scenario
+    sim = Simulation(seed=seed, **overrides)
+    rng = random.Random(seed)
+    virtual_start = sim.clock.monotonic()
+    cpu_start = time.process_time()
+    for _ in range(scenarios):
+        sim.run_scenario(random_scenario(sim, rng, max_stay))
+    cpu = time.process_time() - cpu_start
+    virtual = sim.clock.monotonic() - virtual_start
+    if sim.system.metrics is not None:
+        sim.system.metrics.stop()
+    sim.close()
+    return cpu, virtual
+
+
+def bench_metrics(args):
+    """
+    CPU cost of the "metrics" instrumentation. The same simulated scenarios run with and
+    without it; the extra CPU per simulated second is what the daemon would pay per real
+    second on this machine. Scrapes of the HTTP endpoint and LED jitter observations at
+    --fps are added on top, from their measured unit cost. --budget is in percent of one
+    core over wall-clock time, i.e. CPU seconds per 100 real seconds, and the run exits
+    non-zero over it. The increase over the bare state machine's CPU is shown too, but
+    the state machine uses so little that it is no measure of the cost.
+    """
+    import timeit
+    import urllib.request
+    from metrics import Histogram, Metrics
+
+    histogram = Histogram()
+    observe = min(timeit.repeat(lambda: histogram.observe(0.003), number=100_000, repeat=5)) / 100_000
+    print(f"metrics: observe()={observe * 1e9:.0f}ns")
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, 'metrics.json')
+        block = {'metrics': {'port': 0, 'snapshot': snapshot, 'interval': 1.0}}
+        off, on = [], []
+        for _ in range(args.repeats):
+            off.append(_simulated_cpu(args.scenarios, args.seed, args.max_stay))
+            on.append(_simulated_cpu(args.scenarios, args.seed, args.max_stay, **block))
+        cpu_off, virtual = min(off)
+        cpu_on, _ = min(on)
+        machine = max(0.0, cpu_on - cpu_off) / virtual
+        print(f"  state machine: {args.scenarios} scenarios ({virtual / 3600:.1f} simulated hours), "
+              f"cpu {cpu_off:.3f}s without metrics, {cpu_on:.3f}s with "
+              f"({100 * (cpu_on - cpu_off) / cpu_off:+.1f}% over the bare state machine) = "
+              f"{100 * machine:.5f}% of one core over wall-clock time")
+
+        # One scrape of a registry as full as the simulation left it
+        metrics = Metrics(port=0, snapshot=None)
+        with open(snapshot) as f:
+            for entry in json.load(f)['histograms']:
+                metrics.observe(entry['name'], 0.01, **entry['labels'])
+        metrics.start()
+        url = f"http://127.0.0.1:{metrics.port}/metrics"
+        urllib.request.urlopen(url).read()
+        cpu_start = time.process_time()
+        for _ in range(args.scrapes):
+            body = urllib.request.urlopen(url).read()
+        scrape = (time.process_time() - cpu_start) / args.scrapes
+        metrics.stop()
+        print(f"  scrape: {len(body)} bytes, {1000 * scrape:.2f}ms cpu each (client included), "
+              f"every {args.scrape_interval:g}s = {100 * scrape / args.scrape_interval:.4f}% of one core")
+
+    led = args.fps * observe
+    print(f"  LED jitter at {args.fps} fps while an effect plays: {100 * led:.4f}% of one core")
+    total = machine + scrape / args.scrape_interval + led
+    verdict = 'within' if 100 * total <= args.budget else 'OVER'
+    print(f"  total: {100 * total:.4f}% of one core over wall-clock time, "
+          f"{verdict} the budget of {args.budget:g}% (CPU seconds per 100 s)")
+    if verdict == 'OVER':
+        raise SystemExit(1)
+
+
+def _rss():
+    # Resident set size in bytes, current rather than the peak getrusage() reports
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+# Per-backend defaults of the soak options left unset. Real backends run in real time, and
+# the last journal batch and LED frame they still hold when sampled are spread over far
+# fewer cycles, so their per-cycle budgets are looser.
+SOAK_DEFAULTS = {
+    'sim': {'cycles': 1_000_000, 'warmup': 10_000, 'interval': 50_000, 'trace_cycles': 5000, 'max_stay': 60.0,
+            'block_budget': 0.01, 'byte_budget': 1.0},
+    'real': {'cycles': 300, 'warmup': 30, 'interval': 30, 'trace_cycles': 30, 'max_stay': 3.0,
+             'block_budget': 1.0, 'byte_budget': 32.0},
+}
+
+
+def _sim_soak(args, directory):
+    # Returns run(cycles) and close() for the state machine on the virtual clock
+    import random
+    from simulation import Simulation, random_scenario
+    sim = Simulation(seed=args.seed)
+    rng = random.Random(args.seed)
+
+    def run(cycles):
+        for _ in range(cycles):
+            sim.run_scenario(random_scenario(sim, rng, args.max_stay))
+    return run, lambda: None, sim.close
+
+
+def _real_soak(args, directory):
+    # Returns run(cycles) and close() for the daemon on FakeGPIO and its real backends,
+    # the mixer on SDL's dummy driver, with short sounds and no escalation delays
+    import random
+    from errorhandling import IntrusionDetectionSystem, SystemState
+    config = {
+        'pir_pin': 27, 'led_pin': 17, 'detection_mode': 'edge', 'sounds': write_sounds(directory, args.sound_length),
+        'unauthorized_pause': [0, 0], 'warning_delay': 0, 'alarm_delay': 0, 'config_reload': False,
+        'led_effects': args.led_effects, 'envelope_cache': os.path.join(directory, 'envelopes'),
+        # The text log mirror also print()s every status line, which would bury the samples
+        'journal': {'path': os.path.join(directory, 'events.jsonl'), 'text_log': False},
+        'state_snapshot': os.path.join(directory, 'state.snap'),
+    }
+    config_file = os.path.join(directory, 'config.json')
+    with open(config_file, 'w') as f:
+        json.dump(config, f)
+    gpio = FakeGPIO()
+    system = IntrusionDetectionSystem(config_file, gpio=gpio)
+    system.warmed_up.wait(30)
+    threading.Thread(target=_step_until_stopped, args=(system,), name='soak-steps', daemon=True).start()
+    rng = random.Random(args.seed)
+
+    def standby():
+        return system.state == SystemState.STANDBY
+
+    def run(cycles):
+        for _ in range(cycles):
+            _wait_until(standby, 60, "back in STANDBY")
+            gpio.set_input(system.PIR_PIN, True)
+            _wait_until(lambda: not standby(), 10, "motion noticed")
+            time.sleep(rng.uniform(0, args.max_stay))
+            gpio.set_input(system.PIR_PIN, False)
+            # A real PIR holds its output low for seconds; a gap shorter than the
+            # bouncetime would debounce the next rising edge away
+            time.sleep(0.1)
+        _wait_until(standby, 60, "back in STANDBY")
+
+    def settle():
+        # Lets the journal writer, LED scheduler and sound-end callbacks finish the last cycle
+        time.sleep(1.0)
+
+    def close():
+        try:
+            system.shutdown()
+        except SystemExit:
+            pass
+    return run, settle, close
+
+
+def bench_soak(args):
+    """
+    Soak test: --cycles intrusions, walk-in to back in STANDBY, through the threaded state
+    machine. --backends real (the default) runs the daemon as deployed but on FakeGPIO:
+    PIRWatcher, EventJournal, LEDScheduler, SoundBank and AudioPlayer on SDL's dummy
+    driver, with short sounds and no delays, in real time. --backends sim runs millions of
+    cycles on the virtual clock and the Sim* stand-ins instead, for the state machine's
+    own long-run trend. Every --interval cycles it records RSS, live threads and the
+    interpreter's allocated blocks. tracemalloc slows everything down several times over,
+    so it only traces the last --trace-cycles cycles, for bytes kept per cycle and the top
+    allocators of what was kept. Growth is measured from the end of --warmup, once caches
+    have filled, and the run exits non-zero when any of it is over its budget.
+    """
+    import gc
+    import tracemalloc
+    for name, value in SOAK_DEFAULTS[args.backends].items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    samples = []
+    # Blocks held by the samples themselves, left out of the growth
+    harness = [0]
+
+    def sample(cycle):
+        settle()
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        samples.append({'cycle': cycle, 'wall_s': time.perf_counter() - wall_start,
+                        'rss': _rss(), 'threads': threading.active_count(), 'blocks': blocks - harness[0]})
+        harness[0] += sys.getallocatedblocks() - blocks
+        current = samples[-1]
+        print(f"  {cycle:>9} cycles  {current['wall_s']:8.0f}s  rss={current['rss'] / 2**20:6.1f}MiB  "
+              f"threads={current['threads']}  blocks={current['blocks']}")
+
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    # The daemon's text log goes to the working directory
+    os.chdir(directory)
+    try:
+        run, settle, close = (_real_soak if args.backends == 'real' else _sim_soak)(args, directory)
+        wall_start = time.perf_counter()
+        run(args.warmup)
+        sample(args.warmup)
+        cycle = args.warmup
+        while cycle < args.cycles:
+            step = min(args.interval, args.cycles - cycle)
+            run(step)
+            cycle += step
+            sample(cycle)
+
+        # Frames kept shallow: the growth is attributed to the line that allocated it
+        tracemalloc.start(1)
+        run(args.trace_cycles)
+        settle()
+        gc.collect()
+        before = tracemalloc.take_snapshot()
+        run(args.trace_cycles)
+        settle()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        # The harness's own locals and the first snapshot are not the daemon's growth
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+        traced = sum(stat.size_diff for stat in stats) / args.trace_cycles
+        top = [stat for stat in stats if stat.size_diff > 0][:args.top]
+        close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    first, last = samples[0], samples[-1]
+    cycles = last['cycle'] - first['cycle']
+    growth = {
+        'rss_mib': (last['rss'] - first['rss']) / 2**20,
+        'threads': last['threads'] - first['threads'],
+        'blocks_per_cycle': (last['blocks'] - first['blocks']) / cycles if cycles else 0.0,
+        'traced_bytes_per_cycle': traced,
+    }
+    print(f"soak ({args.backends} backends): {last['cycle']} cycles in {last['wall_s']:.0f}s; "
+          f"after {first['cycle']} warm-up cycles: rss {growth['rss_mib']:+.2f}MiB, threads {growth['threads']:+d}, "
+          f"{growth['blocks_per_cycle']:+.4f} blocks/cycle, {traced:+.1f} traced bytes/cycle "
+          f"(over {args.trace_cycles} cycles)")
+    for stat in top:
+        print(f"  {stat}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'samples': samples, 'growth': growth, 'top': [str(stat) for stat in top]}, f, indent=2)
+    budgets = {'rss_mib': args.rss_budget, 'threads': args.thread_budget,
+               'blocks_per_cycle': args.block_budget, 'traced_bytes_per_cycle': args.byte_budget}
+    over = [name for name, budget in budgets.items() if growth[name] > budget]
+    for name in over:
+        print(f"OVER BUDGET: {name} grew {growth[name]:+.4f}, budget {budgets[name]:g}")
+    if over:
+        raise SystemExit(1)
+    print("within budget")
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def bench_simulate(args):
+    """
+    Runs the threaded state machine on a virtual clock (simulation.py): each named scenario
+    once, then --scenarios random stays. Reports state transitions per wall-clock second,
+    how much faster than real time the simulation ran, and simulated latencies: motion to
+    POWERING_ON, time spent in each state, and last movement to back in STANDBY.
+    --save writes the results as JSON; --compare checks them against a saved run and exits
+    non-zero on a regression.
+    """
+    import random
+    from simulation import SCENARIOS, Simulation, random_scenario
+    sim = Simulation(seed=args.seed)
+    rng = random.Random(args.seed)
+    results = {'paths': {}}
+    for name, build in SCENARIOS.items():
+        result = sim.run_scenario(build(sim))
+        results['paths'][name] = [new.name for _, _, new in result.transitions]
+
+    reactions, settles, dwell = [], [], {}
+    transitions = 0
+    virtual_start = sim.clock.monotonic()
+    wall_start = time.perf_counter()
+    for _ in range(args.scenarios):
+        result = sim.run_scenario(random_scenario(sim, rng, args.max_stay))
+        transitions += len(result.transitions)
+        if result.reaction is not None:
+            reactions.append(result.reaction)
+            settles.append(result.settled)
+        for (entered, _, state), (left, _, _) in zip(result.transitions, result.transitions[1:]):
+            dwell.setdefault(state.name, []).append(left - entered)
+    wall = time.perf_counter() - wall_start
+    sim.close()
+
+    results['transitions_per_s'] = transitions / wall
+    results['speedup'] = (sim.clock.monotonic() - virtual_start) / wall
+    results['latency'] = {'reaction': reactions, 'settle': settles, **dwell}
+    results['latency'] = {name: {'median': statistics.median(samples), 'p99': percentile(samples, 0.99)}
+                          for name, samples in results['latency'].items() if samples}
+    print(f"simulate: {args.scenarios} scenarios, {transitions} transitions in {wall:.2f}s = "
+          f"{results['transitions_per_s']:.0f} transitions/s, {results['speedup']:.0f}x real time")
+    for name, path in results['paths'].items():
+        print(f"  {name}: {' -> '.join(path)}")
+    for name, latency in results['latency'].items():
+        print(f"  {name}: median={latency['median']:.2f}s p99={latency['p99']:.2f}s (simulated)")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, path in baseline['paths'].items():
+            if results['paths'].get(name) != path:
+                regressions.append(f"{name} now goes {results['paths'].get(name)}, was {path}")
+        if results['transitions_per_s'] < baseline['transitions_per_s'] * (1 - args.tolerance):
+            regressions.append(f"transitions/s {results['transitions_per_s']:.0f}, was {baseline['transitions_per_s']:.0f}")
+        for name, latency in baseline['latency'].items():
+            current = results['latency'].get(name)
+            if current is not None and current['median'] > latency['median'] * (1 + args.tolerance) + 0.01:
+                regressions.append(f"{name} median {current['median']:.2f}s, was {latency['median']:.2f}s")
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"no regressions against {args.compare}")
+
+
+BENCHMARKS = {
+    'pir-latency': bench_pir_latency,
+    'zones': bench_zones,
+    'leds': bench_leds,
+    'rgb': bench_rgb,
+    'keywords': bench_keywords,
+    'simulate': bench_simulate,
+    'filter': bench_filter,
+    'startup': bench_startup,
+    'workers': bench_workers,
+    'preempt': bench_preempt,
+    'metrics': bench_metrics,
+    'shutdown': bench_shutdown,
+    'soak': bench_soak,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    pir = subparsers.add_parser('pir-latency', help='PIR edge to state change latency')
+    pir.add_argument('--mode', choices=['edge', 'poll'], default='edge')
+    pir.add_argument('--iterations', type=int, default=50)
+    pir.add_argument('--idle', type=float, default=0.1, help='seconds idle before each edge, keep above pir_bouncetime')
+    pir.add_argument('--idle-window', type=float, default=2.0, help='seconds to sample idle CPU')
+
+    zones = subparsers.add_parser('zones', help='CPU and reaction latency vs number of zones')
+    zones.add_argument('--zones', type=int, nargs='+', default=[1, 4, 16, 64])
+    zones.add_argument('--rounds', type=int, default=10)
+    zones.add_argument('--idle-window', type=float, default=1.0, help='seconds to sample idle CPU')
+
+    leds = subparsers.add_parser('leds', help='LED scheduler jitter and redundant writes saved')
+    leds.add_argument('--channels', type=int, default=3)
+    leds.add_argument('--fps', type=int, default=50)
+
+    rgb = subparsers.add_parser('rgb', help='GPIO writes of the RGB color pipeline')
+    rgb.add_argument('--fps', type=int, default=100)
+
+    keywords = subparsers.add_parser('keywords', help='offline keyword spotting on WAV fixtures')
+    keywords.add_argument('--model', required=True, help='path to an unpacked Vosk model')
+    keywords.add_argument('wav', nargs='+', help='16 kHz 16-bit mono recordings')
+
+    simulate = subparsers.add_parser('simulate', help='state machine scenarios on a virtual clock')
+    simulate.add_argument('--scenarios', type=int, default=5000)
+    simulate.add_argument('--max-stay', type=float, default=60.0, help='longest random stay in seconds')
+    simulate.add_argument('--seed', type=int, default=0)
+    simulate.add_argument('--save', help='write results to this JSON file')
+    simulate.add_argument('--compare', help='JSON results of an earlier run to check for regressions')
+    simulate.add_argument('--tolerance', type=float, default=0.2, help='allowed fractional slowdown')
+
+    pir_filter = subparsers.add_parser('filter', help='PIR filter throughput and live sampler CPU')
+    pir_filter.add_argument('--samples', type=int, default=10_000_000)
+    pir_filter.add_argument('--rate', type=int, default=500, help='sampling rate in Hz')
+    pir_filter.add_argument('--window', type=float, default=0.2, help='filter window in seconds')
+    pir_filter.add_argument('--block', type=int, default=10, help='samples per processed block')
+    pir_filter.add_argument('--live', type=float, default=3.0, help='seconds to run the live sampler')
+    pir_filter.add_argument('--budget', type=float, default=5.0, help='CPU budget for the live sampler, percent')
+    pir_filter.add_argument('--seed', type=int, default=0)
+
+    startup = subparsers.add_parser('startup', help='launch to armed and ready, eager vs fast startup')
+    startup.add_argument('--modes', nargs='+', default=['eager', 'fast'])
+    startup.add_argument('--runs', type=int, default=5)
+    startup.add_argument('--sound-length', type=float, default=5.0, help='seconds of each generated sound')
+
+    workers = subparsers.add_parser('workers', help='motion to audio latency, in-process vs worker processes')
+    workers.add_argument('--modes', nargs='+', default=['threaded', 'process'])
+    workers.add_argument('--trials', type=int, default=30)
+    workers.add_argument('--stress', type=int, default=os.cpu_count(), help='busy-loop processes for the stressed run')
+    workers.add_argument('--idle', type=float, default=0.1, help='seconds in standby before each motion')
+    workers.add_argument('--decode-length', type=float, default=20.0, help='seconds of the sound the decode stress decodes')
+
+    preempt = subparsers.add_parser('preempt', help='priority preemption, crossfade and layering on the mixer')
+    preempt.add_argument('--buffers', type=int, nargs='+', default=[256, 512, 1024], help='mixer buffer sizes in samples')
+    preempt.add_argument('--fade-ms', type=int, nargs='+', default=[0, 150], help='crossfade lengths to try')
+    preempt.add_argument('--trials', type=int, default=30)
+    preempt.add_argument('--blip', type=float, default=0.001, help='seconds of the preempting sound, under one buffer')
+    preempt.add_argument('--seed', type=int, default=0)
+
+    metrics = subparsers.add_parser('metrics', help='CPU overhead of the metrics instrumentation')
+    metrics.add_argument('--scenarios', type=int, default=2000)
+    metrics.add_argument('--max-stay', type=float, default=60.0, help='longest random stay in seconds')
+    metrics.add_argument('--repeats', type=int, default=3, help='runs of each, the fastest counts')
+    metrics.add_argument('--scrapes', type=int, default=200)
+    metrics.add_argument('--scrape-interval', type=float, default=15.0, help='seconds between Prometheus scrapes')
+    metrics.add_argument('--fps', type=int, default=50, help='LED frame rate')
+    metrics.add_argument('--budget', type=float, default=1.0, help='CPU budget, percent of one core over wall-clock time')
+    metrics.add_argument('--seed', type=int, default=0)
+
+    shutdown = subparsers.add_parser('shutdown', help='SIGTERM to exit with a shutdown deadline, crash to resume')
+    shutdown.add_argument('--deadlines', type=float, nargs='+', default=[0.5], help='shutdown_deadline values to try')
+    shutdown.add_argument('--runs', type=int, default=5)
+    shutdown.add_argument('--sound-length', type=float, default=5.0, help='seconds of each generated sound')
+
+    soak = subparsers.add_parser('soak', help='memory and thread growth over many intrusions')
+    soak.add_argument('--backends', choices=['real', 'sim'], default='real',
+                      help='the daemon\'s own backends in real time, or Sim* ones on a virtual clock')
+    soak.add_argument('--cycles', type=int, help='intrusions, warm-up included (default: 300 real, 1000000 sim)')
+    soak.add_argument('--warmup', type=int, help='intrusions before growth is measured (default: 30 real, 10000 sim)')
+    soak.add_argument('--interval', type=int, help='intrusions between samples (default: 30 real, 50000 sim)')
+    soak.add_argument('--trace-cycles', type=int, help='intrusions traced by tracemalloc (default: 30 real, 5000 sim)')
+    soak.add_argument('--max-stay', type=float, help='longest random stay in seconds (default: 3 real, 60 sim)')
+    soak.add_argument('--sound-length', type=float, default=0.05, help='seconds of each generated sound, real backends')
+    soak.add_argument('--led-effects', choices=['classic', 'envelope'], default='classic',
+                      help='LED effects of the real backends, envelope needs numpy')
+    soak.add_argument('--top', type=int, default=10, help='allocators to list')
+    soak.add_argument('--rss-budget', type=float, default=2.0, help='MiB of RSS growth allowed')
+    soak.add_argument('--thread-budget', type=int, default=0, help='threads allowed to be added')
+    soak.add_argument('--block-budget', type=float, help='allocated blocks kept per intrusion (default: 1 real, 0.01 sim)')
+    soak.add_argument('--byte-budget', type=float, help='traced bytes kept per intrusion (default: 32 real, 1 sim)')
+    soak.add_argument('--save', help='write the samples and growth to this JSON file')
+    soak.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent import futures
+
+from soundbank import iter_sound_paths
+
+# Sound slots the state machine plays; unauthorized and warning pick one file at random
+SINGLE_SOUNDS = ('power_on', 'alarm', 'power_down')
+RANDOM_SOUNDS = ('unauthorized', 'warning')
+
+# Read once at startup, a changed value is logged and only takes effect after a restart
+RESTART_KEYS = frozenset({
+    'pir_pin', 'led_pin', 'detection_mode', 'pir_bouncetime', 'pir_filter', 'led_fps', 'engine',
+    'startup', 'voice', 'journal', 'sound_cache_bytes', 'config_reload', 'workers',
+    'audio_preemption', 'audio_crossfade_ms', 'audio_buffer', 'metrics',
+    'state_snapshot', 'shutdown_deadline', 'resume_window', 'led_effects', 'envelope_cache',
+    'sound_bundle', 'zones',
+})
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_config(config):
+    """
+    Checks everything the state machine reads from config.json, so a bad edit is rejected
+    before it is swapped in rather than found mid-intrusion. Raises ValueError listing
+    every problem.
+    """
+    errors = []
+    if not isinstance(config, dict):
+        raise ValueError("config must be a JSON object")
+    for key in ('pir_pin', 'led_pin'):
+        if not isinstance(config.get(key), int):
+            errors.append(f"'{key}' must be a pin number")
+
+    sounds = config.get('sounds')
+    if not isinstance(sounds, dict):
+        errors.append("'sounds' must be an object")
+    else:
+        for slot in SINGLE_SOUNDS:
+            if not isinstance(sounds.get(slot), str):
+                errors.append(f"sounds.{slot} must be a file path")
+        for slot in RANDOM_SOUNDS:
+            paths = sounds.get(slot)
+            if not (isinstance(paths, list) and paths and all(isinstance(path, str) for path in paths)):
+                errors.append(f"sounds.{slot} must be a non-empty list of file paths")
+        if not errors:
+            errors.extend(f"sound file {path} does not exist"
+                          for path in iter_sound_paths(sounds) if not os.path.isfile(path))
+
+    pause = config.get('unauthorized_pause', (0.5, 1))
+    if not (isinstance(pause, (list, tuple)) and len(pause) == 2 and all(_is_number(p) for p in pause)
+            and 0 <= pause[0] <= pause[1]):
+        errors.append("'unauthorized_pause' must be [min, max] seconds with 0 <= min <= max")
+    for key in ('warning_delay', 'alarm_delay'):
+        if key in config and not (_is_number(config[key]) and config[key] >= 0):
+            errors.append(f"'{key}' must be a number of seconds >= 0")
+
+    if errors:
+        raise ValueError('; '.join(errors))
+    return config
+
+
+class ConfigReloader:
+    """
+    Watches config.json from a background thread. When the file changes it is parsed,
+    validated and any new or changed sound files are decoded and staged in the sound bank,
+    all off the detection path; only then is the new config handed to on_ready(config,
+    changed, seconds), also when only sound files changed. A config that fails any step
+    is logged and the running one is kept. With an EnvelopeCache, LED envelopes for new
+    sounds are prepared here as well.
+    """
+    def __init__(self, path, config, sound_bank, on_ready, interval=1.0, envelopes=None):
+        self.path = path
+        self.config = config
+        self.sound_bank = sound_bank
+        self.envelopes = envelopes
+        self.on_ready = on_ready
+        self.interval = interval
+        self.version = self._version()
+        self.reloads = 0
+        self.rejected = 0
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='config-reload', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def check(self):
+        """
+        Reloads the config if the file changed since the last check. Returns True if a
+        new config was handed to on_ready.
+        """
+        version = self._version()
+        if version is None or version == self.version:
+            # Missing means an editor is mid-replace, the next check picks it up
+            return False
+        self.version = version
+        started = time.monotonic()
+        try:
+            with open(self.path) as f:
+                config = validate_config(json.load(f))
+        except (OSError, ValueError) as e:
+            self.rejected += 1
+            logging.error(f"Config reload rejected, keeping the running config: {e}")
+            return False
+
+        changed = {key for key in config.keys() | self.config.keys() if config.get(key) != self.config.get(key)}
+        restart = changed & RESTART_KEYS
+        if restart:
+            logging.warning(f"Config reload: {', '.join(sorted(restart))} only take effect after a restart")
+        validated = time.monotonic()
+
+        # Stats every configured file but only decodes ones that are new or rewritten, so
+        # touching config.json also picks up a sound replaced under the same name
+        try:
+            decoded, failed = self.sound_bank.refresh(iter_sound_paths(config['sounds']))
+        except (RuntimeError, futures.TimeoutError) as e:
+            # The audio worker is restarting: forget this version so the next check retries
+            self.version = None
+            logging.error(f"Config reload postponed, sounds could not be loaded: {e}")
+            return False
+        if failed:
+            self.rejected += 1
+            problems = '; '.join(f"{path}: {error}" for path, error in failed.items())
+            logging.error(f"Config reload rejected, keeping the running config: failed to load {problems}")
+            return False
+        if self.envelopes is not None:
+            # A missing envelope only costs the LED effect, not worth rejecting the config for
+            self.envelopes.prepare(iter_sound_paths(config['sounds']), self.sound_bank)
+        loaded = time.monotonic()
+
+        self.config = config
+        changed -= restart
+        # Re-decoded sounds are only staged, they still need the swap at standby
+        if not changed and not decoded:
+            return False
+        self.reloads += 1
+        self.on_ready(config, changed, {'validate': validated - started, 'sounds': loaded - validated,
+                                        'decoded': len(decoded)})
+        return True
+
+    def _version(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"Config reload failed: {e}")
@@ -0,0 +1,69 @@
+import queue
+import time
+from collections import namedtuple
+
+# A single event delivered to the state machine. `kind` is 'motion' for PIR edges, where
+# `value` is the pin level after the edge, or 'command' for voice commands, where `value`
+# is the command name. `timestamp` is time.monotonic().
+SensorEvent = namedtuple('SensorEvent', ['kind', 'source', 'value', 'timestamp'])
+
+
+class PIRWatcher:
+    """
+    Turns GPIO edge interrupts on the PIR pin into SensorEvents on a thread-safe queue,
+    so the state machine can block on the queue instead of polling the pin. Timestamps
+    come from clock, the time module unless a simulation passes its own.
+    """
+    def __init__(self, gpio, pin, events=None, bouncetime=50, clock=None):
+        self.gpio = gpio
+        self.pin = pin
+        self.events = events if events is not None else queue.Queue()
+        self.bouncetime = bouncetime
+        self.clock = clock or time
+        self.started = False
+
+    def start(self):
+        if not self.started:
+            self.gpio.add_event_detect(self.pin, self.gpio.BOTH, callback=self._on_edge, bouncetime=self.bouncetime)
+            self.started = True
+
+    def stop(self):
+        if self.started:
+            self.gpio.remove_event_detect(self.pin)
+            self.started = False
+
+    def _on_edge(self, channel):
+        # Runs on the GPIO callback thread: timestamp first, then read the settled level
+        timestamp = self.clock.monotonic()
+        self.events.put(SensorEvent('motion', channel, bool(self.gpio.input(channel)), timestamp))
+
+    def wait_for_motion(self, timeout=None):
+        """
+        Blocks until the PIR reports motion and returns the triggering SensorEvent, or
+        None on timeout. Falling edges received meanwhile are dropped; any other event
+        sharing the queue (e.g. a voice command) is returned for the caller to handle.
+        """
+        deadline = None if timeout is None else self.clock.monotonic() + timeout
+        # Edges queued while the system was busy are stale, the current level is what counts
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event.kind != 'motion':
+                return event
+        # The pin may already be high when we start waiting, in which case no edge will come
+        if self.gpio.input(self.pin):
+            return SensorEvent('motion', self.pin, True, self.clock.monotonic())
+        while True:
+            remaining = None if deadline is None else max(0, deadline - self.clock.monotonic())
+            try:
+                event = self._get(remaining)
+            except queue.Empty:
+                return None
+            if event.kind != 'motion' or event.value:
+                return event
+
+    def _get(self, timeout):
+        # Raises queue.Empty on timeout
+        return self.events.get(timeout=timeout)
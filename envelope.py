@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+from array import array
+
+import numpy as np
+import pygame
+
+from ledscheduler import DEFAULT_FPS, LEDEffect
+
+
+def compute_envelope(samples, sample_rate, fps=DEFAULT_FPS):
+    """
+    RMS amplitude of PCM samples (one row per sample frame, one column per audio channel)
+    over each 1/fps slice, scaled so the loudest slice is 1. Returns one float32 per LED frame.
+    """
+    power = np.square(np.asarray(samples, np.float32))
+    if power.ndim > 1:
+        power = power.mean(axis=1)
+    hop = max(1, int(round(sample_rate / fps)))
+    count = -(-power.size // hop)
+    # Pads the last partial slice with silence so every slice reshapes to one row
+    padded = np.zeros(count * hop, np.float32)
+    padded[:power.size] = power
+    rms = np.sqrt(padded.reshape(count, hop).mean(axis=1))
+    peak = rms.max() if rms.size else 0
+    return (rms / peak if peak > 0 else rms).astype(np.float32)
+
+
+def file_digest(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class EnvelopeCache:
+    """
+    Amplitude envelopes of sound files, for LED effects that follow the sound. prepare()
+    works them out ahead of time from the sounds already decoded in a SoundBank and keeps
+    each one on disk under directory, named by a hash of the file's contents, so a sound
+    is only analysed once however often the system restarts. Envelopes in a SoundBundle
+    built for the same fps are used from there. Effects are then built from memory when a
+    sound plays.
+    """
+    def __init__(self, directory='envelopes', fps=DEFAULT_FPS, bundle=None):
+        self.directory = directory
+        self.fps = fps
+        self.bundle = bundle
+        self.computed = 0
+        self.loaded = 0
+        self._levels = {}
+        self._versions = {}
+
+    def prepare(self, paths, sound_bank):
+        """
+        Gets an envelope for every path that doesn't have a current one, from the bundle,
+        from disk or by analysing the decoded sound. Returns {path: error} for files that failed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        failed = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                version = stat.st_mtime_ns, stat.st_size
+                if self._versions.get(path) == version:
+                    continue
+                levels = self.bundle.envelope(path, self.fps) if self.bundle is not None else None
+                if levels is None:
+                    levels = self._load_or_compute(path, sound_bank)
+                else:
+                    self.loaded += 1
+            except (pygame.error, OSError) as e:
+                logging.error(f"Failed to prepare LED envelope for {path}: {e}")
+                failed[path] = e
+                continue
+            self._levels[path] = levels
+            self._versions[path] = version
+        return failed
+
+    def _load_or_compute(self, path, sound_bank):
+        cached = os.path.join(self.directory, f"{file_digest(path)}-{self.fps}.npy")
+        try:
+            levels = np.load(cached)
+            self.loaded += 1
+            return levels
+        except (OSError, ValueError):
+            pass
+        frequency = (pygame.mixer.get_init() or (44100,))[0]
+        levels = compute_envelope(pygame.sndarray.array(sound_bank.get_latest(path)), frequency, self.fps)
+        # Written aside and renamed, so a crash never leaves a truncated envelope
+        with open(cached + '.tmp', 'wb') as f:
+            np.save(f, levels)
+        os.replace(cached + '.tmp', cached)
+        self.computed += 1
+        return levels
+
+    def effect(self, path, intensity=100, end=None):
+        """
+        Duty cycles following the sound at path, loudest at intensity, then end (default:
+        the last level) once it finishes. None if it has no prepared envelope.
+        """
+        levels = self._levels.get(path)
+        if levels is None:
+            return None
+        # Whole duty-cycle steps, like fade(), so the scheduler skips writes that change nothing
+        frames = array('f', np.rint(levels * intensity).astype(np.float32).tobytes())
+        if end is None:
+            end = frames[-1] if frames else 0
+        frames.append(end)
+        return LEDEffect('envelope', frames, self.fps)
+
+    def rgb_effect(self, path, color, end=None):
+        """
+        Like effect(), for an RGBLed: color scaled by the sound's level in every frame.
+        """
+        levels = self._levels.get(path)
+        if levels is None:
+            return None
+        frames = [tuple(frame) for frame in np.outer(levels, color).tolist()]
+        if end is None:
+            end = frames[-1] if frames else (0, 0, 0)
+        frames.append(tuple(end))
+        return LEDEffect('rgb-envelope', frames, self.fps)
@@ -1,15 +1,22 @@
-import RPi.GPIO as GPIO
+# Imported first so the startup profile includes every import after it
+from startupprofile import StartupProfiler, system_uptime
+import queue
+import threading
 import time
 import random
 import logging
 from logging.handlers import RotatingFileHandler
-from mutagen.mp3 import MP3
-import pygame
-import threading
 import json
+import os
 import signal
 import sys
+from concurrent import futures
 from enum import Enum
+from edgedetect import PIRWatcher, SensorEvent
+from ledscheduler import LEDScheduler, fade, flicker
+from journal import EventJournal
+from metrics import CountingGPIO, Metrics
+from statesnapshot import StateSnapshot
 
 class SystemState(Enum):
     STANDBY = 1
@@ -19,8 +26,24 @@ class SystemState(Enum):
     ALARM = 5
     POWERING_DOWN = 6
 
+# The method step() runs for each state, as labelled in the handler_seconds metric
+HANDLERS = {
+    SystemState.STANDBY: 'handle_standby',
+    SystemState.POWERING_ON: 'handle_powering_on',
+    SystemState.UNAUTHORIZED: 'handle_unauthorized',
+    SystemState.WARNING: 'handle_warning',
+    SystemState.ALARM: 'handle_alarm',
+    SystemState.POWERING_DOWN: 'power_down_sequence',
+}
+
+# Seconds the LED fades over when the power-down sound's length can't be had from the audio worker
+FALLBACK_FADE = 2.0
+
 class IntrusionDetectionSystem:
-    def __init__(self, config_file):
+    def __init__(self, config_file, gpio=None, clock=None, audio=None, leds=None, journal=None):
+        self.profile = StartupProfiler()
+        self.profile.lap('imports')
+
         # Load configuration
         with open(config_file, 'r') as f:
             config = json.load(f)
@@ -29,19 +52,84 @@ class IntrusionDetectionSystem:
         log_handler = RotatingFileHandler('intrusion_log.log', maxBytes=1e6, backupCount=5)
         logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s', handlers=[log_handler])
 
+        # Sleeps and timestamps go through the clock, simulation.VirtualClock stands in for time
+        self.clock = clock or time
+
+        # Structured event journal, written in batches by a background thread
+        self.journal = journal or EventJournal.from_config(config)
+        self.journal.start()
+
+        # Optional latency histograms and counters, scraped over HTTP and saved as snapshots
+        self.metrics = Metrics.from_config(config)
+        if self.metrics is not None:
+            self.metrics.describe(
+                motion_to_audio_seconds='PIR motion to the power-on sound starting',
+                state_seconds='Time spent in each state',
+                handler_seconds='Duration of each state handler call',
+                audio_start_delay_seconds='Sound requested to sound started',
+                sound_seconds='How long each sound played',
+                state_transitions_total='State changes by the state entered',
+                led_effects_total='LED effects started, by effect',
+            )
+            self.metrics.start()
+        self.profile.lap('config')
+
+        # 'process' runs the PIR, audio and LEDs in supervised worker processes (see workers.py)
+        # and the state machine drives them through stand-ins for the usual backends
+        self.supervisor = None
+        if config.get('workers') == 'process' and gpio is None:
+            from workers import Supervisor
+            self.supervisor = Supervisor(config, journal=self.journal)
+            self.supervisor.start()
+            gpio, audio, leds = self.supervisor.gpio, self.supervisor.audio, self.supervisor.leds
+
         # Define GPIO pins from config
         self.PIR_PIN = config['pir_pin']
         self.LED_PIN = config['led_pin']
 
-        # GPIO setup
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.PIR_PIN, GPIO.IN)
-        GPIO.setup(self.LED_PIN, GPIO.OUT)
+        # GPIO setup, a fake backend (see fakegpio.py) can be passed in off the Pi
+        if gpio is None:
+            import RPi.GPIO as gpio
+        self.gpio = gpio if self.metrics is None else CountingGPIO(gpio, self.metrics)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(self.PIR_PIN, self.gpio.IN)
+        self.gpio.setup(self.LED_PIN, self.gpio.OUT)
+
+        # 'edge' wakes on PIR interrupts, 'poll' keeps the original 1 s polling loop
+        self.detection_mode = config.get('detection_mode', 'poll')
+        self.pir_bouncetime = config.get('pir_bouncetime', 50)
+        # PIR edges and voice commands share one queue, so standby sleeps on both at once
+        self.events = queue.Queue()
+        self.pir_watcher = PIRWatcher(self.gpio, self.PIR_PIN, self.events, bouncetime=self.pir_bouncetime,
+                                      clock=self.clock)
+        if self.detection_mode == 'edge':
+            self.pir_watcher.start()
+        self.motion_detected_at = None
+
+        # Optional filtered presence (see pirfilter.py) instead of trusting single pin reads
+        self.pir_filter = None
+        if 'pir_filter' in config:
+            from pirfilter import PIRFilter
+            self.pir_filter = PIRFilter.from_config(self.gpio, self.PIR_PIN, config['pir_filter'])
+            self.pir_filter.start()
+        self.profile.lap('gpio')
 
         # Setup PWM on the LED pin
-        self.led_pwm = GPIO.PWM(self.LED_PIN, 100)
+        self.led_pwm = self.gpio.PWM(self.LED_PIN, 100)
         self.led_pwm.start(0)
 
+        # Every LED effect is rendered by one scheduler thread from precomputed waveforms
+        self.leds = leds or LEDScheduler(config.get('led_fps', 50))
+        if self.metrics is not None:
+            self.leds.jitter_histogram = self.metrics.histogram(
+                'led_frame_jitter_seconds', 'How late each LED frame was rendered')
+        self.led = self.leds.add_channel('led', self.led_pwm)
+        self.leds.start()
+        # 'envelope' makes the LED follow each sound's loudness instead of flicker and fade
+        self.led_effects = config.get('led_effects', 'classic')
+        self.envelopes = None
+        self.profile.lap('leds')
+
         # Sound file paths from config
         self.sounds = config['sounds']
 
@@ -50,122 +138,545 @@ class IntrusionDetectionSystem:
         self.warning_delay = config.get('warning_delay', 3)
         self.alarm_delay = config.get('alarm_delay', 5)
 
-        # Initialize Pygame mixer
-        pygame.mixer.init()
+        # With preemption the escalation delays run from the start of each clip and the next
+        # clip cuts in over it (see audiopriority.py), optionally crossfading
+        self.audio_preemption = config.get('audio_preemption', False)
+        self.audio_crossfade_ms = config.get('audio_crossfade_ms', 0)
+
+        # Seconds a SIGINT/SIGTERM may spend on the power-down before sounds and LEDs are
+        # cut short; None plays it through as before
+        self.shutdown_deadline = config.get('shutdown_deadline', 3.0)
+        # A snapshot saved longer ago than this is an old incident, not one to resume
+        self.resume_window = config.get('resume_window', 300)
+
+        # 'threaded' runs the original blocking loop, 'async' the asyncio engine in asyncengine.py
+        self.engine = config.get('engine', 'threaded')
+
+        # Edits to config.json are validated on a watcher thread and swapped in at standby
+        self.config_file = config_file
+        self.config_reload = config.get('config_reload', True)
+        self.config_reloader = None
+        self.pending_config = None
+        self.pending_lock = threading.Lock()
 
         # Set initial state
         self.state = SystemState.STANDBY
+        self.state_entered_at = self.clock.monotonic()
+        self.armed = True
+        self.stopped = False
+        self.incident_started = None
+        self.playing = set()
+
+        # The state, saved on every transition, resumes an escalation cut short by a crash
+        self.snapshot = StateSnapshot.from_config(config) if self.engine == 'threaded' else None
+        if self.snapshot is not None:
+            self._resume(self.snapshot.open())
 
         # Setup graceful shutdown
-        signal.signal(signal.SIGINT, self.shutdown)
-        signal.signal(signal.SIGTERM, self.shutdown)
+        signal.signal(signal.SIGINT, self._exit)
+        signal.signal(signal.SIGTERM, self._exit)
+
+        # 'fast' arms the PIR before the mixer, sounds and voice listener are up and brings
+        # those up on a warm-up thread; motion seen meanwhile waits in wait_for_audio()
+        self.startup = config.get('startup', 'eager')
+        self.audio_ready = threading.Event()
+        self.warmed_up = threading.Event()
+        self.warmup_error = None
+        self.mixer_started = False
+        self.voice = None
+        if audio is not None:
+            self.sound_bank = audio.sound_bank
+            self.audio = audio
+            self.audio.start()
+            self._start_config_reload(config)
+        elif self.startup == 'fast':
+            self.profile.mark('armed')
+            threading.Thread(target=self._warm_up, args=(config,), name='warm-up', daemon=True).start()
+            return
+        else:
+            self._start_audio(config)
+            self._start_voice(config)
+            self._start_config_reload(config)
+        self.audio_ready.set()
+        self.warmed_up.set()
+        self.profile.mark('armed')
+        self._report_startup()
+
+    def _start_audio(self, config):
+        import pygame
+        from soundbank import SoundBank, iter_sound_paths
+        from audioplayer import AudioPlayer
+        self.profile.lap('audio imports')
+
+        # Initialize Pygame mixer, its buffer bounds how fast a preempting sound is heard
+        pygame.mixer.init(buffer=config.get('audio_buffer', 512))
+        self.mixer_started = True
+        self.profile.lap('mixer')
+
+        # Decode every configured sound up front so playback never waits on an MP3 decode,
+        # or map them from a prebuilt sound_bundle (see soundbundle.py)
+        self.sound_bank = SoundBank.from_config(config)
+        self.sound_bank.preload(iter_sound_paths(self.sounds))
+        self.profile.lap('sounds')
+
+        # Envelopes come from the sounds decoded above, or from disk if analysed before
+        if self.led_effects == 'envelope':
+            from envelope import EnvelopeCache
+            self.envelopes = EnvelopeCache(config.get('envelope_cache', 'envelopes'), self.leds.fps,
+                                           self.sound_bank.bundle)
+            self.envelopes.prepare(iter_sound_paths(self.sounds), self.sound_bank)
+            self.profile.lap('envelopes')
+
+        # Playback is event driven, play_sound_async hands back a handle instead of blocking
+        self.audio = AudioPlayer(self.sound_bank)
+        self.audio.start()
+        self.profile.lap('audio')
+
+    def _start_voice(self, config):
+        # Optional background voice commands ('arm'/'disarm'), see voicepipeline.py
+        if 'voice' not in config:
+            return
+        from keywordspot import CommandListener
+        from voicepipeline import VoicePipeline
+        listener = CommandListener(config['voice']['model_path'], config['voice'].get('commands'))
+        self.voice = VoicePipeline.from_listener(listener, self.events)
+        self.profile.lap('voice')
+
+    def _start_config_reload(self, config):
+        # Needs the real sound bank to decode new sounds into, so starts once audio is up.
+        # Only the threaded loop swaps a pending config in at standby, see step()
+        if not self.config_reload or self.engine != 'threaded':
+            return
+        from configreload import ConfigReloader
+        self.config_reloader = ConfigReloader(self.config_file, config, self.sound_bank, self._config_ready,
+                                              envelopes=self.envelopes)
+        self.config_reloader.start()
+
+    def _warm_up(self, config):
+        self.profile.begin()
+        try:
+            self._start_audio(config)
+            self._start_config_reload(config)
+        except Exception as e:
+            logging.error(f"Audio warm-up failed: {e}")
+            self.warmup_error = e
+        finally:
+            self.audio_ready.set()
+        self.profile.mark('audio ready')
+        try:
+            self._start_voice(config)
+            if self.voice is not None and self.engine == 'threaded':
+                self.voice.start()
+        except Exception as e:
+            logging.error(f"Voice warm-up failed: {e}")
+        self.warmed_up.set()
+        self._report_startup()
+
+    def _report_startup(self):
+        self.profile.mark('ready')
+        uptime = system_uptime()
+        boot = f", {uptime:.1f}s since boot" if uptime is not None else ''
+        logging.info(f"Startup ({self.startup}): {self.profile.report()}{boot}")
+        self.journal.record('startup', mode=self.startup, marks=self.profile.marks, uptime=uptime,
+                            phases=[{'thread': thread, 'phase': name, 'seconds': round(seconds, 4)}
+                                    for thread, name, seconds in self.profile.phases])
+
+    def _config_ready(self, config, changed, timings):
+        # Runs on the watcher thread, the state machine swaps it in at its next standby
+        with self.pending_lock:
+            self.pending_config = (config, changed, timings, time.monotonic())
+        # Wakes an edge-mode standby wait so the swap doesn't wait for the next motion
+        self.events.put(SensorEvent('config', self.config_file, None, time.monotonic()))
+
+    def apply_pending_config(self):
+        """
+        Swaps in a config validated by the watcher. Only called in STANDBY, so a reload
+        never changes sounds or timings partway through an intrusion.
+        """
+        with self.pending_lock:
+            pending, self.pending_config = self.pending_config, None
+        if pending is None:
+            return
+        config, changed, timings, ready_at = pending
+        started = time.monotonic()
+        # Sounds the watcher re-decoded were staged, cached ones only change here
+        self.sound_bank.swap_staged()
+        self.sounds = config['sounds']
+        self.unauthorized_pause = config.get('unauthorized_pause', (0.5, 1))
+        self.warning_delay = config.get('warning_delay', 3)
+        self.alarm_delay = config.get('alarm_delay', 5)
+        swapped = time.monotonic()
+        logging.info(f"Config reloaded ({', '.join(sorted(changed)) or 'sound files'}): validate {timings['validate']:.3f}s, "
+                     f"{timings['decoded']} sounds decoded in {timings['sounds']:.3f}s, "
+                     f"waited {started - ready_at:.3f}s for standby, swap {(swapped - started) * 1e6:.0f}us")
+        self.journal.record('reload', changed=sorted(changed), decoded=timings['decoded'],
+                            validate=round(timings['validate'], 4), sounds=round(timings['sounds'], 4),
+                            waited=round(started - ready_at, 4))
+
+    def wait_for_audio(self):
+        # Motion seen during a fast startup waits here until the mixer and sounds are ready
+        if not self.audio_ready.is_set():
+            logging.info("Motion during startup, waiting for audio warm-up")
+            self.audio_ready.wait()
+        if self.warmup_error is not None:
+            raise RuntimeError(f"Audio warm-up failed: {self.warmup_error}")
+
+    def play_led(self, effect, started_at=None):
+        if self.metrics is not None:
+            self.metrics.inc('led_effects_total', effect=effect.name)
+        return self.led.play(effect, started_at)
 
     def flicker_led(self, duration, intensity=100):
-        start_time = time.time()
-        while time.time() - start_time < duration:
-            on_time = random.uniform(0.01, 0.1)
-            off_time = random.uniform(0.01, 0.1)
-            self.led_pwm.ChangeDutyCycle(intensity)
-            time.sleep(on_time)
-            self.led_pwm.ChangeDutyCycle(0)
-            time.sleep(off_time)
-        self.led_pwm.ChangeDutyCycle(intensity)
+        return self.play_led(flicker(duration, intensity, fps=self.leds.fps))
+
+    def play_sound_async(self, file_path, priority=None, layer=False):
+        self.wait_for_audio()
+        requested = self.clock.monotonic()
+        if priority is None:
+            playback = self.audio.play(file_path)
+            self.journal.record('sound', state=self.state.name, path=file_path)
+        else:
+            playback = self.audio.play(file_path, priority, layer, self.audio_crossfade_ms)
+            self.journal.record('sound', state=self.state.name, path=file_path, priority=priority, layer=layer)
+        # Kept until it ends, so a shutdown can cut it off
+        self.playing.add(playback)
+        playback.add_done_callback(self.playing.discard)
+        playback.add_done_callback(lambda handle: self.journal.record(
+            'sound_end', path=handle.path, completed=handle.future.result(),
+            duration=round((handle.finished_at or handle.started_at) - handle.started_at, 3)))
+        if self.metrics is not None:
+            # Observed at the end: with worker processes started_at is only corrected to the
+            # worker's start once it reports it, which is always before the end
+            playback.add_done_callback(lambda handle: self.metrics.observe(
+                'audio_start_delay_seconds', handle.started_at - requested))
+            playback.add_done_callback(lambda handle: self.metrics.observe(
+                'sound_seconds', (handle.finished_at or handle.started_at) - handle.started_at,
+                completed=str(handle.future.result()).lower()))
+        return playback
+
+    def play_with_leds(self, file_path, fallback=None, end=100, priority=None, layer=False):
+        """
+        Starts file_path and, in 'envelope' mode, has the LED follow its loudness from the
+        moment it started, then hold end. Otherwise plays the fallback LED effect, if any.
+        Returns (playback, LED future or None).
+        """
+        following = None
+        if fallback is not None and (self.envelopes is None or not self.audio_ready.is_set()):
+            # In envelope mode this only covers an audio warm-up, the envelope preempts it
+            following = self.play_led(fallback)
+        playback = self.play_sound_async(file_path, priority, layer)
+        effect = self.envelopes.effect(file_path, end=end) if self.envelopes is not None else None
+        if effect is not None:
+            following = self.play_led(effect, started_at=playback.started_at)
+        elif following is None and fallback is not None:
+            following = self.play_led(fallback)
+        return playback, following
 
     def play_sound(self, file_path):
+        playback, _ = self.play_with_leds(file_path)
+        return playback.wait()
+
+    def play_escalation(self, file_path, priority, delay):
+        """
+        Plays an escalation clip and waits delay. Without audio_preemption the wait starts
+        once the clip ends; with it the wait starts with the clip, which the next clip then
+        cuts in over. Returns the clip's playback.
+        """
+        if not self.audio_preemption:
+            playback, _ = self.play_with_leds(file_path)
+            playback.wait()
+        else:
+            playback, _ = self.play_with_leds(file_path, priority=priority)
+        self.clock.sleep(delay)
+        return playback
+
+    def power_down_sequence(self, deadline=None):
+        """
+        Plays the power-down sound with the LED fading out. With a deadline (clock.monotonic())
+        the fade is squeezed to end by then, and whatever is still playing at the deadline is
+        cut off and the LED switched off.
+        """
+        self.journal.status('No movement detected, powering down', state=self.state.name)
+        self.wait_for_audio()
+        try:
+            power_down_duration = self.sound_bank.duration(self.sounds['power_down'])
+        except (RuntimeError, futures.TimeoutError) as e:
+            # The audio worker is restarting; the sound fails at once, the LED still fades
+            logging.error(f"Power-down sound length unavailable ({e}), fading over {FALLBACK_FADE}s")
+            power_down_duration = FALLBACK_FADE
+        if deadline is not None:
+            power_down_duration = min(power_down_duration, max(0, deadline - self.clock.monotonic()))
+
+        playback, fade_out = self.play_with_leds(self.sounds['power_down'],
+                                                 fade(power_down_duration, fps=self.leds.fps), end=0)
+        if deadline is None:
+            playback.wait()
+            fade_out.result()
+            return
+        if playback.wait(max(0, deadline - self.clock.monotonic())) is None:
+            playback.stop()
         try:
-            sound = pygame.mixer.Sound(file_path)
-            sound.play()
-            while pygame.mixer.get_busy():
-                pygame.time.delay(100)
-        except pygame.error as e:
-            logging.error(f"Failed to play sound {file_path}: {e}")
-
-    def power_down_sequence(self):
-        logging.info('No movement detected, powering down')
-        print("Status: No movement detected, powering down")
-        power_down_duration = MP3(self.sounds['power_down']).info.length
-
-        def fade_out_led():
-            start_time = time.time()
-            while time.time() - start_time < power_down_duration:
-                elapsed_time = time.time() - start_time
-                brightness = int(100 * (1 - elapsed_time / power_down_duration))
-                self.led_pwm.ChangeDutyCycle(brightness)
-                time.sleep(0.1)
-            self.led_pwm.ChangeDutyCycle(0)
-
-        fade_out_thread = threading.Thread(target=fade_out_led)
-        fade_out_thread.start()
-        self.play_sound(self.sounds['power_down'])
-        fade_out_thread.join()
+            fade_out.result(max(0, deadline - self.clock.monotonic()))
+        except futures.TimeoutError:
+            self.led.write(0)
+
+    def handle_command(self, event):
+        if event.kind != 'command':
+            return
+        if event.value == 'disarm' and self.armed:
+            self.journal.status('Voice command: sentry mode disarmed', state=self.state.name)
+            self.armed = False
+        elif event.value == 'arm' and not self.armed:
+            self.journal.status('Voice command: sentry mode armed', state=self.state.name)
+            self.armed = True
+        else:
+            return
+        self.save_state()
+
+    def process_commands(self):
+        # Drains pending voice commands between states; queued PIR edges are stale by now
+        while True:
+            try:
+                self.handle_command(self.events.get_nowait())
+            except queue.Empty:
+                return
+
+    def motion_present(self):
+        if self.pir_filter is not None:
+            return self.pir_filter.presence().present
+        return self.gpio.input(self.PIR_PIN)
+
+    def confirm_motion(self):
+        # With a filter, a PIR edge only counts once the filter window agrees it was motion
+        if self.pir_filter is None:
+            return True
+        self.clock.sleep(self.pir_filter.window)
+        presence = self.pir_filter.presence()
+        if not presence.present:
+            self.journal.record('glitch', confidence=round(presence.confidence, 2))
+        return presence.present
 
     def handle_standby(self):
-        if GPIO.input(self.PIR_PIN):
+        if not self.armed:
+            # Motion is ignored while disarmed, only a voice command can wake us
+            self.handle_command(self.events.get())
+        elif self.detection_mode == 'edge':
+            # Sleeps on the event queue until the PIR interrupt fires, no polling
+            event = self.pir_watcher.wait_for_motion()
+            if event.kind != 'motion':
+                self.handle_command(event)
+                return
+            if not self.confirm_motion():
+                return
+            self.motion_detected_at = event.timestamp
+            self.state = SystemState.POWERING_ON
+        elif self.motion_present():
+            self.motion_detected_at = self.clock.monotonic()
             self.state = SystemState.POWERING_ON
         else:
-            time.sleep(1)
+            self.clock.sleep(1)
 
     def handle_powering_on(self):
-        logging.info('Motion detected, system powering on')
-        print("Status: Motion detected, system powering on")
-        flicker_thread = threading.Thread(target=self.flicker_led, args=(2, 100))
-        flicker_thread.start()
-        self.play_sound(self.sounds['power_on'])
-        flicker_thread.join()
+        self.journal.status('Motion detected, system powering on', state=self.state.name)
+        playback, flickering = self.play_with_leds(self.sounds['power_on'], flicker(2, 100, fps=self.leds.fps))
+        if self.metrics is not None and self.motion_detected_at is not None:
+            detected_at = self.motion_detected_at
+            playback.add_done_callback(lambda handle: self.metrics.observe(
+                'motion_to_audio_seconds', handle.started_at - detected_at))
+        playback.wait()
+        flickering.result()
         self.state = SystemState.UNAUTHORIZED
 
     def handle_unauthorized(self):
         pause_duration = random.uniform(*self.unauthorized_pause)
-        time.sleep(pause_duration)
-        self.play_sound(random.choice(self.sounds['unauthorized']))
-        time.sleep(self.warning_delay)
-        if GPIO.input(self.PIR_PIN):
+        self.clock.sleep(pause_duration)
+        playback = self.play_escalation(random.choice(self.sounds['unauthorized']), 'unauthorized', self.warning_delay)
+        if self.motion_present():
             self.state = SystemState.WARNING
         else:
+            # Nothing to hurry for, the clip plays out before the power-down
+            playback.wait()
             self.state = SystemState.POWERING_DOWN
 
     def handle_warning(self):
-        logging.info('Movement still detected, playing warning')
-        print("Status: Movement still detected, playing warning")
-        self.play_sound(random.choice(self.sounds['warning']))
-        time.sleep(self.alarm_delay)
-        if GPIO.input(self.PIR_PIN):
+        self.journal.status('Movement still detected, playing warning', state=self.state.name)
+        playback = self.play_escalation(random.choice(self.sounds['warning']), 'warning', self.alarm_delay)
+        if self.motion_present():
             self.state = SystemState.ALARM
         else:
+            playback.wait()
             self.state = SystemState.POWERING_DOWN
 
     def handle_alarm(self):
-        logging.info('Intruder refuses to leave, triggering alarm')
-        print("Status: Intruder refuses to leave, triggering alarm")
-        self.play_sound(self.sounds['alarm'])
+        self.journal.status('Intruder refuses to leave, triggering alarm', state=self.state.name)
+        if not self.audio_preemption:
+            self.play_sound(self.sounds['alarm'])
+        else:
+            playback, _ = self.play_with_leds(self.sounds['alarm'], priority='alarm')
+            # Optional voice lines layered over the alarm bed
+            if self.sounds.get('alarm_voice'):
+                self.play_sound_async(random.choice(self.sounds['alarm_voice']), 'alarm', layer=True).wait()
+            playback.wait()
         self.state = SystemState.POWERING_DOWN
 
+    def step(self):
+        """
+        Runs the handler for the current state once and returns the state before it.
+        """
+        previous_state = self.state
+        started = self.clock.monotonic()
+        if self.state == SystemState.STANDBY:
+            if self.pending_config is not None:
+                self.apply_pending_config()
+            self.handle_standby()
+        elif self.state == SystemState.POWERING_ON:
+            self.handle_powering_on()
+        elif self.state == SystemState.UNAUTHORIZED:
+            self.handle_unauthorized()
+        elif self.state == SystemState.WARNING:
+            self.handle_warning()
+        elif self.state == SystemState.ALARM:
+            self.handle_alarm()
+        elif self.state == SystemState.POWERING_DOWN:
+            self.power_down_sequence()
+            self.state = SystemState.STANDBY
+        self.process_commands()
+        # Disarming mid-escalation skips straight to powering down
+        if not self.armed and self.state not in (SystemState.STANDBY, SystemState.POWERING_DOWN):
+            self.state = SystemState.POWERING_DOWN
+        if self.state != previous_state:
+            self.journal.record('state', state=self.state.name, previous=previous_state.name)
+            if previous_state == SystemState.STANDBY:
+                self.incident_started = self.clock.time()
+            elif self.state == SystemState.STANDBY:
+                self.incident_started = None
+            self.save_state()
+        if self.metrics is not None:
+            self._observe_step(previous_state, started)
+        return previous_state
+
+    def _observe_step(self, previous_state, started):
+        now = self.clock.monotonic()
+        self.metrics.observe('handler_seconds', now - started, handler=HANDLERS[previous_state])
+        if self.state != previous_state:
+            self.metrics.observe('state_seconds', now - self.state_entered_at, state=previous_state.name)
+            self.metrics.inc('state_transitions_total', state=self.state.name)
+            self.state_entered_at = now
+
+    def save_state(self):
+        if self.snapshot is not None:
+            self.snapshot.save(state=self.state.name, armed=self.armed, incident_started=self.incident_started,
+                               saved=self.clock.time(), pid=os.getpid())
+
+    def _resume(self, record):
+        # Only an incident cut short by a crash is resumed: a clean shutdown saves STANDBY
+        if record is None or record['state'] == SystemState.STANDBY.name:
+            return
+        age = self.clock.time() - record['saved']
+        if age > self.resume_window:
+            logging.info(f"Not resuming {record['state']} saved {age:.0f}s ago, older than resume_window")
+            return
+        self.state = SystemState[record['state']]
+        self.armed = record['armed']
+        self.incident_started = record['incident_started']
+        self.journal.status(f"Restarted mid-incident, resuming {self.state.name}", state=self.state.name)
+        self.journal.record('resume', state=self.state.name, age=round(age, 3), pid=record['pid'],
+                            incident_started=self.incident_started)
+
     def run(self):
+        if self.engine == 'async':
+            return self.run_async()
+        if self.voice is not None:
+            self.voice.start()
         try:
             while True:
-                if self.state == SystemState.STANDBY:
-                    self.handle_standby()
-                elif self.state == SystemState.POWERING_ON:
-                    self.handle_powering_on()
-                elif self.state == SystemState.UNAUTHORIZED:
-                    self.handle_unauthorized()
-                elif self.state == SystemState.WARNING:
-                    self.handle_warning()
-                elif self.state == SystemState.ALARM:
-                    self.handle_alarm()
-                elif self.state == SystemState.POWERING_DOWN:
-                    self.power_down_sequence()
-                    self.state = SystemState.STANDBY
-        finally:
+                self.step()
+        except SystemExit:
+            # A signal (see _exit) or an explicit stop
             self.shutdown()
+        except BaseException:
+            logging.exception("State machine crashed, shutting down")
+            self.shutdown(crashed=True)
+
+    def run_async(self):
+        import asyncio
+        from asyncengine import AsyncStateMachine, run_machines
 
-    def shutdown(self, signum=None, frame=None):
+        # The async engine takes the audio player and voice pipeline as they are at startup
+        self.warmed_up.wait()
+        # The async engine registers its own PIR interrupt, which feeds the event loop
+        self.pir_watcher.stop()
+        try:
+            asyncio.run(run_machines([AsyncStateMachine.from_system(self)], self.gpio, self.pir_bouncetime, self.voice))
+        except SystemExit:
+            self.shutdown()
+        except BaseException:
+            logging.exception("State machine crashed, shutting down")
+            self.shutdown(crashed=True)
+
+    def _stats(self, backend):
+        # A worker restarting during shutdown costs the stats line, not the shutdown
+        try:
+            return backend.stats()
+        except (RuntimeError, futures.TimeoutError) as e:
+            return f"unavailable ({e})"
+
+    def _exit(self, signum=None, frame=None):
+        # Unwinds run() so shutdown() starts from its finally, with every lock the
+        # interrupted step held released, rather than inside the signal handler
+        sys.exit(0)
+
+    def shutdown(self, signum=None, frame=None, crashed=False):
+        """
+        Plays the power-down within shutdown_deadline and releases the hardware, then exits:
+        with status 0 on a signal or a direct call, which saves STANDBY for the next start,
+        or with status 1 when crashed, keeping the snapshot so the restart resumes the incident.
+        """
+        # Called again by run() after a direct shutdown()
+        if self.stopped:
+            return
+        self.stopped = True
+        started = self.clock.monotonic()
+        deadline = None if self.shutdown_deadline is None else started + self.shutdown_deadline
         logging.info("Shutting down gracefully...")
-        self.power_down_sequence()
+        if self.voice is not None:
+            self.voice.stop()
+        if self.config_reloader is not None:
+            self.config_reloader.stop()
+        # Stopped before audio came up (or it failed to): nothing to play the power-down on
+        if self.audio_ready.is_set() and self.warmup_error is None:
+            logging.info(f"Sound cache stats: {self._stats(self.sound_bank)}")
+            if deadline is not None:
+                # A clip from the interrupted state would play on under the power-down
+                for playback in list(self.playing):
+                    playback.stop()
+            self.power_down_sequence(deadline)
+            self.audio.stop()
+        logging.info(f"LED scheduler stats: {self._stats(self.leds)}")
+        self.leds.stop()
+        self.pir_watcher.stop()
+        if self.pir_filter is not None:
+            self.pir_filter.stop()
         self.led_pwm.stop()
-        GPIO.cleanup()
-        pygame.mixer.quit()
-        sys.exit(0)
+        self.gpio.cleanup()
+        if self.supervisor is not None:
+            logging.info(f"Worker stats: {self.supervisor.stats()}")
+            self.supervisor.stop()
+        if self.mixer_started:
+            import pygame
+            pygame.mixer.quit()
+        if self.metrics is not None:
+            self.metrics.stop()
+        if self.snapshot is not None:
+            # A deliberate stop: the next start begins in standby
+            if not crashed:
+                self.state = SystemState.STANDBY
+                self.incident_started = None
+                self.save_state()
+            self.snapshot.close()
+        logging.info(f"Shutdown took {self.clock.monotonic() - started:.3f}s")
+        self.journal.close()
+        sys.exit(1 if crashed else 0)
 
 if __name__ == "__main__":
     system = IntrusionDetectionSystem('config.json')
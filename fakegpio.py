@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+
+
+class FakePWM:
+    """
+    Stand-in for RPi.GPIO.PWM that records every duty cycle written to it.
+    """
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0
+        self.running = False
+        self.writes = 0
+
+    def start(self, duty_cycle):
+        self.running = True
+        self.ChangeDutyCycle(duty_cycle)
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.writes += 1
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.running = False
+
+
+class FakeGPIO:
+    """
+    In-memory replacement for the RPi.GPIO module so the state machine can run on a
+    normal Linux box. Input levels are driven with set_input()/inject_edge(), which also
+    fire any callbacks registered through add_event_detect() just like the real library.
+    """
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    FALLING = 32
+    RISING = 31
+    BOTH = 33
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+        self.levels = {}
+        self.pwms = []
+        self._detect = {}
+        self._last_edge = {}
+        self._lock = threading.Lock()
+        self._callbacks = queue.Queue()
+        self._callback_thread = None
+        self._clock = None
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        self.pins[pin] = direction
+        self.levels.setdefault(pin, self.LOW if initial is None else initial)
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def output(self, pin, value):
+        self.levels[pin] = value
+
+    def PWM(self, pin, frequency):
+        pwm = FakePWM(self, pin, frequency)
+        self.pwms.append(pwm)
+        return pwm
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if pin in self._detect:
+            raise RuntimeError(f"Conflicting edge detection already enabled for GPIO {pin}")
+        self._detect[pin] = (edge, [callback] if callback else [], bouncetime)
+
+    def add_event_callback(self, pin, callback):
+        self._detect[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        self._detect.pop(pin, None)
+
+    def cleanup(self, pins=None):
+        if pins is None:
+            self._detect.clear()
+            self.pins.clear()
+            with self._lock:
+                if self._callback_thread is not None:
+                    self._callbacks.put(None)
+                    self._callback_thread = None
+        else:
+            for pin in ([pins] if isinstance(pins, int) else pins):
+                self._detect.pop(pin, None)
+                self.pins.pop(pin, None)
+
+    def set_input(self, pin, value):
+        """
+        Drives an input pin to the given level, firing edge callbacks on a change.
+        """
+        with self._lock:
+            previous = self.levels.get(pin, self.LOW)
+            self.levels[pin] = value
+        if previous != value:
+            self._fire(pin, self.RISING if value else self.FALLING)
+
+    def inject_edge(self, pin, rising=True):
+        """
+        Injects a single edge on an input pin (rising by default).
+        """
+        self.set_input(pin, self.HIGH if rising else self.LOW)
+
+    def use_clock(self, clock):
+        """
+        Measures bouncetime on clock (a simulation.VirtualClock) and runs edge callbacks
+        on the thread that changed the level, so a single-threaded simulation sees each
+        edge the moment its virtual time comes.
+        """
+        self._clock = clock
+
+    def _now(self):
+        # Clock the bouncetime is measured on
+        return time.monotonic() if self._clock is None else self._clock.monotonic()
+
+    def _fire(self, pin, edge):
+        detect = self._detect.get(pin)
+        if detect is None:
+            return
+        wanted, callbacks, bouncetime = detect
+        if wanted != self.BOTH and wanted != edge:
+            return
+        now = self._now()
+        if bouncetime and now - self._last_edge.get(pin, float('-inf')) < bouncetime / 1000:
+            return
+        self._last_edge[pin] = now
+        if self._clock is not None:
+            for callback in list(callbacks):
+                callback(pin)
+            return
+        # RPi.GPIO runs all callbacks in order on one background thread, so do the same here
+        with self._lock:
+            if self._callback_thread is None:
+                self._callback_thread = threading.Thread(target=self._run_callbacks, daemon=True)
+                self._callback_thread.start()
+        for callback in list(callbacks):
+            self._callbacks.put((callback, pin))
+
+    def _run_callbacks(self):
+        while True:
+            item = self._callbacks.get()
+            if item is None:
+                break
+            callback, pin = item
+            callback(pin)
@@ -1,10 +1,8 @@
 import RPi.GPIO as GPIO
-import time
-import random
 import logging
-from mutagen.mp3 import MP3
 import pygame
-import speech_recognition as sr  # For voice commands
+from soundbank import SoundBank
+from rgbpipeline import RGBLed, rgb_flicker
 
 # Setup logging
 logging.basicConfig(filename='intrusion_log.log', level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
@@ -32,19 +30,30 @@ red_pwm.start(0)
 green_pwm.start(0)
 blue_pwm.start(0)
 
+# Gamma-corrected RGB LED that only writes the channels that change
+rgb_led = RGBLed(red_pwm, green_pwm, blue_pwm)
+
 # Define sound file paths
 greeting_sound = '/home/domin/JARVIS/sounds/greeting.mp3'
 sentry_enabled_sound = '/home/domin/JARVIS/sounds/sentry_enabled.mp3'
 power_down_sound = '/home/domin/JARVIS/sounds/powerdown.mp3'
 
+# Offline speech model for the voice commands, see https://alphacephei.com/vosk/models
+vosk_model_path = '/home/domin/JARVIS/models/vosk-model-small-en-us-0.15'
+voice = None
+
 # Initialize Pygame mixer
 pygame.mixer.init()
 
+# Decode all sounds once up front instead of on every play
+sound_bank = SoundBank()
+sound_bank.preload([greeting_sound, sentry_enabled_sound, power_down_sound])
+
 def play_sound(file_path):
     """
     Plays a sound file using Pygame mixer.
     """
-    sound = pygame.mixer.Sound(file_path)
+    sound = sound_bank.get(file_path)
     sound.play()
     while pygame.mixer.get_busy():
         pygame.time.delay(100)  # Wait until the sound finishes playing
@@ -56,9 +65,7 @@ def set_led_color(red, green, blue):
     :param green: Brightness of green channel (0-100)
     :param blue: Brightness of blue channel (0-100)
     """
-    red_pwm.ChangeDutyCycle(red)
-    green_pwm.ChangeDutyCycle(green)
-    blue_pwm.ChangeDutyCycle(blue)
+    rgb_led.set_color(red, green, blue)
 
 def flicker_led(duration, color=(100, 0, 0)):
     """
@@ -66,32 +73,30 @@ def flicker_led(duration, color=(100, 0, 0)):
     :param duration: Duration of the flickering effect in seconds.
     :param color: Tuple (red, green, blue) for the LED color during flickering.
     """
-    start_time = time.time()
-    while time.time() - start_time < duration:
-        on_time = random.uniform(0.05, 0.2)  # Random on-time duration
-        off_time = random.uniform(0.05, 0.2)  # Random off-time duration
-        set_led_color(*color)
-        time.sleep(on_time)
-        set_led_color(0, 0, 0)
-        time.sleep(off_time)
-    set_led_color(*color)  # Ensure LED stays on after flickering
-
-def listen_for_command():
+    rgb_led.play(rgb_flicker(duration, color))  # Ends with the LED on in color
+
+def start_voice():
+    """
+    Starts the background voice listener once and returns it. Commands it hears arrive on
+    voice.events as SensorEvents, so nothing blocks on the microphone.
+    """
+    global voice
+    if voice is None:
+        # Imported here so speech_recognition and vosk don't slow down startup
+        from keywordspot import CommandListener
+        from voicepipeline import VoicePipeline
+        # Opened and calibrated once, then read frame by frame on the listener's thread
+        voice = VoicePipeline.from_listener(CommandListener(vosk_model_path))
+        voice.start()
+    return voice
+
+def wait_for_command(command):
     """
-    Listens for voice commands and returns the detected phrase.
+    Blocks until the voice listener hears command ('arm' or 'disarm'), dropping any other.
     """
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening for the activation command...")
-        try:
-            audio = recognizer.listen(source, timeout=10)  # Listen for 10 seconds max
-            command = recognizer.recognize_google(audio)
-            return command.lower()
-        except sr.UnknownValueError:
-            return None
-        except sr.RequestError as e:
-            logging.error(f"Speech recognition error: {e}")
-            return None
+    events = start_voice().events
+    while events.get().value != command:
+        pass
 
 def initialize_system():
     """
@@ -99,20 +104,18 @@ def initialize_system():
     """
     play_sound(greeting_sound)
     flicker_led(2, color=(100, 100, 0))  # Flicker yellow LED
-    while True:
-        command = listen_for_command()
-        if command and "enable sentry mode" in command:
-            logging.info("Sentry mode enabled")
-            play_sound(sentry_enabled_sound)
-            flicker_led(2, color=(100, 0, 0))  # Flicker red LED
-            return
+    print("Listening for the activation command...")
+    wait_for_command('arm')
+    logging.info("Sentry mode enabled")
+    play_sound(sentry_enabled_sound)
+    flicker_led(2, color=(100, 0, 0))  # Flicker red LED
 
 def power_down_sequence():
     """
     Performs the power-down sequence, including LED flickering and sound playback.
     """
     logging.info('No movement detected, powering down')
-    power_down_duration = MP3(power_down_sound).info.length
+    power_down_duration = sound_bank.duration(power_down_sound)
     flicker_led(2, color=(100, 0, 0))  # Flicker red LED before power-down
     play_sound(power_down_sound)
     # Gradually fade out LED during power-down sound
@@ -2,9 +2,9 @@ import RPi.GPIO as GPIO
 import time
 import random
 import logging
-from mutagen.mp3 import MP3
 import pygame
 import threading
+from soundbank import SoundBank
 
 class IntrusionDetectionSystem:
     def __init__(self, pir_pin, led_pin, sounds):
@@ -34,6 +34,11 @@ class IntrusionDetectionSystem:
         # Initialize Pygame mixer
         pygame.mixer.init()
 
+        # Decode all sounds once up front instead of on every play
+        self.sound_bank = SoundBank()
+        self.sound_bank.preload([self.power_on_sound, *self.unauthorized_sounds, *self.warning_sounds,
+                                 self.alarm_sound, self.power_down_sound])
+
     def flicker_led(self, duration, intensity=100):
         """
         Flickers the LED for a given duration using PWM for intensity control.
@@ -52,7 +57,7 @@ class IntrusionDetectionSystem:
         """
         Plays a sound file using Pygame mixer.
         """
-        sound = pygame.mixer.Sound(file_path)
+        sound = self.sound_bank.get(file_path)
         sound.play()
         while pygame.mixer.get_busy():
             pygame.time.delay(100)  # Wait until the sound finishes playing
@@ -63,7 +68,7 @@ class IntrusionDetectionSystem:
         """
         logging.info('No movement detected, powering down')
         print("Status: No movement detected, powering down")
-        power_down_duration = MP3(self.power_down_sound).info.length
+        power_down_duration = self.sound_bank.duration(self.power_down_sound)
 
         def fade_out_led():
             start_time = time.time()
@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+
+class EventJournal:
+    """
+    Structured, append-only event log written off the detection path. record() only
+    timestamps the event and puts it on a queue; a writer thread writes whatever has
+    queued up in one batch, one JSON line per event, and rotates the file like RotatingFileHandler
+    (path, path.1 ... path.N). With text_log on, 'status' events are also written to the
+    regular text log and stdout by the writer thread, as the old logging.info/print did.
+    """
+    def __init__(self, path='intrusion_events.jsonl', max_bytes=1_000_000, backup_count=5,
+                 text_log=True, batch_size=256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.text_log = text_log
+        self.batch_size = batch_size
+        self.written = 0
+        self.batches = 0
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a journal from the optional "journal" block of config.json.
+        """
+        journal = config.get('journal', {})
+        return cls(journal.get('path', 'intrusion_events.jsonl'), journal.get('max_bytes', 1_000_000),
+                   journal.get('backup_count', 5), journal.get('text_log', True))
+
+    def start(self):
+        if self._thread is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._thread = threading.Thread(target=self._run, name='journal', daemon=True)
+            self._thread.start()
+
+    def record(self, event, **fields):
+        """
+        Queues one event. This is all the hot path pays for: no formatting and no I/O.
+        """
+        self._queue.put({'ts': time.time(), 'event': event, **fields})
+
+    def status(self, message, **fields):
+        # Human-readable status line, mirrored to the text log when text_log is on
+        self.record('status', message=message, **fields)
+
+    def close(self):
+        """
+        Writes everything still queued and stops the writer thread.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            self._file.close()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Everything that queued up during the last write goes out in the same one
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+            if batch:
+                self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch):
+        lines = []
+        for fields in batch:
+            lines.append(json.dumps(fields, separators=(',', ':'), default=str))
+            if self.text_log and fields['event'] == 'status':
+                logging.info(fields['message'])
+                print(f"Status: {fields['message']}")
+        data = '\n'.join(lines) + '\n'
+        try:
+            if self.max_bytes and self._file.tell() + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+        except OSError as e:
+            logging.error(f"Failed to write event journal {self.path}: {e}")
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
@@ -0,0 +1,91 @@
+import json
+import logging
+import time
+from collections import namedtuple
+
+import speech_recognition as sr
+from vosk import KaldiRecognizer, Model, SetLogLevel
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 1600  # 100 ms of 16-bit mono audio per frame
+
+# Spoken phrase -> command name passed on to the state machine
+DEFAULT_COMMANDS = {
+    'enable sentry mode': 'arm',
+    'disable sentry mode': 'disarm',
+}
+
+# command is the name from the commands mapping, audio_time the offset in seconds of the
+# frame that completed the phrase, counted from the start of the stream
+Detection = namedtuple('Detection', ['command', 'phrase', 'audio_time'])
+
+
+class KeywordSpotter:
+    """
+    Offline, streaming detector for a small fixed set of phrases using a Vosk model whose
+    grammar is restricted to those phrases. Audio is fed frame by frame as it arrives and
+    partial results are checked after every frame, so a phrase is reported as soon as its
+    last word is decoded instead of after a network round trip.
+    """
+    def __init__(self, model_path, commands=None, sample_rate=SAMPLE_RATE):
+        SetLogLevel(-1)
+        self.commands = dict(commands or DEFAULT_COMMANDS)
+        self.sample_rate = sample_rate
+        self.model = Model(model_path)
+        # "[unk]" lets everything else in the room decode to nothing instead of a near match
+        grammar = json.dumps(sorted(self.commands) + ['[unk]'])
+        self.recognizer = KaldiRecognizer(self.model, sample_rate, grammar)
+        self.samples_seen = 0
+
+    def reset(self):
+        self.recognizer.Reset()
+
+    def process(self, frame):
+        """
+        Feeds one frame of 16-bit mono PCM. Returns a Detection when it completes a
+        command phrase, otherwise None.
+        """
+        self.samples_seen += len(frame) // 2
+        if self.recognizer.AcceptWaveform(frame):
+            text = json.loads(self.recognizer.Result()).get('text', '')
+        else:
+            text = json.loads(self.recognizer.PartialResult()).get('partial', '')
+        for phrase, command in self.commands.items():
+            if phrase in text:
+                # Start the next utterance clean so the same phrase isn't reported twice
+                self.recognizer.Reset()
+                return Detection(command, phrase, self.samples_seen / self.sample_rate)
+        return None
+
+
+class CommandListener:
+    """
+    Keeps one open microphone, its ambient-noise calibration and one KeywordSpotter alive
+    across listen() calls, instead of rebuilding them on every call.
+    """
+    def __init__(self, model_path, commands=None, device_index=None):
+        self.spotter = KeywordSpotter(model_path, commands)
+        self.recognizer = sr.Recognizer()
+        self.microphone = sr.Microphone(device_index=device_index, sample_rate=SAMPLE_RATE,
+                                        chunk_size=FRAME_SAMPLES)
+        self.source = self.microphone.__enter__()
+        self.recognizer.adjust_for_ambient_noise(self.source, duration=1)
+        logging.info(f"Microphone calibrated, energy threshold {self.recognizer.energy_threshold:.0f}")
+
+    def read_frame(self):
+        return self.source.stream.read(self.source.CHUNK)
+
+    def listen(self, timeout=10):
+        """
+        Reads microphone frames until a command phrase is heard or timeout seconds pass.
+        Returns the Detection or None.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            detection = self.spotter.process(self.read_frame())
+            if detection is not None:
+                return detection
+        return None
+
+    def close(self):
+        self.microphone.__exit__(None, None, None)
@@ -0,0 +1,210 @@
+import logging
+import math
+import random
+import threading
+import time
+from array import array
+from concurrent import futures
+from functools import lru_cache
+
+DEFAULT_FPS = 50
+
+
+class LEDEffect:
+    """
+    A precomputed duty-cycle waveform, one value per frame at fps frames per second.
+    The last value is held once the frames run out.
+    """
+    def __init__(self, name, frames, fps=DEFAULT_FPS):
+        self.name = name
+        self.frames = frames
+        self.fps = fps
+
+    @property
+    def duration(self):
+        return len(self.frames) / self.fps
+
+
+def flicker(duration, intensity=100, on_time=(0.01, 0.1), off_time=(0.01, 0.1), fps=DEFAULT_FPS):
+    """
+    Random on/off flicker like the original flicker_led, ending with the LED on at intensity.
+    The random pattern is drawn once here, not while the effect plays.
+    """
+    frames = array('f')
+    total = int(duration * fps)
+    while len(frames) < total:
+        frames.extend([intensity] * max(1, round(random.uniform(*on_time) * fps)))
+        frames.extend([0] * max(1, round(random.uniform(*off_time) * fps)))
+    frames.append(intensity)
+    return LEDEffect('flicker', frames, fps)
+
+
+@lru_cache(maxsize=32)
+def _fade_frames(duration, start, end, fps):
+    count = max(1, int(duration * fps))
+    frames = array('f', (int(start + (end - start) * i / count) for i in range(count)))
+    frames.append(end)
+    return frames
+
+
+def fade(duration, start=100, end=0, fps=DEFAULT_FPS):
+    """
+    Linear ramp from start to end. Waveforms are cached, a repeated fade costs nothing to build.
+    """
+    return LEDEffect('fade', _fade_frames(duration, start, end, fps), fps)
+
+
+@lru_cache(maxsize=32)
+def _pulse_frames(duration, period, low, high, fps):
+    count = max(1, int(duration * fps))
+    return array('f', (int(low + (high - low) * (1 - math.cos(2 * math.pi * i / (period * fps))) / 2)
+                       for i in range(count)))
+
+
+def pulse(duration, period=1.0, low=0, high=100, fps=DEFAULT_FPS):
+    return LEDEffect('pulse', _pulse_frames(duration, period, low, high, fps), fps)
+
+
+def hold(value):
+    return LEDEffect('hold', array('f', [value]))
+
+
+class LEDChannel:
+    """
+    One PWM output driven by an LEDScheduler. Remembers the last duty cycle written so
+    unchanged frames never reach the GPIO.
+    """
+    def __init__(self, scheduler, name, pwm):
+        self.scheduler = scheduler
+        self.name = name
+        self.pwm = pwm
+        self.last_written = None
+        self.effect = None
+        self.started_at = None
+        self.future = None
+
+    def play(self, effect, started_at=None):
+        return self.scheduler.play(self, effect, started_at)
+
+    def write(self, duty_cycle):
+        # Direct write outside any effect, e.g. switching the LED off at shutdown
+        self.scheduler.play(self, hold(duty_cycle))
+
+
+class LEDScheduler:
+    """
+    Renders LED effects for every channel from one thread on a fixed frame clock. Frames
+    are picked from precomputed waveforms by elapsed time against time.monotonic()
+    deadlines, so a late wake-up skips frames instead of stretching the effect. A new
+    effect on a channel preempts the one playing. The thread sleeps on a condition
+    whenever no effect is running.
+    """
+    def __init__(self, fps=DEFAULT_FPS):
+        self.fps = fps
+        self.period = 1 / fps
+        self.channels = []
+        self.frames = 0
+        self.writes = 0
+        self.writes_saved = 0
+        self.jitter_total = 0.0
+        self.jitter_max = 0.0
+        # Anything with observe(seconds), e.g. a metrics.Histogram, sees every frame's jitter
+        self.jitter_histogram = None
+        self._active = set()
+        self._wakeup = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def add_channel(self, name, pwm):
+        channel = LEDChannel(self, name, pwm)
+        self.channels.append(channel)
+        return channel
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='led-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        for channel in self.channels:
+            self._finish(channel, False)
+
+    def play(self, channel, effect, started_at=None):
+        """
+        Starts effect on channel, preempting whatever it was playing. Returns a Future that
+        resolves to True when the effect finishes and False if it was preempted. started_at
+        (time.monotonic()) lines the effect up with something that started earlier, such as
+        the sound it follows.
+        """
+        future = futures.Future()
+        with self._wakeup:
+            self._finish(channel, False)
+            channel.effect = effect
+            channel.started_at = started_at if started_at is not None else time.monotonic()
+            channel.future = future
+            self._active.add(channel)
+            self._wakeup.notify()
+        return future
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'writes': self.writes,
+            'writes_saved': self.writes_saved,
+            'jitter_mean_ms': 1000 * self.jitter_total / self.frames if self.frames else 0.0,
+            'jitter_max_ms': 1000 * self.jitter_max,
+        }
+
+    def _finish(self, channel, completed):
+        if channel.future is not None and not channel.future.done():
+            channel.future.set_result(completed)
+        channel.effect = None
+        channel.future = None
+        self._active.discard(channel)
+
+    def _run(self):
+        deadline = time.monotonic()
+        while True:
+            with self._wakeup:
+                while self._running and not self._active:
+                    self._wakeup.wait()
+                    deadline = time.monotonic()
+                if not self._running:
+                    return
+                now = time.monotonic()
+                jitter = now - deadline
+                self.frames += 1
+                self.jitter_total += jitter
+                self.jitter_max = max(self.jitter_max, jitter)
+                if self.jitter_histogram is not None:
+                    self.jitter_histogram.observe(jitter)
+                for channel in list(self._active):
+                    self._render(channel, now)
+            deadline += self.period
+            # After a long stall, resynchronise rather than rendering a burst of late frames
+            if deadline < time.monotonic():
+                deadline = time.monotonic() + self.period
+            time.sleep(max(0, deadline - time.monotonic()))
+
+    def _render(self, channel, now):
+        frames = channel.effect.frames
+        index = int((now - channel.started_at) * channel.effect.fps)
+        value = frames[min(index, len(frames) - 1)]
+        if value != channel.last_written:
+            try:
+                channel.pwm.ChangeDutyCycle(value)
+            except Exception as e:
+                logging.error(f"LED write on {channel.name} failed: {e}")
+            channel.last_written = value
+            self.writes += 1
+        else:
+            self.writes_saved += 1
+        if index >= len(frames) - 1:
+            self._finish(channel, True)
@@ -0,0 +1,285 @@
+"""
+Incident analytics over the sentry logs. Streams the current and rotated text logs
+(intrusion_log.log*, including the format written by intrusiondetectionclass.py) and
+event journals (intrusion_events.jsonl*) into an on-disk SQLite index, picking up each
+file where the last run stopped, then answers range queries from the index alone.
+
+    python loganalytics.py count --since 7d
+    python loganalytics.py stats --since 2026-10-01 --until 2026-10-08
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+# Text log message -> event type. Covers errorhandling.py, the async/zone engines and the
+# legacy intrusiondetectionclass.py wording.
+TEXT_EVENTS = {
+    'Motion detected, system powering on': 'powering_on',
+    'Movement still detected, playing warning': 'warning',
+    'Intruder refuses to leave, triggering alarm': 'alarm',
+    'No movement detected, powering down': 'powering_down',
+    'Intruder left after warning, powering down': 'left_after_warning',
+    'Intruder left after unauthorized sound, powering down': 'left_after_unauthorized',
+    'Alarm sound played, initiating power-down sequence': 'alarm_finished',
+    'No movement detected, system in standby': 'standby',
+    'Voice command: sentry mode disarmed': 'disarmed',
+    'Voice command: sentry mode armed': 'armed',
+}
+
+# Journal state -> event type, so both sources answer the same queries
+JOURNAL_STATES = {
+    'POWERING_ON': 'powering_on',
+    'UNAUTHORIZED': 'unauthorized',
+    'WARNING': 'warning',
+    'ALARM': 'alarm',
+    'POWERING_DOWN': 'powering_down',
+    'STANDBY': 'standby',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    head TEXT NOT NULL,
+    path TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    UNIQUE (inode, head)
+);
+CREATE TABLE IF NOT EXISTS events (
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    zone TEXT,
+    source TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS events_by_time ON events (source, ts, type, zone);
+"""
+
+HEAD_BYTES = 4096
+
+
+class TextLineParser:
+    """
+    Parses '%(asctime)s:%(levelname)s:%(message)s' lines without strptime: the epoch of
+    each minute is computed once and cached, the seconds are added by hand.
+    """
+    def __init__(self):
+        self._minutes = {}
+
+    def timestamp(self, stamp):
+        # stamp is 'YYYY-MM-DD HH:MM:SS,mmm'
+        minute = stamp[:16]
+        base = self._minutes.get(minute)
+        if base is None:
+            base = time.mktime(time.strptime(minute, '%Y-%m-%d %H:%M'))
+            self._minutes[minute] = base
+        return base + int(stamp[17:19]) + int(stamp[20:23]) / 1000
+
+    def parse(self, line):
+        # The time itself contains ':' so split on the ones after it
+        if len(line) < 25 or line[23] != ':':
+            return None
+        level_end = line.find(':', 24)
+        if level_end < 0:
+            return None
+        message = line[level_end + 1:].rstrip('\n')
+        zone = None
+        if message.startswith('['):
+            end = message.find('] ')
+            if end > 0:
+                zone, message = message[1:end], message[end + 2:]
+        event_type = TEXT_EVENTS.get(message)
+        if event_type is None:
+            return None
+        try:
+            return self.timestamp(line[:23]), event_type, zone, None
+        except ValueError:
+            return None
+
+
+def parse_journal_line(line):
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    kind = event.get('event')
+    if kind == 'state':
+        event_type = JOURNAL_STATES.get(event.get('state'))
+        if event_type is None:
+            return None
+        return event['ts'], event_type, event.get('zone'), None
+    if kind == 'sound_end':
+        return event['ts'], 'sound', event.get('zone'), json.dumps(
+            {'path': event.get('path'), 'duration': event.get('duration'), 'completed': event.get('completed')})
+    if kind == 'status' and event.get('message', '').startswith('Voice command'):
+        return event['ts'], TEXT_EVENTS.get(event['message'], 'command'), event.get('zone'), None
+    return None
+
+
+class LogIndex:
+    def __init__(self, path='intrusion_index.sqlite'):
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def update(self, paths, batch_size=50_000):
+        """
+        Indexes whatever is new in each file. Files are identified by inode plus their first
+        line, so a rotated file (renamed, same inode) resumes where it left off, and a file
+        that shrank or was rewritten is indexed again from the start.
+        """
+        added = 0
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                with open(path, 'rb') as f:
+                    first_line = f.readline(HEAD_BYTES)
+            except OSError:
+                continue
+            if not first_line.endswith(b'\n') and len(first_line) < HEAD_BYTES:
+                # Empty, or the first line is still being written
+                continue
+            head = hashlib.sha1(first_line).hexdigest()
+            row = self.db.execute('SELECT id, offset FROM files WHERE inode = ? AND head = ?',
+                                  (stat.st_ino, head)).fetchone()
+            if row is None:
+                # A new file. Events from files rotated out of existence stay in the index.
+                file_id = self.db.execute('INSERT INTO files (inode, head, path, offset) VALUES (?, ?, ?, 0)',
+                                          (stat.st_ino, head, path)).lastrowid
+                offset = 0
+            else:
+                file_id, offset = row
+                self.db.execute('UPDATE files SET path = ? WHERE id = ?', (path, file_id))
+            if stat.st_size < offset:
+                self.db.execute('DELETE FROM events WHERE file_id = ?', (file_id,))
+                offset = 0
+            if stat.st_size > offset:
+                added += self._index_file(path, file_id, offset, batch_size)
+            self.db.commit()
+        return added
+
+    def _index_file(self, path, file_id, offset, batch_size):
+        journal = '.jsonl' in os.path.basename(path)
+        source = 'journal' if journal else 'text'
+        parse = parse_journal_line if journal else TextLineParser().parse
+        rows = []
+        added = 0
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                # A partial last line is still being written, pick it up next time
+                if not raw.endswith(b'\n'):
+                    break
+                offset += len(raw)
+                parsed = parse(raw.decode('utf-8', 'replace'))
+                if parsed is not None:
+                    ts, event_type, zone, detail = parsed
+                    rows.append((ts, event_type, zone, source, file_id, detail))
+                if len(rows) >= batch_size:
+                    added += self._flush(rows, file_id, offset)
+        added += self._flush(rows, file_id, offset)
+        return added
+
+    def _flush(self, rows, file_id, offset):
+        self.db.executemany('INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)', rows)
+        self.db.execute('UPDATE files SET offset = ? WHERE id = ?', (offset, file_id))
+        count = len(rows)
+        rows.clear()
+        return count
+
+    def counts(self, source, since, until):
+        return self.db.execute(
+            'SELECT type, COUNT(*) FROM events WHERE source = ? AND ts >= ? AND ts < ? GROUP BY type ORDER BY type',
+            (source, since, until)).fetchall()
+
+    def events(self, source, since, until):
+        return self.db.execute(
+            'SELECT ts, type, zone FROM events WHERE source = ? AND ts >= ? AND ts < ? AND type != ? '
+            'ORDER BY zone, ts', (source, since, until, 'sound'))
+
+    def state_durations(self, source, since, until):
+        """
+        Seconds from each event to the next one in the same zone, grouped by event type:
+        how long the system stayed in each state, e.g. 'warning' is how long the intruder
+        stayed after the warning before the alarm or power-down. A power-down only ends
+        at standby; the text logs never write one, so there it has no duration rather than
+        the whole idle gap until the next intrusion.
+        """
+        durations = {}
+        previous = None
+        for ts, event_type, zone in self.events(source, since, until):
+            if previous is not None and previous[2] == zone and (
+                    previous[1] != 'powering_down' or event_type == 'standby'):
+                durations.setdefault(previous[1], []).append(ts - previous[0])
+            previous = (ts, event_type, zone)
+        return durations
+
+
+def parse_time(value, now=None):
+    """
+    Accepts 'YYYY-MM-DD[ HH:MM[:SS]]' or a relative '30m', '12h', '7d' before now.
+    """
+    now = time.time() if now is None else now
+    units = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    if value[-1:] in units and value[:-1].replace('.', '', 1).isdigit():
+        return now - float(value[:-1]) * units[value[-1]]
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Unrecognised time '{value}'")
+
+
+def default_logs():
+    return sorted(glob.glob('intrusion_log.log*')) + sorted(glob.glob('intrusion_events.jsonl*'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default='intrusion_index.sqlite', help='index file')
+    parser.add_argument('--logs', nargs='+',
+                        help='log files to index (default: intrusion_log.log* and intrusion_events.jsonl*)')
+    parser.add_argument('--no-update', action='store_true', help='query the index without reading new log lines')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('index', help='index new log lines and exit')
+    for name, description in (('count', 'number of events of each type'), ('stats', 'time spent in each state')):
+        query = subparsers.add_parser(name, help=description)
+        query.add_argument('--since', type=parse_time, default=0.0)
+        query.add_argument('--until', type=parse_time, default=float('inf'))
+        query.add_argument('--source', choices=['text', 'journal'], default='text',
+                           help='text logs cover legacy history, the journal adds sound durations')
+    args = parser.parse_args(argv)
+
+    index = LogIndex(args.db)
+    try:
+        if not args.no_update:
+            started = time.monotonic()
+            added = index.update(args.logs or default_logs())
+            print(f"Indexed {added} new events in {time.monotonic() - started:.2f}s", file=sys.stderr)
+        if args.command == 'count':
+            for event_type, count in index.counts(args.source, args.since, args.until):
+                print(f"{event_type:<26}{count:>10}")
+        elif args.command == 'stats':
+            durations = index.state_durations(args.source, args.since, args.until)
+            print(f"{'state':<26}{'count':>8}{'mean s':>10}{'median s':>10}{'max s':>10}")
+            for event_type, values in sorted(durations.items()):
+                print(f"{event_type:<26}{len(values):>8}{statistics.mean(values):>10.1f}"
+                      f"{statistics.median(values):>10.1f}{max(values):>10.1f}")
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, from a fast GPIO callback to a long alarm
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+def _key(name, labels):
+    # Single-label keys, all the state machine uses, skip the sort
+    return name, tuple(sorted(labels.items()) if len(labels) > 1 else labels.items())
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is one bisect and two additions under a lock;
+    buckets are only made cumulative when rendered.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = tuple(buckets) + (float('inf'),)
+        self.counts = [0] * len(self.bounds)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        running = 0
+        buckets = []
+        for bound, bucket in zip(self.bounds, counts):
+            running += bucket
+            buckets.append((bound, running))
+        return buckets, total, count
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class CountingGPIO:
+    """
+    Wraps a GPIO module (or FakeGPIO) and counts every call by function name, PWM duty
+    cycle changes included. Constants and everything else pass straight through.
+    """
+    def __init__(self, gpio, metrics):
+        self._gpio = gpio
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._gpio, name)
+        # Constants and exception classes pass through, PWM objects are wrapped in turn
+        if not callable(attr) or (isinstance(attr, type) and name != 'PWM'):
+            return attr
+        counter = self._metrics.counter('gpio_calls_total', 'GPIO calls by function', call=name)
+
+        def counted(*args, **kwargs):
+            counter.inc()
+            result = attr(*args, **kwargs)
+            return CountingGPIO(result, self._metrics) if name == 'PWM' else result
+        # Cached on the instance, later lookups skip __getattr__
+        setattr(self, name, counted)
+        return counted
+
+
+class Metrics:
+    """
+    Counters and latency histograms for the state machine, kept in memory. An optional
+    HTTP server on host:port serves them in the Prometheus text format at /metrics, and an
+    optional writer thread saves a JSON snapshot every interval seconds. Both run on their
+    own threads; the state machine only ever pays for observe() and inc().
+    """
+    def __init__(self, host='127.0.0.1', port=9108, snapshot='metrics.json', interval=10.0, prefix='sentry'):
+        self.host = host
+        self.port = port
+        self.snapshot_path = snapshot
+        self.interval = interval
+        self.prefix = prefix
+        self.started_at = time.time()
+        self.scrapes = 0
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._threads = []
+        self._stopping = threading.Event()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds metrics from the optional "metrics" block of config.json, or returns None
+        when there isn't one.
+        """
+        if 'metrics' not in config:
+            return None
+        metrics = config['metrics']
+        return cls(metrics.get('host', '127.0.0.1'), metrics.get('port', 9108),
+                   metrics.get('snapshot', 'metrics.json'), metrics.get('interval', 10.0))
+
+    def describe(self, **help):
+        """
+        Sets the HELP text of metrics by name, for ones created through observe() and inc().
+        """
+        with self._lock:
+            self._help.update(help)
+
+    def histogram(self, name, help='', buckets=LATENCY_BUCKETS, **labels):
+        """
+        The histogram for name and labels, created on first use. Callers on a hot path
+        keep the returned object rather than looking it up each time.
+        """
+        key = _key(name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+                self._help.setdefault(name, help)
+        return histogram
+
+    def counter(self, name, help='', **labels):
+        key = _key(name, labels)
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+                self._help.setdefault(name, help)
+        return counter
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        self.counter(name, **labels).inc(amount)
+
+    def render(self):
+        """
+        Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if self._help.get(name):
+                    lines.append(f"# HELP {self.prefix}_{name} {self._help[name]}")
+                lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+
+        for (name, labels), counter in counters:
+            describe(name, 'counter')
+            lines.append(f"{self.prefix}_{name}{_format_labels(labels)} {counter.value}")
+        for (name, labels), histogram in histograms:
+            describe(name, 'histogram')
+            buckets, total, count = histogram.cumulative()
+            for bound, running in buckets:
+                lines.append(f"{self.prefix}_{name}_bucket{_format_labels(labels, [('le', _format_bound(bound))])} {running}")
+            lines.append(f"{self.prefix}_{name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{self.prefix}_{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Every metric as plain JSON-able data, histograms with cumulative bucket counts.
+        """
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        result = {'ts': time.time(), 'uptime': time.time() - self.started_at, 'counters': [], 'histograms': []}
+        for (name, labels), counter in counters:
+            result['counters'].append({'name': name, 'labels': dict(labels), 'value': counter.value})
+        for (name, labels), histogram in histograms:
+            buckets, total, count = histogram.cumulative()
+            result['histograms'].append({'name': name, 'labels': dict(labels), 'sum': total, 'count': count,
+                                         'buckets': [[_format_bound(bound), running] for bound, running in buckets]})
+        return result
+
+    def write_snapshot(self):
+        # Written aside and renamed, so a reader never sees half a snapshot
+        with open(self.snapshot_path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(self.snapshot_path + '.tmp', self.snapshot_path)
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        if self.port is not None:
+            # Imported here, http.server would add tens of ms to every daemon start
+            from http.server import ThreadingHTTPServer
+            try:
+                self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+            except OSError as e:
+                # A busy port must never keep the sentry from arming
+                logging.error(f"Metrics endpoint unavailable on {self.host}:{self.port}, not serving metrics: {e}")
+                self.port = None
+        if self._server is not None:
+            self._server.daemon_threads = True
+            # Port 0 binds a free port, the one picked is logged and kept here
+            self.port = self._server.server_address[1]
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True))
+            logging.info(f"Metrics on http://{self.host}:{self.port}/metrics")
+        if self.snapshot_path is not None:
+            self._threads.append(threading.Thread(target=self._write_snapshots, name='metrics-snapshot', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+        if self.snapshot_path is not None:
+            self._try_write_snapshot()
+
+    def _try_write_snapshot(self):
+        try:
+            self.write_snapshot()
+        except OSError as e:
+            logging.error(f"Failed to write metrics snapshot {self.snapshot_path}: {e}")
+
+    def _write_snapshots(self):
+        while not self._stopping.wait(self.interval):
+            self._try_write_snapshot()
+
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                metrics.scrapes += 1
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would flood the text log
+                pass
+
+        return Handler
@@ -1,10 +1,12 @@
 import RPi.GPIO as GPIO
+import queue
 import time
 import random
 import logging
-from mutagen.mp3 import MP3
 import pygame
-import speech_recognition as sr  # For voice commands
+from soundbank import SoundBank
+from rgbpipeline import RGBLed, rgb_fade
+from envelope import EnvelopeCache
 
 # Setup logging
 logging.basicConfig(filename='intrusion_log.log', level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
@@ -32,19 +34,34 @@ red_pwm.start(0)
 green_pwm.start(0)
 blue_pwm.start(0)
 
+# Gamma-corrected RGB LED that only writes the channels that change
+rgb_led = RGBLed(red_pwm, green_pwm, blue_pwm)
+
 # Define sound file paths
 greeting_sound = '/home/domin/JARVIS/sounds/greeting.mp3'
 sentry_enabled_sound = '/home/domin/JARVIS/sounds/sentry_enabled.mp3'
 power_down_sound = '/home/domin/JARVIS/sounds/powerdown.mp3'
 
+# Offline speech model for the voice commands, see https://alphacephei.com/vosk/models
+vosk_model_path = '/home/domin/JARVIS/models/vosk-model-small-en-us-0.15'
+voice = None
+
 # Initialize Pygame mixer
 pygame.mixer.init()
 
+# Decode all sounds once up front instead of on every play
+sound_bank = SoundBank()
+sound_bank.preload([greeting_sound, sentry_enabled_sound, power_down_sound])
+
+# Loudness envelope of the power-down sound for the LED to follow, analysed once and kept on disk
+envelopes = EnvelopeCache()
+envelopes.prepare([power_down_sound], sound_bank)
+
 def play_sound(file_path):
     """
     Plays a sound file using Pygame mixer.
     """
-    sound = pygame.mixer.Sound(file_path)
+    sound = sound_bank.get(file_path)
     sound.play()
     while pygame.mixer.get_busy():
         pygame.time.delay(100)  # Wait until the sound finishes playing
@@ -56,57 +73,62 @@ def set_led_color(red, green, blue):
     :param green: Brightness of green channel (0-100)
     :param blue: Brightness of blue channel (0-100)
     """
-    red_pwm.ChangeDutyCycle(red)
-    green_pwm.ChangeDutyCycle(green)
-    blue_pwm.ChangeDutyCycle(blue)
+    rgb_led.set_color(red, green, blue)
 
-def listen_for_command():
+def start_voice():
     """
-    Listens for voice commands and returns the detected phrase.
+    Starts the background voice listener once and returns it. Commands it hears arrive on
+    voice.events as SensorEvents, so nothing blocks on the microphone.
     """
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening for the activation command...")
-        try:
-            audio = recognizer.listen(source, timeout=10)  # Listen for 10 seconds max
-            command = recognizer.recognize_google(audio)
-            return command.lower()
-        except sr.UnknownValueError:
-            return None
-        except sr.RequestError as e:
-            logging.error(f"Speech recognition error: {e}")
-            return None
+    global voice
+    if voice is None:
+        # Imported here so speech_recognition and vosk don't slow down startup
+        from keywordspot import CommandListener
+        from voicepipeline import VoicePipeline
+        # Opened and calibrated once, then read frame by frame on the listener's thread
+        voice = VoicePipeline.from_listener(CommandListener(vosk_model_path))
+        voice.start()
+    return voice
+
+def wait_for_command(command):
+    """
+    Blocks until the voice listener hears command ('arm' or 'disarm'), dropping any other.
+    """
+    events = start_voice().events
+    while events.get().value != command:
+        pass
 
 def initialize_system():
     """
     Plays the greeting sound and waits for the "Enable Sentry Mode" command.
     """
     play_sound(greeting_sound)
+    wait_for_arm()
+
+def wait_for_arm():
+    """
+    Waits for "Enable Sentry Mode" with the LED yellow, then confirms it.
+    """
     set_led_color(100, 100, 0)  # Yellow LED for "waiting for command"
-    while True:
-        command = listen_for_command()
-        if command and "enable sentry mode" in command:
-            logging.info("Sentry mode enabled")
-            play_sound(sentry_enabled_sound)
-            set_led_color(100, 0, 0)  # Red LED for sentry mode
-            return
+    print("Listening for the activation command...")
+    wait_for_command('arm')
+    logging.info("Sentry mode enabled")
+    play_sound(sentry_enabled_sound)
+    set_led_color(100, 0, 0)  # Red LED for sentry mode
 
 def power_down_sequence():
     """
     Performs the power-down sequence, including LED fade-out and sound playback.
     """
     logging.info('No movement detected, powering down')
-    power_down_duration = MP3(power_down_sound).info.length
-    play_sound(power_down_sound)
-    
-    start_time = time.time()
-    while time.time() - start_time < power_down_duration:
-        elapsed_time = time.time() - start_time
-        brightness = int(100 * (1 - elapsed_time / power_down_duration))
-        set_led_color(brightness, 0, 0)  # Gradually fade red LED
-        time.sleep(0.1)
-    
-    set_led_color(0, 0, 0)  # Turn off LED completely
+    # Red LED follows the sound's loudness as it plays, or fades out linearly without an envelope
+    effect = envelopes.rgb_effect(power_down_sound, (100, 0, 0), end=(0, 0, 0))
+    if effect is None:
+        effect = rgb_fade(sound_bank.duration(power_down_sound), (100, 0, 0))
+    sound_bank.get(power_down_sound).play()
+    rgb_led.play(effect)
+    while pygame.mixer.get_busy():
+        pygame.time.delay(10)
 
 try:
     # Initial greeting and sentry mode activation
@@ -121,8 +143,18 @@ try:
             time.sleep(5)  # Delay to avoid continuous triggers
             
         set_led_color(0, 100, 0)  # Green LED for "all clear" when idle
-        time.sleep(1)  # Prevent immediate re-triggering
+        # Waits out the second before the next PIR check on the voice queue, so
+        # "Disable Sentry Mode" is acted on as soon as it is heard
+        try:
+            command = voice.events.get(timeout=1).value
+        except queue.Empty:
+            command = None
+        if command == 'disarm':
+            logging.info('Voice command: sentry mode disarmed')
+            wait_for_arm()
 finally:
+    if voice is not None:
+        voice.stop()
     # Stop PWM and cleanup
     red_pwm.stop()
     green_pwm.stop()
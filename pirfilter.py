@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# present is the filtered PIR state, confidence the share of the window agreeing with it
+# (0.5-1.0), timestamp the time.monotonic() of the newest sample it was computed from
+Presence = namedtuple('Presence', ['present', 'confidence', 'timestamp'])
+
+METHODS = ('majority', 'hysteresis', 'debounce')
+
+
+class RingBuffer:
+    """
+    Fixed-size sample history in a preallocated numpy array. New samples overwrite the
+    oldest, so memory never grows however long it runs.
+    """
+    def __init__(self, size, dtype=np.uint8):
+        self.data = np.zeros(size, dtype)
+        self.size = size
+        self.head = 0
+        self.filled = 0
+
+    def extend(self, samples):
+        samples = np.asarray(samples, self.data.dtype)
+        count = len(samples)
+        if count >= self.size:
+            self.data[:] = samples[-self.size:]
+            self.head = 0
+        else:
+            end = self.head + count
+            if end <= self.size:
+                self.data[self.head:end] = samples
+            else:
+                split = self.size - self.head
+                self.data[self.head:] = samples[:split]
+                self.data[:count - split] = samples[split:]
+            self.head = end % self.size
+        self.filled = min(self.size, self.filled + count)
+
+    def last(self, count):
+        """
+        The newest count samples (at most filled), oldest first.
+        """
+        count = min(count, self.filled)
+        start = self.head - count
+        if start >= 0:
+            return self.data[start:self.head].copy()
+        return np.concatenate((self.data[start:], self.data[:self.head]))
+
+
+def _hold(decided, initial):
+    # Carries the last decided value (0/1) forward over undecided samples (-1)
+    index = np.where(decided >= 0, np.arange(decided.size), -1)
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, decided[np.maximum(index, 0)], initial).astype(bool)
+
+
+class PresenceFilter:
+    """
+    Streaming filter from raw PIR samples to a presence signal, computed for a whole block
+    of samples at once from a moving count of high samples over the last `window`:
+
+    majority: present while at least `threshold` of the window is high.
+    hysteresis: turns on at `on` of the window high and only turns off again at `off`,
+        so a short dropout doesn't end a detection.
+    debounce: changes state only once the whole window agrees on the new level.
+
+    The tail of each block is kept in a RingBuffer so windows span block boundaries.
+    """
+    def __init__(self, method='majority', window=100, threshold=0.5, on=0.6, off=0.2):
+        if method not in METHODS:
+            raise ValueError(f"Unknown PIR filter method '{method}', expected one of {', '.join(METHODS)}")
+        self.method = method
+        self.window = window
+        self.threshold = threshold
+        self.on = on
+        self.off = off
+        self.history = RingBuffer(window)
+        self.present = False
+
+    def process(self, block):
+        """
+        Filters one block of 0/1 samples. Returns (present, confidence) arrays, one entry
+        per sample.
+        """
+        block = np.asarray(block, np.uint8)
+        history = self.history.last(self.window - 1)
+        totals = np.zeros(history.size + block.size + 1, np.int32)
+        np.cumsum(np.concatenate((history, block)), out=totals[1:])
+        ends = np.arange(history.size + 1, totals.size)
+        starts = np.maximum(0, ends - self.window)
+        high = totals[ends] - totals[starts]
+        lengths = ends - starts
+        fraction = high / lengths
+
+        if self.method == 'majority':
+            present = fraction >= self.threshold
+        elif self.method == 'hysteresis':
+            present = _hold(np.where(fraction >= self.on, 1, np.where(fraction <= self.off, 0, -1)), self.present)
+        else:
+            full = lengths == self.window
+            present = _hold(np.where(full & (high == lengths), 1, np.where(full & (high == 0), 0, -1)), self.present)
+
+        confidence = np.where(present, fraction, 1 - fraction)
+        if present.size:
+            self.present = bool(present[-1])
+        self.history.extend(block)
+        return present, confidence
+
+
+class PIRFilter:
+    """
+    Samples the PIR pin at `rate` Hz on a background thread and runs a PresenceFilter over
+    every block of samples, so the state machine asks for filtered presence instead of
+    trusting a single read. `window` and `block` are in seconds.
+    """
+    def __init__(self, gpio, pin, rate=500, window=0.2, method='majority', threshold=0.5, on=0.6, off=0.2,
+                 block=0.02):
+        self.gpio = gpio
+        self.pin = pin
+        self.rate = rate
+        self.window = window
+        self.block_samples = max(1, int(block * rate))
+        self.filter = PresenceFilter(method, max(1, int(window * rate)), threshold, on, off)
+        self.samples = 0
+        self._presence = Presence(False, 0.0, None)
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, gpio, pin, config):
+        """
+        Builds a filter from the "pir_filter" block of config.json.
+        """
+        return cls(gpio, pin, config.get('rate', 500), config.get('window', 0.2), config.get('method', 'majority'),
+                   config.get('threshold', 0.5), config.get('on', 0.6), config.get('off', 0.2),
+                   config.get('block', 0.02))
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='pir-filter', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def presence(self):
+        return self._presence
+
+    def _run(self):
+        period = 1 / self.rate
+        block = np.zeros(self.block_samples, np.uint8)
+        read = self.gpio.input
+        pin = self.pin
+        next_sample = time.monotonic()
+        while self._running:
+            for index in range(self.block_samples):
+                block[index] = 1 if read(pin) else 0
+                next_sample += period
+                delay = next_sample - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -0.1:
+                    # Fell far behind (CPU starved), resync instead of sampling in a burst
+                    next_sample = time.monotonic()
+            present, confidence = self.filter.process(block)
+            self.samples += self.block_samples
+            self._presence = Presence(bool(present[-1]), float(confidence[-1]), time.monotonic())
@@ -0,0 +1,362 @@
+"""
+Records the raw PIR signal to a compact trace file and replays traces into the state
+machine, so false triggers seen in the field can be re-run offline.
+
+    python pirtrace.py record hallway.pirt --rate 100          # on the Pi, Ctrl-C to stop
+    python pirtrace.py info hallway.pirt
+    python pirtrace.py replay hallway.pirt --virtual           # as fast as possible
+    python pirtrace.py replay hallway.pirt --speed 1           # real time, real state machine
+
+A trace is a 32-byte header followed by fixed-size records, so it can be memory-mapped
+and read without loading it. 'edges' traces hold one little-endian int64 per level change,
+(microseconds since start << 1) | level. 'samples' traces hold every sample, one bit each,
+most significant bit first. The header's record count is rewritten on every flush, so a
+recording cut short by a power cut is still readable up to the last flush.
+"""
+import argparse
+import json
+import os
+import signal
+import struct
+import threading
+import time
+from array import array
+
+import numpy as np
+
+from fakegpio import FakeGPIO
+
+# magic, version, kind, pin, sample rate, start time (epoch seconds), record count
+HEADER = struct.Struct('<4sBBHddQ')
+MAGIC = b'PIRT'
+VERSION = 1
+EDGES = 0
+SAMPLES = 1
+KINDS = {'edges': EDGES, 'samples': SAMPLES}
+
+
+class PIRRecorder:
+    """
+    Samples the PIR pin at rate Hz on a background thread and appends to a trace file.
+    Only flush_bytes worth of records is held in memory, so recording can run for days:
+    about 8 bytes per edge in 'edges' mode, or 1 MB per day at 100 Hz in 'samples' mode.
+    """
+    def __init__(self, gpio, pin, path, rate=100, mode='edges', flush_interval=5.0, flush_bytes=4096):
+        self.gpio = gpio
+        self.pin = pin
+        self.path = path
+        self.rate = rate
+        self.kind = KINDS[mode]
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.count = 0
+        self.samples = 0
+        self._edges = array('q')
+        self._packed = bytearray()
+        self._bits = 0
+        self._nbits = 0
+        self._level = None
+        self._file = None
+        self._start_time = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._file = open(self.path, 'wb')
+        self._start_time = time.time()
+        self._write_header()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='pir-recorder', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            # The last partial byte of samples is written padded, the count says where it ends
+            if self._nbits:
+                self._packed.append(self._bits << (8 - self._nbits))
+            self._flush(exact=True)
+            self._file.close()
+            self._file = None
+
+    def add_sample(self, level, elapsed):
+        """
+        Adds one pin reading taken elapsed seconds after the recording started.
+        """
+        level = 1 if level else 0
+        self.samples += 1
+        if self.kind == EDGES:
+            if level != self._level:
+                self._edges.append(int(elapsed * 1_000_000) << 1 | level)
+                self._level = level
+        else:
+            self._bits = self._bits << 1 | level
+            self._nbits += 1
+            if self._nbits == 8:
+                self._packed.append(self._bits)
+                self._bits = 0
+                self._nbits = 0
+
+    def _run(self):
+        period = 1 / self.rate
+        started = time.monotonic()
+        next_sample = started
+        last_flush = started
+        while self._running:
+            now = time.monotonic()
+            self.add_sample(self.gpio.input(self.pin), now - started)
+            if (len(self._edges) * 8 + len(self._packed) >= self.flush_bytes
+                    or now - last_flush >= self.flush_interval):
+                self._flush()
+                last_flush = now
+            # Fixed sample clock; after a stall the missed samples are skipped, not bunched up
+            next_sample += period
+            if next_sample < now:
+                next_sample = now + period
+            time.sleep(max(0, next_sample - time.monotonic()))
+
+    def _flush(self, exact=False):
+        if self.kind == EDGES:
+            self._file.write(self._edges.tobytes())
+            self.count += len(self._edges)
+            del self._edges[:]
+        else:
+            self._file.write(self._packed)
+            self.count = self.samples if exact else self.count + 8 * len(self._packed)
+            self._packed.clear()
+        self._write_header()
+
+    def _write_header(self):
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, self.kind, self.pin, self.rate, self._start_time, self.count))
+        self._file.seek(max(position, HEADER.size))
+        self._file.flush()
+
+
+class PIRTrace:
+    """
+    Read-only view of a trace file. Records are memory-mapped, not read into memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path}: not a PIR trace")
+        magic, version, self.kind, self.pin, self.rate, self.start_time, self.count = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a PIR trace (version {VERSION})")
+        if self.kind == EDGES:
+            dtype, length = np.dtype('<i8'), self.count
+        else:
+            dtype, length = np.dtype('u1'), (self.count + 7) // 8
+        self.records = (np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(length,))
+                        if length else np.empty(0, dtype))
+
+    def edges(self):
+        """
+        Returns (times, levels): seconds from the start of the recording of every level
+        change, and the level after it. The first entry is the level at the start.
+        """
+        if self.kind == EDGES:
+            return (self.records >> 1) / 1_000_000, (self.records & 1).astype(np.uint8)
+        samples = np.unpackbits(self.records)[:self.count]
+        if not samples.size:
+            return np.empty(0), np.empty(0, np.uint8)
+        changes = np.flatnonzero(np.diff(samples)) + 1
+        indexes = np.concatenate(([0], changes))
+        return indexes / self.rate, samples[indexes]
+
+    @property
+    def duration(self):
+        if self.kind == SAMPLES:
+            return self.count / self.rate
+        times, _ = self.edges()
+        return float(times[-1]) if times.size else 0.0
+
+    def pulses(self):
+        """
+        Lengths in seconds of every high pulse that ended within the recording.
+        """
+        times, levels = self.edges()
+        rising = times[1:][(levels[1:] == 1) & (levels[:-1] == 0)]
+        falling = times[1:][(levels[1:] == 0) & (levels[:-1] == 1)]
+        if falling.size and rising.size and falling[0] < rising[0]:
+            falling = falling[1:]
+        count = min(rising.size, falling.size)
+        return falling[:count] - rising[:count]
+
+
+class ReplayGPIO(FakeGPIO):
+    """
+    FakeGPIO whose PIR input follows a recorded trace. start(speed) replays it on a
+    background thread against the wall clock; schedule(clock) queues it on a
+    simulation.VirtualClock instead. Edge callbacks fire as on the Pi, with the bouncetime
+    measured in trace time, so speeding the replay up doesn't swallow edges.
+    """
+    def __init__(self, trace, pin=None):
+        super().__init__()
+        self.trace = trace
+        self.pin = trace.pin if pin is None else pin
+        self.replay_time = 0.0
+        self.finished = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _now(self):
+        return self.replay_time
+
+    def start(self, speed=1.0):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._replay, args=(speed,), name='pir-replay', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def schedule(self, clock, start=None):
+        """
+        Replays the trace on a VirtualClock from start (default: now). Edges are queued one
+        at a time as the clock reaches them, so long traces don't fill the timer heap.
+        """
+        start = clock.monotonic() if start is None else start
+        times, levels = self.trace.edges()
+        edges = zip(times.tolist(), levels.tolist())
+
+        def next_edge():
+            for t, level in edges:
+                clock.call_at(start + t, replay_edge, t, level)
+                return
+            self.finished.set()
+
+        def replay_edge(t, level):
+            self._replay_edge(t, level)
+            next_edge()
+
+        next_edge()
+
+    def _replay(self, speed):
+        times, levels = self.trace.edges()
+        started = time.monotonic()
+        for t, level in zip(times.tolist(), levels.tolist()):
+            if self._stopping.wait(max(0, started + t / speed - time.monotonic())):
+                return
+            self._replay_edge(t, level)
+        self.finished.set()
+
+    def _replay_edge(self, t, level):
+        self.replay_time = t
+        self.set_input(self.pin, self.HIGH if level else self.LOW)
+
+
+def load_config(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def command_record(args):
+    import RPi.GPIO as gpio
+    pin = args.pin if args.pin is not None else load_config(args.config)['pir_pin']
+    gpio.setmode(gpio.BCM)
+    gpio.setup(pin, gpio.IN)
+    recorder = PIRRecorder(gpio, pin, args.trace, args.rate, args.mode)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    recorder.start()
+    print(f"Recording PIR pin {pin} at {args.rate} Hz to {args.trace}, Ctrl-C to stop")
+    try:
+        stopping.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop()
+        gpio.cleanup(pin)
+    print(f"Recorded {recorder.samples} samples, {os.path.getsize(args.trace)} bytes")
+
+
+def command_info(args):
+    trace = PIRTrace(args.trace)
+    times, levels = trace.edges()
+    pulses = trace.pulses()
+    kind = 'edges' if trace.kind == EDGES else 'samples'
+    started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(trace.start_time))
+    print(f"{args.trace}: {kind}, pin {trace.pin}, {trace.rate:g} Hz, started {started}, "
+          f"{trace.duration:.1f}s, {trace.count} records")
+    print(f"  level changes: {max(0, times.size - 1)}, motion pulses: {pulses.size}")
+    if pulses.size:
+        print(f"  pulse length: min={pulses.min():.3f}s median={np.median(pulses):.3f}s max={pulses.max():.3f}s, "
+              f"shorter than 1s: {int((pulses < 1).sum())}")
+
+
+def command_replay(args):
+    from errorhandling import IntrusionDetectionSystem
+    trace = PIRTrace(args.trace)
+    if args.virtual:
+        from simulation import Simulation
+        gpio = ReplayGPIO(trace, load_config(args.config)['pir_pin'])
+        sim = Simulation(args.config, gpio=gpio)
+        gpio.schedule(sim.clock)
+        wall_start = time.perf_counter()
+        transitions = sim.run_until(trace.duration)
+        wall = time.perf_counter() - wall_start
+        for t, old, new in transitions:
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(trace.start_time + t))
+            print(f"{stamp} (+{t:.2f}s) {old.name} -> {new.name}")
+        alarms = sum(1 for _, _, new in transitions if new.name == 'ALARM')
+        triggers = sum(1 for _, _, new in transitions if new.name == 'POWERING_ON')
+        print(f"Replayed {trace.duration:.1f}s of trace in {wall:.2f}s: {triggers} triggers, {alarms} alarms")
+        sim.close()
+        return
+    gpio = ReplayGPIO(trace, load_config(args.config)['pir_pin'])
+    system = IntrusionDetectionSystem(args.config, gpio=gpio)
+
+    def stop_when_finished():
+        # Let the last escalation play out, then stop the daemon the way SIGINT would
+        gpio.finished.wait()
+        time.sleep(args.settle)
+        os.kill(os.getpid(), signal.SIGINT)
+
+    gpio.start(args.speed)
+    threading.Thread(target=stop_when_finished, daemon=True).start()
+    system.run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='record the PIR pin (on the Pi)')
+    record.add_argument('trace')
+    record.add_argument('--pin', type=int, help='BCM pin (default: pir_pin from the config)')
+    record.add_argument('--rate', type=float, default=100, help='samples per second')
+    record.add_argument('--mode', choices=list(KINDS), default='edges')
+    record.add_argument('--duration', type=float, help='seconds to record (default: until stopped)')
+    record.add_argument('--config', default='config.json')
+
+    info = subparsers.add_parser('info', help='summarise a trace')
+    info.add_argument('trace')
+
+    replay = subparsers.add_parser('replay', help='feed a trace into the state machine')
+    replay.add_argument('trace')
+    replay.add_argument('--config', default='config.json')
+    replay.add_argument('--speed', type=float, default=1.0,
+                        help='trace playback speed; the state machine itself still runs in real time')
+    replay.add_argument('--virtual', action='store_true',
+                        help='run trace and state machine on a virtual clock, as fast as possible')
+    replay.add_argument('--settle', type=float, default=30.0, help='seconds to keep running after the trace ends')
+
+    args = parser.parse_args(argv)
+    {'record': command_record, 'info': command_info, 'replay': command_replay}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
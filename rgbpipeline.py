@@ -0,0 +1,96 @@
+import random
+import time
+from functools import lru_cache
+
+from ledscheduler import DEFAULT_FPS, LEDEffect
+
+OFF = (0, 0, 0)
+
+
+@lru_cache(maxsize=8)
+def gamma_lut(gamma=2.2, brightness=1.0):
+    """
+    Maps a perceived brightness of 0-100 to the duty cycle that produces it, scaled by
+    brightness. Indexed by the rounded input level.
+    """
+    return tuple(round(100 * brightness * (level / 100) ** gamma, 1) for level in range(101))
+
+
+@lru_cache(maxsize=32)
+def _fade_frames(duration, start, end, fps):
+    count = max(1, int(duration * fps))
+    frames = [tuple(s + (e - s) * i / count for s, e in zip(start, end)) for i in range(count)]
+    frames.append(tuple(end))
+    return tuple(frames)
+
+
+def rgb_fade(duration, start, end=OFF, fps=DEFAULT_FPS):
+    """
+    Fades from one (red, green, blue) color to another over duration seconds.
+    """
+    return LEDEffect('rgb-fade', _fade_frames(duration, tuple(start), tuple(end), fps), fps)
+
+
+def rgb_flicker(duration, color, on_time=(0.05, 0.2), off_time=(0.05, 0.2), fps=DEFAULT_FPS):
+    """
+    Random on/off flicker in color, ending with the LED on, like flickerupdate.flicker_led.
+    """
+    color = tuple(color)
+    frames = []
+    total = int(duration * fps)
+    while len(frames) < total:
+        frames.extend([color] * max(1, round(random.uniform(*on_time) * fps)))
+        frames.extend([OFF] * max(1, round(random.uniform(*off_time) * fps)))
+    frames.append(color)
+    return LEDEffect('rgb-flicker', frames, fps)
+
+
+def rgb_solid(color):
+    return LEDEffect('rgb-solid', [tuple(color)])
+
+
+class RGBLed:
+    """
+    An RGB LED on three PWM channels. Colors are given as perceived brightness 0-100 per
+    channel, passed through a precomputed gamma/brightness table, and only channels whose
+    duty cycle actually changed are written to the GPIO.
+    """
+    def __init__(self, red_pwm, green_pwm, blue_pwm, gamma=2.2, brightness=1.0):
+        self.pwms = (red_pwm, green_pwm, blue_pwm)
+        self.lut = gamma_lut(gamma, brightness)
+        self.duty_cycles = [None, None, None]
+        self.writes = 0
+        self.writes_saved = 0
+
+    def set_color(self, red, green, blue):
+        lut = self.lut
+        for index, level in enumerate((red, green, blue)):
+            duty_cycle = lut[min(100, max(0, int(round(level))))]
+            if duty_cycle != self.duty_cycles[index]:
+                self.pwms[index].ChangeDutyCycle(duty_cycle)
+                self.duty_cycles[index] = duty_cycle
+                self.writes += 1
+            else:
+                self.writes_saved += 1
+
+    def ChangeDutyCycle(self, color):
+        # Lets an LEDScheduler channel drive the whole LED with (red, green, blue) frames
+        self.set_color(*color)
+
+    def play(self, effect):
+        """
+        Plays an effect's color frames on the calling thread at the effect's frame rate.
+        Frames are chosen by elapsed time, so a slow frame is skipped rather than stretching the effect.
+        """
+        frames = effect.frames
+        start = time.monotonic()
+        index = 0
+        while index < len(frames):
+            self.set_color(*frames[index])
+            next_index = index + 1
+            time.sleep(max(0, start + next_index / effect.fps - time.monotonic()))
+            index = max(next_index, int((time.monotonic() - start) * effect.fps))
+        self.set_color(*frames[-1])
+
+    def off(self):
+        self.set_color(*OFF)
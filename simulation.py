@@ -0,0 +1,427 @@
+"""
+Virtual-time simulation of the threaded state machine in errorhandling.py. A VirtualClock
+replaces time.sleep/monotonic, FakeGPIO replaces the PIR, and the audio, LED and journal
+backends below complete on the virtual clock instead of real threads, so an intrusion that
+takes a minute on the Pi runs in well under a millisecond.
+
+    sim = Simulation(seed=1)
+    result = sim.run_scenario(SCENARIOS['full-alarm'](sim))
+"""
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import tempfile
+import time
+from collections import namedtuple
+from concurrent import futures
+
+from audiopriority import PriorityLanes
+from edgedetect import PIRWatcher, SensorEvent
+from fakegpio import FakeGPIO
+from ledscheduler import DEFAULT_FPS
+
+
+class VirtualClock:
+    """
+    Drop-in for the time functions the state machine uses. sleep() jumps straight to the
+    wake-up time, running any timers that fall due on the way in order.
+    """
+    def __init__(self, start=0.0, epoch=None):
+        self.now = start
+        self.epoch = time.time() if epoch is None else epoch
+        self._timers = []
+        self._sequence = itertools.count()
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.epoch + self.now
+
+    def call_at(self, when, callback, *args):
+        heapq.heappush(self._timers, (when, next(self._sequence), callback, args))
+
+    def call_later(self, delay, callback, *args):
+        self.call_at(self.now + delay, callback, *args)
+
+    def pending(self):
+        # Timers still to run; none means nothing can ever happen again
+        return len(self._timers)
+
+    def sleep(self, seconds):
+        self.advance_to(self.now + max(0, seconds))
+
+    def advance_to(self, when):
+        while self._timers and self._timers[0][0] <= when:
+            self._fire_next()
+        self.now = max(self.now, when)
+
+    def run_until(self, predicate, timeout=None):
+        """
+        Advances from timer to timer until predicate() is true, as a blocking wait would.
+        Returns predicate(), which is false only if timeout seconds passed first.
+        """
+        deadline = None if timeout is None else self.now + timeout
+        while not predicate():
+            if deadline is not None and (not self._timers or self._timers[0][0] > deadline):
+                self.now = max(self.now, deadline)
+                return False
+            if not self._timers:
+                raise RuntimeError('Simulation would block forever, nothing left to wait for')
+            self._fire_next()
+        return True
+
+    def _fire_next(self):
+        when, _, callback, args = heapq.heappop(self._timers)
+        self.now = max(self.now, when)
+        callback(*args)
+
+
+class ClockFuture(futures.Future):
+    """
+    A Future whose result() waits on a VirtualClock instead of blocking the thread.
+    """
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def result(self, timeout=None):
+        if not self.clock.run_until(self.done, timeout):
+            raise futures.TimeoutError()
+        return super().result(0)
+
+
+class SimPIRWatcher(PIRWatcher):
+    """
+    PIRWatcher whose wait runs the VirtualClock until an edge is queued. With no timers
+    left, where a real wait would block forever, it returns an 'idle' event, which the
+    state machine ignores like any event that isn't motion or a command.
+    """
+    def _get(self, timeout):
+        if not self.clock.run_until(lambda: not self.events.empty() or not self.clock.pending(), timeout):
+            raise queue.Empty
+        if self.events.empty():
+            return SensorEvent('idle', self.pin, None, self.clock.monotonic())
+        return self.events.get_nowait()
+
+
+class SimSoundBank:
+    """
+    Sound lengths without decoding anything: durations maps path -> seconds.
+    """
+    def __init__(self, durations=None, default=1.0):
+        self.durations = dict(durations or {})
+        self.default = default
+
+    def preload(self, paths):
+        pass
+
+    def duration(self, path):
+        return self.durations.get(path, self.default)
+
+    def stats(self):
+        return {'sounds': len(self.durations)}
+
+
+class SimPlayback:
+    """
+    Same interface as audioplayer.PlaybackHandle, finishing on the virtual clock.
+    """
+    def __init__(self, clock, path, length):
+        self.clock = clock
+        self.path = path
+        self.channel = None
+        self.started_at = clock.monotonic()
+        self.finished_at = None
+        self.stopped = False
+        self.future = ClockFuture(clock)
+        clock.call_later(length, self._finish, True)
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        try:
+            return self.future.result(timeout)
+        except futures.TimeoutError:
+            return None
+
+    def add_done_callback(self, fn):
+        self.future.add_done_callback(lambda future: fn(self))
+
+    def stop(self):
+        if not self.done():
+            self.stopped = True
+            self._finish(False)
+
+    def _finish(self, completed):
+        if not self.future.done():
+            self.finished_at = self.clock.monotonic()
+            self.future.set_result(completed)
+
+
+class SimAudioPlayer:
+    """
+    Stands in for AudioPlayer and the pygame mixer: every sound plays for its SimSoundBank
+    duration of virtual time.
+    """
+    def __init__(self, clock, sound_bank):
+        self.clock = clock
+        self.sound_bank = sound_bank
+        self.lanes = PriorityLanes()
+        self.played = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def play(self, path, priority=None, layer=False, fade_ms=0):
+        # Preempted sounds stop at once, a crossfade tail overlaps nothing the state machine waits on
+        if priority is not None:
+            victims = self.lanes.admit(priority, layer)
+            if victims is None:
+                playback = SimPlayback(self.clock, path, 0)
+                playback.stop()
+                return playback
+            for victim in victims:
+                victim.stop()
+        self.played += 1
+        playback = SimPlayback(self.clock, path, self.sound_bank.duration(path))
+        if priority is not None:
+            self.lanes.add(playback, priority, layer)
+        return playback
+
+
+class SimLEDChannel:
+    def __init__(self, scheduler, name, pwm):
+        self.scheduler = scheduler
+        self.name = name
+        self.pwm = pwm
+        self._future = None
+
+    def play(self, effect, started_at=None):
+        # Like LEDScheduler, a new effect preempts the one playing
+        if self._future is not None and not self._future.done():
+            self._future.set_result(False)
+        future = self._future = ClockFuture(self.scheduler.clock)
+        self.scheduler.effects += 1
+        clock = self.scheduler.clock
+        remaining = effect.duration - (clock.monotonic() - started_at if started_at is not None else 0)
+        clock.call_later(max(0, remaining), self._finish, future, effect.frames[-1])
+        return future
+
+    def write(self, duty_cycle):
+        self.pwm.ChangeDutyCycle(duty_cycle)
+
+    def _finish(self, future, duty_cycle):
+        if not future.done():
+            self.write(duty_cycle)
+            future.set_result(True)
+
+
+class SimLEDScheduler:
+    """
+    Stands in for LEDScheduler: effects take their duration in virtual time and only the
+    final frame is written.
+    """
+    def __init__(self, clock, fps=DEFAULT_FPS):
+        self.clock = clock
+        self.fps = fps
+        self.effects = 0
+
+    def add_channel(self, name, pwm):
+        return SimLEDChannel(self, name, pwm)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return {'effects': self.effects}
+
+
+class SimJournal:
+    """
+    Keeps journal events in memory, timestamped on the virtual clock.
+    """
+    def __init__(self, clock, keep=True):
+        self.clock = clock
+        self.keep = keep
+        self.events = []
+
+    def start(self):
+        pass
+
+    def record(self, event, **fields):
+        if self.keep:
+            self.events.append({'ts': self.clock.time(), 'event': event, **fields})
+
+    def status(self, message, **fields):
+        self.record('status', message=message, **fields)
+
+    def close(self):
+        pass
+
+
+# presence is a list of (enter, leave) offsets in seconds from the start of the scenario
+Scenario = namedtuple('Scenario', ['name', 'presence'])
+
+# transitions holds (virtual time, old state, new state); times are relative to the scenario start
+ScenarioResult = namedtuple('ScenarioResult', ['name', 'transitions', 'reaction', 'settled', 'duration'])
+
+
+def _escalation_times(sim):
+    # When the pin is read after the unauthorized sound and after the warning sound, for a
+    # walk-in at t=0 with the longest configured pause
+    system = sim.system
+    bank = system.sound_bank
+    powered_on = max(2, bank.duration(system.sounds['power_on']))
+
+    def clip(slot):
+        # With audio preemption the delays run from the start of the clip
+        return 0 if system.audio_preemption else max(bank.duration(path) for path in system.sounds[slot])
+
+    first_check = powered_on + max(system.unauthorized_pause) + clip('unauthorized') + system.warning_delay
+    second_check = first_check + clip('warning') + system.alarm_delay
+    return first_check, second_check
+
+
+def walk_in(sim):
+    # Passes through and is gone before the system finishes powering on, but stays longer
+    # than one standby poll so it is always noticed
+    return Scenario('walk-in', [(0, 1.5)])
+
+
+def leave_after_warning(sim):
+    first_check, second_check = _escalation_times(sim)
+    # +1 covers the standby poll before the system notices the walk-in
+    return Scenario('leave-after-warning', [(0, first_check + 1 + (second_check - first_check) / 2)])
+
+
+def full_alarm(sim):
+    # Still there for the alarm, gone before the system is back in standby
+    _, second_check = _escalation_times(sim)
+    return Scenario('full-alarm', [(0, second_check + 1.25)])
+
+
+def random_scenario(sim, rng, max_stay=60.0):
+    return Scenario('random', [(0, rng.uniform(0.1, max_stay))])
+
+
+SCENARIOS = {
+    'walk-in': walk_in,
+    'leave-after-warning': leave_after_warning,
+    'full-alarm': full_alarm,
+}
+
+
+class Simulation:
+    """
+    An IntrusionDetectionSystem from config.json (plus overrides) wired to a VirtualClock,
+    FakeGPIO and the Sim* backends. In 'edge' detection mode the FakeGPIO fires its edge
+    callbacks, bouncetime included, on the virtual clock into a SimPIRWatcher, so a pulse
+    too short for a poll to catch still wakes the state machine, as on the Pi. The latency
+    of real GPIO callback threads is what benchmark.py pir-latency measures instead.
+    """
+    def __init__(self, config_file=None, seed=0, sound_durations=None, keep_journal=False, gpio=None, **overrides):
+        from errorhandling import IntrusionDetectionSystem
+        if config_file is None:
+            config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+        with open(config_file) as f:
+            config = json.load(f)
+        config.update(overrides)
+        config.pop('voice', None)
+        # The filter samples the pin on a real-time thread, which the virtual clock can't drive
+        config.pop('pir_filter', None)
+        # The config is a temp file, and reloads would poll it on a real-time thread
+        config['config_reload'] = False
+        # Scenarios always start in standby, never from a snapshot of an earlier run
+        config['state_snapshot'] = None
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(config, f)
+
+        # The state machine draws its pauses and sounds from the random module
+        random.seed(seed)
+        self.rng = random.Random(seed)
+        self.clock = VirtualClock()
+        self.gpio = gpio or FakeGPIO()
+        self.gpio.use_clock(self.clock)
+        self.journal = SimJournal(self.clock, keep_journal)
+        self.audio = SimAudioPlayer(self.clock, SimSoundBank(sound_durations))
+        self.leds = SimLEDScheduler(self.clock, config.get('led_fps', DEFAULT_FPS))
+        try:
+            self.system = IntrusionDetectionSystem(f.name, gpio=self.gpio, clock=self.clock, audio=self.audio,
+                                                   leds=self.leds, journal=self.journal)
+        finally:
+            os.unlink(f.name)
+        if self.system.detection_mode == 'edge':
+            system = self.system
+            system.pir_watcher.stop()
+            system.pir_watcher = SimPIRWatcher(system.gpio, system.PIR_PIN, system.events,
+                                               bouncetime=system.pir_bouncetime, clock=self.clock)
+            system.pir_watcher.start()
+        self.steps = 0
+
+    def run_scenario(self, scenario, timeout=3600.0):
+        """
+        Plays one scenario from STANDBY with nobody present until the system is back in
+        STANDBY and the scenario is over. The scenario starts at a random point of the
+        standby poll, so poll latency varies as it would on the Pi.
+        """
+        from errorhandling import SystemState
+        system = self.system
+        clock = self.clock
+        start = clock.monotonic() + self.rng.uniform(0, 1)
+        pin = system.PIR_PIN
+        for enter, leave in scenario.presence:
+            clock.call_at(start + enter, self.gpio.set_input, pin, self.gpio.HIGH)
+            clock.call_at(start + leave, self.gpio.set_input, pin, self.gpio.LOW)
+        end = start + max(leave for _, leave in scenario.presence)
+        # An edge-mode standby only wakes on a timer, and a visit it never noticed leaves none
+        clock.call_at(end + 1, lambda: None)
+
+        transitions = []
+        reaction = None
+        while clock.monotonic() - start < timeout:
+            previous_state = system.step()
+            self.steps += 1
+            if system.state != previous_state:
+                now = clock.monotonic() - start
+                transitions.append((now, previous_state, system.state))
+                if reaction is None and system.state == SystemState.POWERING_ON:
+                    reaction = system.motion_detected_at - start
+            # Done once back in STANDBY after everyone left, or a poll after a visit too short to notice
+            if system.state == SystemState.STANDBY and clock.monotonic() >= end and (
+                    transitions or clock.monotonic() >= end + 1):
+                break
+        settled = clock.monotonic() - end
+        return ScenarioResult(scenario.name, transitions, reaction, settled, clock.monotonic() - start)
+
+    def run_until(self, when):
+        """
+        Steps the state machine until virtual time when, then lets any escalation in progress
+        finish. Returns the (time, old state, new state) transitions on the way.
+        """
+        from errorhandling import SystemState
+        system = self.system
+        transitions = []
+        # An edge-mode standby waits on the clock, this wakes it at when if nothing else does
+        self.clock.call_at(when, lambda: None)
+        while self.clock.monotonic() < when or system.state != SystemState.STANDBY:
+            previous_state = system.step()
+            self.steps += 1
+            if system.state != previous_state:
+                transitions.append((self.clock.monotonic(), previous_state, system.state))
+        return transitions
+
+    def close(self):
+        self.system.leds.stop()
+        self.system.pir_watcher.stop()
+        self.gpio.cleanup()
@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import pygame
+
+
+def iter_sound_paths(sounds):
+    """
+    Yields every file path in a config "sounds" mapping, whose values are a path or a list of paths.
+    """
+    for entry in sounds.values():
+        if isinstance(entry, str):
+            yield entry
+        else:
+            yield from entry
+
+
+class SoundBank:
+    """
+    Cache of decoded pygame Sounds and their durations, so nothing is decoded from the SD
+    card between motion being detected and the first sound playing. Sounds are evicted
+    least-recently-used once their decoded size goes over max_bytes; durations are tiny
+    and are kept for every file ever loaded. Sounds decoded by refresh() are staged and
+    only replace the cached ones on swap_staged().
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, loader=None):
+        self.max_bytes = max_bytes
+        self.loader = loader or pygame.mixer.Sound
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_used = 0
+        self._sounds = OrderedDict()
+        self._durations = {}
+        self._versions = {}
+        self._staged = {}
+        self._lock = threading.Lock()
+        self.bundle = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds the sound bank config.json asks for, loading from its sound_bundle (see
+        soundbundle.py) when one is configured and readable.
+        """
+        bundle = None
+        if 'sound_bundle' in config:
+            from soundbundle import SoundBundle
+            try:
+                bundle = SoundBundle(config['sound_bundle'])
+            except (OSError, ValueError) as e:
+                logging.error(f"Sound bundle unavailable, decoding sounds instead: {e}")
+        bank = cls(config.get('sound_cache_bytes', 64 * 1024 * 1024), bundle.load if bundle is not None else None)
+        bank.bundle = bundle
+        return bank
+
+    def preload(self, paths):
+        """
+        Decodes every file in paths up front. Files that fail to load are logged and skipped.
+        """
+        for path in paths:
+            try:
+                self.get(path)
+            except (pygame.error, FileNotFoundError) as e:
+                logging.error(f"Failed to preload sound {path}: {e}")
+
+    def get(self, path):
+        with self._lock:
+            entry = self._sounds.get(path)
+            if entry is not None:
+                self._sounds.move_to_end(path)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        # Decode outside the lock so a miss doesn't stall lookups of cached sounds
+        version = self._version(path)
+        sound = self.loader(path)
+        size = self._decoded_size(sound)
+        with self._lock:
+            if path not in self._sounds:
+                self._store(path, sound, size, version)
+        return sound
+
+    def refresh(self, paths):
+        """
+        Decodes the files in paths that were never loaded or have changed on disk since,
+        staging them for swap_staged() while get() keeps returning the cached copy.
+        Returns (decoded paths, {path: error} for failures).
+        """
+        decoded, failed = [], {}
+        for path in paths:
+            try:
+                version = self._version(path)
+                staged = self._staged.get(path)
+                if staged is not None and staged[2] == version:
+                    continue
+                if staged is None and path in self._durations and self._versions.get(path) == version:
+                    continue
+                sound = self.loader(path)
+            except (pygame.error, OSError) as e:
+                failed[path] = e
+                continue
+            size = self._decoded_size(sound)
+            with self._lock:
+                self._staged[path] = (sound, size, version)
+            decoded.append(path)
+        return decoded, failed
+
+    def get_latest(self, path):
+        """
+        The sound staged for path if there is one, else the same as get(path).
+        """
+        staged = self._staged.get(path)
+        return staged[0] if staged is not None else self.get(path)
+
+    def swap_staged(self):
+        """
+        Replaces the cached sounds with everything refresh() staged. Returns how many were swapped.
+        """
+        with self._lock:
+            staged, self._staged = self._staged, {}
+            for path, (sound, size, version) in staged.items():
+                self._store(path, sound, size, version)
+        return len(staged)
+
+    def duration(self, path):
+        """
+        Length of the sound in seconds, decoding it only if it has never been loaded.
+        """
+        if path not in self._durations:
+            self.get(path)
+        return self._durations[path]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'sounds': len(self._sounds),
+                'bytes': self.bytes_used,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _store(self, path, sound, size, version):
+        previous = self._sounds.pop(path, None)
+        if previous is not None:
+            self.bytes_used -= previous[1]
+        self._sounds[path] = (sound, size)
+        self.bytes_used += size
+        self._durations[path] = sound.get_length()
+        self._versions[path] = version
+        self._evict()
+
+    @staticmethod
+    def _version(path):
+        # Changes whenever the file is rewritten or replaced
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _evict(self):
+        # Always keep the most recent sound, even if it alone is over budget
+        while self.bytes_used > self.max_bytes and len(self._sounds) > 1:
+            path, (sound, size) = self._sounds.popitem(last=False)
+            self.bytes_used -= size
+            self.evictions += 1
+            logging.debug(f"Evicted sound {path} ({size} bytes) from cache")
+
+    @staticmethod
+    def _decoded_size(sound):
+        # Sounds are stored in the mixer's output format, work it out without copying get_raw()
+        frequency, size, channels = pygame.mixer.get_init() or (44100, -16, 2)
+        return int(sound.get_length() * frequency * channels * abs(size) // 8)
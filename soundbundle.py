@@ -0,0 +1,236 @@
+"""
+Builds every sound referenced by config.json into one bundle of mixer-ready PCM, so the
+daemon memory-maps it at startup instead of decoding MP3s from the SD card.
+
+    python soundbundle.py build                        # writes sound_bundle from config.json
+    python soundbundle.py build --frequency 48000      # match pygame.mixer.get_init() on the Pi
+    python soundbundle.py info sounds.bundle
+
+A bundle is a header, a JSON index and the assets. Assets are keyed by the sha1 of their
+source file, so identical files are stored once. Each asset holds raw PCM in the mixer
+format from the header, then its float32 LED envelope (see envelope.py). A rebuild only
+decodes sources whose mtime and size changed and whose content hash is new. Every other
+asset is copied across from the previous bundle, which is replaced atomically.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+import pygame
+
+from envelope import compute_envelope, file_digest
+from ledscheduler import DEFAULT_FPS
+from soundbank import iter_sound_paths
+
+# magic, version, mixer frequency, sample size (pygame's signed bits), channels, envelope fps,
+# index length, offset of the first asset
+HEADER = struct.Struct('<4sBIbBHIQ')
+MAGIC = b'SBND'
+VERSION = 1
+# Assets start on cache-line boundaries so the mapped PCM and envelopes are aligned
+ALIGN = 64
+SAMPLE_TYPES = {8: 'u1', -8: 'i1', 16: '<u2', -16: '<i2', 32: '<f4'}
+
+
+def _aligned(offset, alignment=ALIGN):
+    return -(-offset // alignment) * alignment
+
+
+def config_sound_paths(config):
+    """
+    Every sound file in a config, including per-zone overrides, in order without duplicates.
+    """
+    paths = list(iter_sound_paths(config.get('sounds', {})))
+    for zone in config.get('zones', []):
+        paths.extend(iter_sound_paths(zone.get('sounds', {})))
+    return list(dict.fromkeys(paths))
+
+
+class SoundBundle:
+    """
+    Read-only view of a bundle. The file is mapped once; load() gives the mixer each
+    sound's PCM straight from the mapping, with no decode and no read() of the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"{path}: not a sound bundle")
+            magic, version, frequency, size, channels, self.fps, index_length, self.data_offset = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path}: not a sound bundle (version {VERSION})")
+            self.index = json.loads(f.read(index_length))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data = memoryview(self._map)
+        self.format = (frequency, size, channels)
+        self.digest = self.index['digest']
+        self.fallbacks = 0
+
+    def entry(self, path):
+        """
+        The asset for path, or None if the bundle doesn't hold it or its source changed
+        since the build. A source that has since been deleted still plays from the bundle.
+        """
+        source = self.index['sources'].get(path)
+        if source is None:
+            return None
+        try:
+            stat = os.stat(path)
+            if (stat.st_mtime_ns, stat.st_size) != (source['mtime_ns'], source['size']):
+                return None
+        except FileNotFoundError:
+            pass
+        return self.index['assets'][source['digest']]
+
+    def pcm(self, asset):
+        start = self.data_offset + asset['offset']
+        return self._data[start:start + asset['length']]
+
+    def load(self, path):
+        """
+        SoundBank loader: the bundled PCM if it's current and in the mixer's format,
+        otherwise an ordinary decode of path.
+        """
+        asset = self.entry(path)
+        if asset is None or pygame.mixer.get_init() != self.format:
+            self.fallbacks += 1
+            logging.warning(f"{path} is not current in {self.path} for this mixer, decoding it instead")
+            return pygame.mixer.Sound(path)
+        return pygame.mixer.Sound(buffer=self.pcm(asset))
+
+    def envelope(self, path, fps):
+        """
+        The bundled LED envelope of path as a read-only view, or None if it isn't current
+        or was built for another frame rate.
+        """
+        asset = self.entry(path)
+        if asset is None or fps != self.fps:
+            return None
+        start = self.data_offset + asset['envelope_offset']
+        return np.frombuffer(self._map, np.float32, asset['envelope_count'], start)
+
+    def duration(self, path):
+        asset = self.entry(path)
+        return asset['duration'] if asset is not None else None
+
+
+def build(paths, output, fps=DEFAULT_FPS):
+    """
+    Writes a bundle of paths to output in the format of the initialised mixer. Assets of
+    the previous bundle at output are reused when their source is unchanged. Returns
+    (decoded, reused) counts.
+    """
+    frequency, size, channels = pygame.mixer.get_init()
+    dtype = np.dtype(SAMPLE_TYPES[size])
+    # Unsigned formats are centred on the midpoint, not zero
+    center = 2 ** (abs(size) - 1) if dtype.kind == 'u' else 0
+    previous = None
+    try:
+        previous = SoundBundle(output)
+        if previous.format != (frequency, size, channels) or previous.fps != fps:
+            logging.info(f"{output} was built for another mixer format or fps, rebuilding every asset")
+            previous = None
+    except (OSError, ValueError):
+        pass
+
+    sources, assets, blobs = {}, {}, []
+    decoded = reused = 0
+    for path in dict.fromkeys(paths):
+        stat = os.stat(path)
+        old = previous.index['sources'].get(path) if previous is not None else None
+        if old is not None and (old['mtime_ns'], old['size']) == (stat.st_mtime_ns, stat.st_size):
+            digest = old['digest']
+        else:
+            digest = file_digest(path)
+        sources[path] = {'digest': digest, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+        if digest in assets:
+            continue
+        if previous is not None and digest in previous.index['assets']:
+            asset = previous.index['assets'][digest]
+            start = previous.data_offset + asset['envelope_offset']
+            pcm = previous.pcm(asset)
+            envelope = previous._data[start:start + 4 * asset['envelope_count']]
+            duration = asset['duration']
+            reused += 1
+        else:
+            sound = pygame.mixer.Sound(path)
+            pcm = sound.get_raw()
+            samples = np.frombuffer(pcm, dtype).reshape(-1, channels).astype(np.float32) - center
+            envelope = compute_envelope(samples, frequency, fps).tobytes()
+            duration = sound.get_length()
+            decoded += 1
+        assets[digest] = {'length': len(pcm), 'duration': duration, 'envelope_count': len(envelope) // 4}
+        blobs.append((digest, pcm, envelope))
+
+    offset = 0
+    for digest, pcm, envelope in blobs:
+        assets[digest]['offset'] = offset
+        assets[digest]['envelope_offset'] = _aligned(offset + len(pcm))
+        offset = _aligned(assets[digest]['envelope_offset'] + len(envelope))
+    # The bundle's own hash covers the mixer format and its contents, not where it was built
+    content = hashlib.sha1(f"{frequency} {size} {channels} {fps}".encode())
+    for digest in sorted(assets):
+        content.update(digest.encode())
+    index = json.dumps({'digest': content.hexdigest(), 'sources': sources, 'assets': assets}).encode()
+    data_offset = _aligned(HEADER.size + len(index), mmap.PAGESIZE)
+
+    # Written aside and renamed: a running daemon keeps its mapping of the old file
+    with open(output + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, frequency, size, channels, fps, len(index), data_offset))
+        f.write(index)
+        for digest, pcm, envelope in blobs:
+            f.seek(data_offset + assets[digest]['offset'])
+            f.write(pcm)
+            f.seek(data_offset + assets[digest]['envelope_offset'])
+            f.write(envelope)
+        f.truncate(data_offset + offset)
+    os.replace(output + '.tmp', output)
+    return decoded, reused
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="bundle every sound in the config")
+    build_parser.add_argument('--config', default='config.json')
+    build_parser.add_argument('--output', help="bundle path (default: sound_bundle from the config, or sounds.bundle)")
+    build_parser.add_argument('--frequency', type=int, default=44100, help="mixer sample rate")
+    build_parser.add_argument('--size', type=int, default=-16, help="mixer sample size, as pygame.mixer.init takes it")
+    build_parser.add_argument('--channels', type=int, default=2)
+    build_parser.add_argument('--fps', type=int, default=DEFAULT_FPS, help="LED frame rate of the envelopes (led_fps)")
+
+    info = subparsers.add_parser('info', help="summarise a bundle")
+    info.add_argument('bundle')
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        with open(args.config) as f:
+            config = json.load(f)
+        output = args.output or config.get('sound_bundle', 'sounds.bundle')
+        # Decoding needs the mixer but not a sound card, so the daemon can keep running
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        pygame.mixer.init(args.frequency, args.size, args.channels)
+        decoded, reused = build(config_sound_paths(config), output, args.fps)
+        bundle = SoundBundle(output)
+        print(f"{output}: {len(bundle.index['sources'])} sounds, {decoded} decoded, {reused} reused, "
+              f"{os.path.getsize(output) / 1e6:.1f} MB, digest {bundle.digest[:12]}")
+    else:
+        bundle = SoundBundle(args.bundle)
+        frequency, size, channels = bundle.format
+        print(f"{args.bundle}: {frequency} Hz, {abs(size)}-bit, {channels} channels, envelopes at {bundle.fps} fps, "
+              f"digest {bundle.digest}")
+        for path, source in bundle.index['sources'].items():
+            asset = bundle.index['assets'][source['digest']]
+            state = 'current' if bundle.entry(path) is not None else 'stale'
+            print(f"  {path}: {asset['duration']:.2f}s, {asset['length'] / 1e6:.2f} MB, {state}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import threading
+import time
+
+# Taken when this module is first imported; errorhandling.py imports it before anything heavy
+STARTED = time.monotonic()
+
+
+def system_uptime():
+    """
+    Seconds since the Pi booted, or None off Linux. Logged at startup so the time from a
+    power blip to armed can be read straight off the log.
+    """
+    try:
+        with open('/proc/uptime') as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfiler:
+    """
+    Times startup phases. lap(name) closes the phase that ran on the calling thread since
+    its previous lap, so the main thread and the warm-up thread are timed separately; the
+    main thread's first phase starts at STARTED, other threads start at begin().
+    mark(name) notes a milestone such as 'armed' in seconds since STARTED.
+    """
+    def __init__(self, started=STARTED):
+        self.started = started
+        self.phases = []
+        self.marks = {}
+        self._last = {threading.main_thread().name: started}
+        self._lock = threading.Lock()
+
+    def begin(self):
+        self._last[threading.current_thread().name] = time.monotonic()
+
+    def lap(self, name):
+        now = time.monotonic()
+        thread = threading.current_thread().name
+        with self._lock:
+            self.phases.append((thread, name, now - self._last.get(thread, now)))
+            self._last[thread] = now
+
+    def mark(self, name):
+        self.marks[name] = time.monotonic() - self.started
+
+    def report(self):
+        """
+        One line: phases per thread in order, then the milestones.
+        """
+        threads = {}
+        for thread, name, seconds in self.phases:
+            threads.setdefault(thread, []).append(f"{name} {seconds:.3f}s")
+        parts = [f"{thread}: {', '.join(phases)}" for thread, phases in threads.items()]
+        parts.append(', '.join(f"{name} at {seconds:.3f}s" for name, seconds in self.marks.items()))
+        return ' | '.join(parts)
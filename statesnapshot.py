@@ -0,0 +1,90 @@
+"""
+The state machine's position, saved on every transition so a daemon that crashed
+mid-intrusion picks the escalation up where it left off instead of starting in STANDBY.
+
+The file is two fixed-size slots, memory-mapped once. Each save writes the slot the last
+save didn't use: a sequence number, a CRC32 and a short JSON record. load() takes the
+valid slot with the highest sequence number, so a save torn by a crash still leaves the
+previous one readable. A save is a memcpy and an msync of one page, no open() and no
+rename, so a power cut right after it still finds the record on disk.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+
+# magic, sequence number, CRC32 of the payload, payload length
+SLOT_HEADER = struct.Struct('<4sQIH')
+MAGIC = b'SNAP'
+SLOT_SIZE = 512
+PAYLOAD_SIZE = SLOT_SIZE - SLOT_HEADER.size
+
+
+class StateSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self.saves = 0
+        self._sequence = 0
+        self._map = None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a snapshot from "state_snapshot" in config.json (default
+        intrusion_state.snap), or returns None when it is null.
+        """
+        path = config.get('state_snapshot', 'intrusion_state.snap')
+        return cls(path) if path is not None else None
+
+    def open(self):
+        """
+        Maps the file, creating it if needed, and returns the last record saved, or None.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != 2 * SLOT_SIZE:
+                os.ftruncate(fd, 2 * SLOT_SIZE)
+            self._map = mmap.mmap(fd, 2 * SLOT_SIZE)
+        finally:
+            os.close(fd)
+        record = None
+        for slot in range(2):
+            sequence, payload = self._read(slot)
+            if payload is not None and sequence > self._sequence:
+                self._sequence = sequence
+                record = payload
+        return record
+
+    def save(self, **fields):
+        payload = json.dumps(fields, separators=(',', ':')).encode()
+        if len(payload) > PAYLOAD_SIZE:
+            logging.error(f"State snapshot of {len(payload)} bytes does not fit in {PAYLOAD_SIZE}, not saved")
+            return
+        self._sequence += 1
+        offset = (self._sequence % 2) * SLOT_SIZE
+        # Payload first and header last, so a torn write fails the CRC instead of passing as new
+        self._map[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(payload)] = payload
+        self._map[offset:offset + SLOT_HEADER.size] = SLOT_HEADER.pack(
+            MAGIC, self._sequence, zlib.crc32(payload), len(payload))
+        self._map.flush()
+        self.saves += 1
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _read(self, slot):
+        offset = slot * SLOT_SIZE
+        magic, sequence, crc, length = SLOT_HEADER.unpack_from(self._map, offset)
+        if magic != MAGIC or length > PAYLOAD_SIZE:
+            return 0, None
+        payload = self._map[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length]
+        if zlib.crc32(payload) != crc:
+            return 0, None
+        try:
+            return sequence, json.loads(payload)
+        except ValueError:
+            return 0, None
@@ -0,0 +1,51 @@
+import time
+import wave
+
+import pytest
+
+pygame = pytest.importorskip('pygame')
+
+from audioplayer import AudioPlayer  # noqa: E402
+from soundbank import SoundBank  # noqa: E402
+
+
+@pytest.fixture
+def player():
+    pygame.mixer.init()
+    player = AudioPlayer(SoundBank())
+    player.start()
+    yield player
+    player.stop()
+    pygame.mixer.quit()
+
+
+@pytest.fixture
+def silence(tmp_path):
+    path = str(tmp_path / 'silence.wav')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(22050)
+        f.writeframes(b'\0\0' * int(22050 * 0.2))
+    return path
+
+
+def test_sound_resolves_at_its_end(player, silence):
+    playback = player.play(silence)
+    assert playback.wait(2) is True
+    assert 0.2 <= playback.finished_at - playback.started_at < 0.3
+
+
+def test_stop_resolves_at_once(player, silence):
+    playback = player.play(silence)
+    stopped = time.monotonic()
+    playback.stop()
+    assert playback.wait(0.05) is False
+    assert playback.finished_at - stopped < 0.05
+
+
+def test_preempted_sound_resolves_as_not_completed(player, silence):
+    warning = player.play(silence, 'warning')
+    alarm = player.play(silence, 'alarm')
+    assert warning.wait(0.05) is False
+    assert alarm.wait(2) is True
@@ -0,0 +1,54 @@
+from concurrent import futures
+
+from audiopriority import PriorityLanes
+
+
+def play(lanes, priority, layer=False):
+    # Stands in for a PlaybackHandle, which is done when its sound ends
+    victims = lanes.admit(priority, layer)
+    if victims is None:
+        return None, None
+    # The player stops whatever was preempted
+    for victim in victims:
+        victim.set_result(False)
+    handle = futures.Future()
+    lanes.add(handle, priority, layer)
+    return handle, victims
+
+
+def test_higher_priority_preempts_lower_and_equal():
+    lanes = PriorityLanes()
+    ambient, _ = play(lanes, 'ambient')
+    warning, victims = play(lanes, 'warning')
+    assert victims == [ambient]
+    second_warning, victims = play(lanes, 'warning')
+    assert victims == [warning]
+    _, victims = play(lanes, 'alarm')
+    assert victims == [second_warning]
+    assert lanes.stats()['preempted'] == 3
+
+
+def test_lower_priority_is_suppressed_until_the_higher_one_ends():
+    lanes = PriorityLanes()
+    alarm, _ = play(lanes, 'alarm')
+    assert play(lanes, 'unauthorized') == (None, None)
+    assert lanes.stats()['suppressed'] == 1
+    alarm.set_result(True)
+    _, victims = play(lanes, 'unauthorized')
+    assert victims == []
+
+
+def test_layered_sound_plays_alongside_and_is_preempted_by_its_priority():
+    lanes = PriorityLanes()
+    alarm, _ = play(lanes, 'alarm')
+    voice, victims = play(lanes, 'alarm', layer=True)
+    # A layer preempts nothing and is never suppressed
+    assert victims == []
+    _, victims = play(lanes, 'warning', layer=True)
+    assert victims == []
+    # A layer on its own doesn't hold back lower priorities either
+    alarm.set_result(True)
+    _, victims = play(lanes, 'warning')
+    assert voice not in (victims or [])
+    _, victims = play(lanes, 'alarm')
+    assert voice in victims
@@ -0,0 +1,175 @@
+import json
+import re
+import signal
+
+import pytest
+
+# configreload gets iter_sound_paths from soundbank, which imports pygame
+pytest.importorskip('pygame')
+
+from configreload import ConfigReloader, validate_config  # noqa: E402
+from fakegpio import FakeGPIO  # noqa: E402
+
+SOUNDS = {'power_on': 'on.wav', 'unauthorized': ['u.wav'], 'warning': ['w.wav'],
+          'alarm': 'a.wav', 'power_down': 'd.wav'}
+
+
+def make_system(tmp_path, **overrides):
+    from errorhandling import IntrusionDetectionSystem
+    from simulation import SimAudioPlayer, SimSoundBank, VirtualClock
+    config = {'pir_pin': 27, 'led_pin': 17, 'state_snapshot': None, 'shutdown_deadline': 0,
+              'journal': {'path': str(tmp_path / 'events.jsonl'), 'text_log': False}, 'sounds': SOUNDS}
+    config.update(overrides)
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps(config))
+    return IntrusionDetectionSystem(str(config_file), gpio=FakeGPIO(),
+                                    audio=SimAudioPlayer(VirtualClock(), SimSoundBank()))
+
+
+def shut_down(system):
+    with pytest.raises(SystemExit):
+        system.shutdown()
+    # The system took over Ctrl-C and SIGTERM for its own shutdown
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+@pytest.mark.parametrize('engine, watched', [('threaded', True), ('async', False)])
+def test_only_the_threaded_engine_watches_the_config(tmp_path, engine, watched):
+    # The async engine never reaches the standby swap, a reload would wait forever
+    system = make_system(tmp_path, engine=engine)
+    try:
+        assert (system.config_reloader is not None) == watched
+    finally:
+        shut_down(system)
+
+
+class FakeSoundBank:
+    """
+    Records refresh() calls; decoded lists the paths to report as re-decoded.
+    """
+    def __init__(self):
+        self.refreshed = []
+        self.decoded = []
+
+    def refresh(self, paths):
+        self.refreshed.append(list(paths))
+        return self.decoded, {}
+
+
+def write_config(path, **overrides):
+    config = {'pir_pin': 27, 'led_pin': 17, 'sounds': SOUNDS}
+    config.update(overrides)
+    # A different size marks the file as changed even where mtimes are coarse
+    path.write_text(json.dumps(config) + ' ' * len(path.read_text() if path.exists() else ''))
+    return config
+
+
+def write_sounds(directory):
+    # The sound paths are relative, the tests run in tmp_path
+    for path in ('on.wav', 'u.wav', 'w.wav', 'a.wav', 'd.wav'):
+        (directory / path).write_bytes(b'')
+
+
+def make_reloader(tmp_path, sound_bank):
+    write_sounds(tmp_path)
+    config_file = tmp_path / 'config.json'
+    config = write_config(config_file)
+    ready = []
+    reloader = ConfigReloader(str(config_file), config, sound_bank,
+                              lambda config, changed, timings: ready.append((config, changed, timings)))
+    return reloader, config_file, ready
+
+
+def test_re_decoded_sounds_reach_the_standby_swap(tmp_path):
+    sound_bank = FakeSoundBank()
+    reloader, config_file, ready = make_reloader(tmp_path, sound_bank)
+    # Only a sound file was replaced, config.json was touched to pick it up
+    sound_bank.decoded = ['a.wav']
+    write_config(config_file)
+    assert reloader.check()
+    config, changed, timings = ready[0]
+    assert changed == set() and timings['decoded'] == 1
+
+
+def test_standby_swaps_the_staged_sounds(tmp_path, monkeypatch):
+    from errorhandling import SystemState
+    system = make_system(tmp_path, config_reload=False)
+    swaps = []
+    monkeypatch.setattr(system.sound_bank, 'swap_staged', lambda: swaps.append(system.state), raising=False)
+    try:
+        system._config_ready({'sounds': SOUNDS, 'alarm_delay': 9}, {'alarm_delay'},
+                             {'validate': 0.0, 'sounds': 0.0, 'decoded': 1})
+        assert swaps == []
+        system.apply_pending_config()
+        assert swaps == [SystemState.STANDBY] and system.alarm_delay == 9
+    finally:
+        shut_down(system)
+
+
+def test_valid_config_passes(tmp_path):
+    write_sounds(tmp_path)
+    config = {'pir_pin': 27, 'led_pin': 17, 'sounds': SOUNDS, 'unauthorized_pause': [0, 2], 'warning_delay': 0}
+    assert validate_config(config) is config
+
+
+@pytest.mark.parametrize('overrides, problem', [
+    ({'pir_pin': 'GPIO27'}, "'pir_pin' must be a pin number"),
+    ({'sounds': {**SOUNDS, 'alarm': ['a.wav']}}, 'sounds.alarm must be a file path'),
+    ({'sounds': {**SOUNDS, 'warning': []}}, 'sounds.warning must be a non-empty list'),
+    ({'sounds': {**SOUNDS, 'alarm': 'gone.wav'}}, 'sound file gone.wav does not exist'),
+    ({'unauthorized_pause': [2, 1]}, "'unauthorized_pause' must be [min, max]"),
+    ({'alarm_delay': -1}, "'alarm_delay' must be a number of seconds >= 0"),
+    ({'warning_delay': True}, "'warning_delay' must be a number of seconds >= 0"),
+])
+def test_invalid_config_is_rejected(tmp_path, overrides, problem):
+    write_sounds(tmp_path)
+    config = {'pir_pin': 27, 'led_pin': 17, 'sounds': SOUNDS}
+    config.update(overrides)
+    with pytest.raises(ValueError, match=re.escape(problem)):
+        validate_config(config)
+
+
+def test_every_problem_is_reported():
+    with pytest.raises(ValueError, match="'pir_pin'.*'led_pin'.*'sounds'"):
+        validate_config({'sounds': None})
+
+
+def test_unchanged_file_is_not_reloaded(tmp_path):
+    sound_bank = FakeSoundBank()
+    reloader, config_file, ready = make_reloader(tmp_path, sound_bank)
+    assert not reloader.check()
+    assert sound_bank.refreshed == [] and ready == []
+
+
+def test_changed_timings_are_handed_on(tmp_path):
+    sound_bank = FakeSoundBank()
+    reloader, config_file, ready = make_reloader(tmp_path, sound_bank)
+    write_config(config_file, alarm_delay=9)
+    assert reloader.check()
+    config, changed, timings = ready[0]
+    assert config['alarm_delay'] == 9 and changed == {'alarm_delay'}
+    assert sound_bank.refreshed == [['on.wav', 'u.wav', 'w.wav', 'a.wav', 'd.wav']]
+    # Handed on once, the same file is not reloaded again
+    assert not reloader.check() and reloader.reloads == 1
+
+
+def test_invalid_edit_keeps_the_running_config(tmp_path):
+    sound_bank = FakeSoundBank()
+    reloader, config_file, ready = make_reloader(tmp_path, sound_bank)
+    running = reloader.config
+    config_file.write_text('{"pir_pin": 27,')
+    assert not reloader.check()
+    assert reloader.config is running and reloader.rejected == 1
+    assert sound_bank.refreshed == [] and ready == []
+
+
+def test_restart_keys_are_not_handed_on(tmp_path, caplog):
+    reloader, config_file, ready = make_reloader(tmp_path, FakeSoundBank())
+    write_config(config_file, led_pin=22, alarm_delay=9)
+    assert reloader.check()
+    assert ready[0][1] == {'alarm_delay'}
+    assert 'led_pin only take effect after a restart' in caplog.text
+    # A restart key alone changes nothing the running system reads
+    write_config(config_file, led_pin=23, alarm_delay=9)
+    assert not reloader.check() and len(ready) == 1
@@ -0,0 +1,109 @@
+import json
+import signal
+import threading
+import time
+
+import pytest
+
+from edgedetect import PIRWatcher
+from fakegpio import FakeGPIO
+
+PIN = 27
+# Edge to POWERING_ON on the GPIO callback thread; the poll it replaces took up to 1 s
+LATENCY_BUDGET = 0.05
+
+
+@pytest.fixture
+def watcher():
+    gpio = FakeGPIO()
+    gpio.setmode(gpio.BCM)
+    gpio.setup(PIN, gpio.IN)
+    watcher = PIRWatcher(gpio, PIN, bouncetime=0)
+    watcher.start()
+    yield watcher
+    watcher.stop()
+    gpio.cleanup()
+
+
+def wait_for_events(watcher, count, timeout=1.0):
+    # Edges reach the queue from FakeGPIO's callback thread
+    deadline = time.monotonic() + timeout
+    while watcher.events.qsize() < count:
+        assert time.monotonic() < deadline, f"{count} edges not queued within {timeout}s"
+        time.sleep(0.001)
+
+
+def test_edge_wakes_a_blocked_wait(watcher):
+    woken = []
+    waiter = threading.Thread(target=lambda: woken.append(watcher.wait_for_motion(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    watcher.gpio.set_input(PIN, 1)
+    waiter.join()
+    assert woken[0].kind == 'motion' and woken[0].value is True
+
+
+def test_intruder_still_present_retriggers(watcher):
+    # The edge was used up by the last incident, but the intruder never left
+    watcher.gpio.set_input(PIN, 1)
+    wait_for_events(watcher, 1)
+    assert watcher.wait_for_motion(timeout=0).value is True
+    event = watcher.wait_for_motion(timeout=0)
+    assert event is not None and event.value is True
+
+
+def test_stale_edges_are_drained(watcher):
+    # Someone came and went while the system was busy with the last incident
+    watcher.gpio.set_input(PIN, 1)
+    watcher.gpio.set_input(PIN, 0)
+    wait_for_events(watcher, 2)
+    assert watcher.wait_for_motion(timeout=0.05) is None
+    assert watcher.events.empty()
+    # A fresh edge after the drain still counts
+    watcher.gpio.set_input(PIN, 1)
+    assert watcher.wait_for_motion(timeout=1).value is True
+
+
+def test_edge_to_powering_on_latency(tmp_path):
+    from errorhandling import IntrusionDetectionSystem, SystemState
+    from simulation import SimAudioPlayer, SimSoundBank, VirtualClock
+    config = {
+        'pir_pin': PIN, 'led_pin': 17, 'detection_mode': 'edge', 'config_reload': False,
+        'state_snapshot': None, 'shutdown_deadline': 0,
+        'journal': {'path': str(tmp_path / 'events.jsonl'), 'text_log': False},
+        'sounds': {'power_on': 'on.wav', 'unauthorized': ['u.wav'], 'warning': ['w.wav'],
+                   'alarm': 'a.wav', 'power_down': 'd.wav'},
+    }
+    config_file = tmp_path / 'config.json'
+    config_file.write_text(json.dumps(config))
+    gpio = FakeGPIO()
+    # Standby never plays a sound, so no mixer is needed to measure it
+    system = IntrusionDetectionSystem(str(config_file), gpio=gpio,
+                                      audio=SimAudioPlayer(VirtualClock(), SimSoundBank()))
+    latencies = []
+    try:
+        for _ in range(20):
+            system.state = SystemState.STANDBY
+            gpio.set_input(PIN, 0)
+            reacted = []
+
+            def standby():
+                while system.state == SystemState.STANDBY:
+                    system.handle_standby()
+                reacted.append(time.monotonic())
+            waiter = threading.Thread(target=standby)
+            waiter.start()
+            time.sleep(0.06)
+            injected = time.monotonic()
+            gpio.inject_edge(PIN)
+            waiter.join(5)
+            assert system.state == SystemState.POWERING_ON
+            latencies.append(reacted[0] - injected)
+    finally:
+        with pytest.raises(SystemExit):
+            system.shutdown()
+        # The system took over Ctrl-C and SIGTERM for its own shutdown
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    latencies.sort()
+    assert latencies[len(latencies) // 2] < LATENCY_BUDGET
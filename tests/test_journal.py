@@ -0,0 +1,36 @@
+import json
+
+from journal import EventJournal
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_events_are_written_as_json_lines(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    journal = EventJournal(str(path), text_log=False)
+    journal.start()
+    journal.record('state', state='WARNING')
+    journal.status('Motion detected, system powering on')
+    journal.close()
+    events = read_lines(path)
+    assert [event['event'] for event in events] == ['state', 'status']
+    assert events[0]['state'] == 'WARNING' and isinstance(events[0]['ts'], float)
+
+
+def test_rotation_keeps_backup_count_files(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    # One event per batch, so each write checks the size
+    journal = EventJournal(str(path), max_bytes=200, backup_count=2, text_log=False, batch_size=1)
+    journal.start()
+    for number in range(40):
+        journal.record('state', number=number)
+    journal.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['events.jsonl', 'events.jsonl.1', 'events.jsonl.2']
+    files = [f"{path}.2", f"{path}.1", str(path)]
+    numbers = [event['number'] for name in files for event in read_lines(name)]
+    # The newest events survive, in order, and no file grew past max_bytes
+    assert numbers == list(range(40 - len(numbers), 40))
+    assert all((tmp_path / name).stat().st_size <= 200 for name in ('events.jsonl', 'events.jsonl.1'))
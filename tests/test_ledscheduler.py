@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from fakegpio import FakeGPIO
+from ledscheduler import LEDScheduler, fade, flicker, hold
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = LEDScheduler(fps=100)
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+
+@pytest.fixture
+def pwm():
+    return FakeGPIO().PWM(17, 100)
+
+
+def test_effect_plays_to_its_last_frame(scheduler, pwm):
+    channel = scheduler.add_channel('led', pwm)
+    assert channel.play(fade(0.2, 100, 0, fps=100)).result(2) is True
+    assert pwm.duty_cycle == 0
+    # Every rendered frame is either written or saved, never both
+    stats = scheduler.stats()
+    assert stats['writes'] + stats['writes_saved'] == stats['frames']
+    assert stats['writes'] == pwm.writes
+    assert 10 <= stats['frames'] <= 25
+
+
+def test_unchanged_frames_are_not_written(scheduler, pwm):
+    channel = scheduler.add_channel('led', pwm)
+    channel.play(fade(0.1, 40, 40, fps=100)).result(2)
+    assert pwm.writes == 1
+    assert scheduler.writes_saved >= 1
+
+
+def test_late_start_skips_to_the_end(scheduler, pwm):
+    # Lined up with a sound that started long ago: the first frame is already the last
+    channel = scheduler.add_channel('led', pwm)
+    assert channel.play(fade(1.0, 100, 20, fps=100), started_at=time.monotonic() - 10).result(2) is True
+    assert (pwm.duty_cycle, pwm.writes) == (20, 1)
+
+
+def test_new_effect_preempts_the_playing_one(scheduler, pwm):
+    channel = scheduler.add_channel('led', pwm)
+    first = channel.play(flicker(5, fps=100))
+    second = channel.play(hold(30))
+    assert first.result(1) is False
+    assert second.result(2) is True and pwm.duty_cycle == 30
+
+
+def test_no_frames_while_idle(scheduler, pwm):
+    channel = scheduler.add_channel('led', pwm)
+    channel.play(hold(50)).result(2)
+    frames = scheduler.frames
+    time.sleep(0.1)
+    assert scheduler.frames == frames
+
+
+def test_stop_resolves_effects_as_not_completed(pwm):
+    scheduler = LEDScheduler(fps=100)
+    scheduler.start()
+    playing = scheduler.add_channel('led', pwm).play(fade(5, fps=100))
+    scheduler.stop()
+    assert playing.result(0) is False
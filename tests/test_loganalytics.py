@@ -0,0 +1,76 @@
+import json
+
+from loganalytics import LogIndex, TextLineParser, parse_journal_line
+
+# Two incidents a little under an hour apart, as errorhandling.py writes them to the text log
+TEXT_LOG = """\
+2026-10-01 12:00:00,000:INFO:Motion detected, system powering on
+2026-10-01 12:00:05,000:INFO:Movement still detected, playing warning
+2026-10-01 12:00:12,500:INFO:Intruder refuses to leave, triggering alarm
+2026-10-01 12:00:30,000:INFO:No movement detected, powering down
+2026-10-01 12:59:30,000:INFO:Motion detected, system powering on
+2026-10-01 12:59:34,000:INFO:Intruder left after warning, powering down
+2026-10-01 12:59:34,000:INFO:No movement detected, powering down
+"""
+
+
+def index_of(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content)
+    index = LogIndex(str(tmp_path / 'index.sqlite'))
+    index.update([str(path)])
+    return index, path
+
+
+def test_text_durations_stop_at_the_incident(tmp_path):
+    index, _ = index_of(tmp_path, 'intrusion_log.log', TEXT_LOG)
+    durations = index.state_durations('text', 0, float('inf'))
+    assert durations['powering_on'] == [5.0, 4.0]
+    assert durations['warning'] == [7.5]
+    assert durations['alarm'] == [17.5]
+    assert durations['left_after_warning'] == [0.0]
+    # No standby line, so the idle gap is not counted as powering down
+    assert 'powering_down' not in durations
+    index.close()
+
+
+def test_journal_power_down_ends_at_standby(tmp_path):
+    events = [{'ts': ts, 'event': 'state', 'state': state} for ts, state in (
+        (100.0, 'POWERING_ON'), (102.0, 'UNAUTHORIZED'), (104.0, 'POWERING_DOWN'), (106.5, 'STANDBY'),
+        (4000.0, 'POWERING_ON'))]
+    index, _ = index_of(tmp_path, 'intrusion_events.jsonl', ''.join(json.dumps(e) + '\n' for e in events))
+    durations = index.state_durations('journal', 0, float('inf'))
+    assert durations['powering_down'] == [2.5]
+    assert durations['standby'] == [3893.5]
+    index.close()
+
+
+def test_update_resumes_and_skips_partial_lines(tmp_path):
+    lines = TEXT_LOG.splitlines(keepends=True)
+    index, path = index_of(tmp_path, 'intrusion_log.log', ''.join(lines[:3]) + lines[3].rstrip('\n'))
+    assert dict(index.counts('text', 0, float('inf'))) == {'powering_on': 1, 'warning': 1, 'alarm': 1}
+    path.write_text(''.join(lines))
+    assert index.update([str(path)]) == 4
+    assert index.update([str(path)]) == 0
+    assert dict(index.counts('text', 0, float('inf')))['powering_down'] == 2
+    index.close()
+
+
+def test_rotated_file_is_not_indexed_twice(tmp_path):
+    index, path = index_of(tmp_path, 'intrusion_log.log', TEXT_LOG)
+    rotated = tmp_path / 'intrusion_log.log.1'
+    path.rename(rotated)
+    path.write_text('2026-10-02 08:00:00,000:INFO:Motion detected, system powering on\n')
+    assert index.update([str(rotated), str(path)]) == 1
+    assert dict(index.counts('text', 0, float('inf')))['powering_on'] == 3
+    index.close()
+
+
+def test_parsers():
+    parser = TextLineParser()
+    ts, event_type, zone, _ = parser.parse('2026-10-01 12:00:01,250:INFO:[garage] Motion detected, system powering on\n')
+    assert (event_type, zone) == ('powering_on', 'garage')
+    assert ts - parser.timestamp('2026-10-01 12:00:00,000') == 1.25
+    assert parser.parse('2026-10-01 12:00:01,250:INFO:Sound cache stats: {}\n') is None
+    assert parse_journal_line('{"ts": 1.0, "event": "state", "state": "ALARM"}') == (1.0, 'alarm', None, None)
+    assert parse_journal_line('not json') is None
@@ -0,0 +1,93 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import urllib.request
+
+from fakegpio import FakeGPIO
+from metrics import CountingGPIO, Histogram, Metrics
+
+
+def test_busy_port_runs_without_the_endpoint(tmp_path):
+    with socket.socket() as taken:
+        taken.bind(('127.0.0.1', 0))
+        taken.listen()
+        metrics = Metrics(port=taken.getsockname()[1], snapshot=str(tmp_path / 'metrics.json'), interval=60)
+        metrics.start()
+        try:
+            assert metrics.port is None
+            metrics.observe('state_seconds', 0.2, state='WARNING')
+        finally:
+            metrics.stop()
+    # The snapshot is still written at stop
+    assert (tmp_path / 'metrics.json').exists()
+
+
+def test_endpoint_serves_the_text_format():
+    metrics = Metrics(port=0, snapshot=None)
+    metrics.inc('state_transitions_total', state='ALARM')
+    metrics.start()
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{metrics.port}/metrics").read().decode()
+    finally:
+        metrics.stop()
+    assert 'sentry_state_transitions_total{state="ALARM"} 1' in body
+    assert metrics.scrapes == 1
+
+
+def test_import_leaves_http_server_for_start():
+    # The daemon imports metrics on every start, with "metrics" configured or not
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    loaded = subprocess.run([sys.executable, '-c', "import sys, metrics; print('http.server' in sys.modules)"],
+                            cwd=root, capture_output=True, text=True, check=True).stdout
+    assert loaded.strip() == 'False'
+
+
+def test_histogram_buckets_are_upper_bounds():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    buckets, total, count = histogram.cumulative()
+    # A value equal to a bound lands in that bucket, one past the last goes to +Inf
+    assert buckets == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+    assert (total, count) == (2.65, 4)
+
+
+def test_render_prometheus_text():
+    metrics = Metrics(port=None, snapshot=None)
+    metrics.describe(state_seconds='Time spent in each state')
+    metrics.histogram('state_seconds', buckets=(1.0,), state='ALARM').observe(0.5)
+    metrics.inc('gpio_calls_total', call='input')
+    metrics.inc('gpio_calls_total', 2, call='input')
+    assert metrics.render().splitlines() == [
+        '# TYPE sentry_gpio_calls_total counter',
+        'sentry_gpio_calls_total{call="input"} 3',
+        '# HELP sentry_state_seconds Time spent in each state',
+        '# TYPE sentry_state_seconds histogram',
+        'sentry_state_seconds_bucket{state="ALARM",le="1.0"} 1',
+        'sentry_state_seconds_bucket{state="ALARM",le="+Inf"} 1',
+        'sentry_state_seconds_sum{state="ALARM"} 0.5',
+        'sentry_state_seconds_count{state="ALARM"} 1',
+    ]
+
+
+def test_snapshot_matches_render(tmp_path):
+    metrics = Metrics(port=None, snapshot=str(tmp_path / 'metrics.json'))
+    metrics.observe('handler_seconds', 0.003, handler='handle_standby')
+    metrics.write_snapshot()
+    with open(tmp_path / 'metrics.json') as f:
+        histogram, = json.load(f)['histograms']
+    assert histogram['labels'] == {'handler': 'handle_standby'} and histogram['count'] == 1
+    assert histogram['buckets'][-1] == ['+Inf', 1]
+
+
+def test_counting_gpio_counts_calls_and_pwm_writes():
+    metrics = Metrics(port=None, snapshot=None)
+    gpio = CountingGPIO(FakeGPIO(), metrics)
+    gpio.setup(27, gpio.IN)
+    gpio.input(27)
+    gpio.input(27)
+    gpio.PWM(17, 100).ChangeDutyCycle(50)
+    counts = {dict(labels)['call']: counter.value for (_, labels), counter in metrics._counters.items()}
+    assert counts == {'setup': 1, 'input': 2, 'PWM': 1, 'ChangeDutyCycle': 1}
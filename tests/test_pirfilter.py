@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pirfilter import METHODS, PresenceFilter, RingBuffer  # noqa: E402
+
+
+def test_ring_buffer_wraps_and_keeps_the_newest():
+    ring = RingBuffer(5)
+    ring.extend([1, 2, 3])
+    assert ring.last(10).tolist() == [1, 2, 3]
+    ring.extend([4, 5, 6, 7])
+    assert ring.last(5).tolist() == [3, 4, 5, 6, 7]
+    assert ring.last(2).tolist() == [6, 7]
+    # A block longer than the buffer keeps only its tail
+    ring.extend(range(10, 20))
+    assert ring.last(5).tolist() == [15, 16, 17, 18, 19]
+
+
+def noisy_presence(seed=0):
+    # Someone present for the middle third, with dropouts, and single-sample glitches around
+    # it once the first window has filled
+    rng = random.Random(seed)
+    samples = []
+    for index in range(3000):
+        if 1000 <= index < 2000:
+            samples.append(0 if rng.random() < 0.2 else 1)
+        elif index >= 100:
+            samples.append(1 if rng.random() < 0.02 else 0)
+        else:
+            samples.append(0)
+    return samples
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_blockwise_matches_one_shot(method):
+    samples = noisy_presence()
+    whole, whole_confidence = PresenceFilter(method, window=100).process(samples)
+    blockwise = PresenceFilter(method, window=100)
+    parts = [blockwise.process(samples[start:start + 37]) for start in range(0, len(samples), 37)]
+    assert np.array_equal(np.concatenate([present for present, _ in parts]), whole)
+    assert np.allclose(np.concatenate([confidence for _, confidence in parts]), whole_confidence)
+
+
+@pytest.mark.parametrize('method', ['majority', 'hysteresis'])
+def test_glitches_are_filtered_and_presence_is_found(method):
+    present, confidence = PresenceFilter(method, window=100).process(noisy_presence())
+    assert not present[:1000].any()
+    assert present[1200:2000].all()
+    # Hysteresis holds on below half the window, so only majority is always at least 0.5 sure
+    assert ((confidence >= (0.5 if method == 'majority' else 0)) & (confidence <= 1)).all()
+
+
+def test_hysteresis_holds_through_a_dropout():
+    samples = [1] * 100 + [0] * 70 + [1] * 50
+    majority, _ = PresenceFilter('majority', window=100).process(samples)
+    hysteresis, _ = PresenceFilter('hysteresis', window=100, on=0.6, off=0.2).process(samples)
+    assert not majority[160:170].any()
+    assert hysteresis[1:].all()
+
+
+def test_debounce_waits_for_a_full_agreeing_window():
+    present, _ = PresenceFilter('debounce', window=10).process([1] * 15)
+    assert not present[:9].any() and present[9:].all()
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        PresenceFilter('median')
@@ -0,0 +1,49 @@
+import pytest
+
+from fakegpio import FakeGPIO
+from rgbpipeline import OFF, RGBLed, gamma_lut, rgb_fade, rgb_flicker
+
+
+@pytest.fixture
+def pwms():
+    gpio = FakeGPIO()
+    return [gpio.PWM(pin, 100) for pin in (17, 22, 24)]
+
+
+def test_only_changed_channels_are_written(pwms):
+    led = RGBLed(*pwms)
+    led.set_color(100, 0, 0)
+    assert [pwm.writes for pwm in pwms] == [1, 1, 1]
+    # Same red, new green: one write, two saved
+    led.set_color(100, 50, 0)
+    assert [pwm.writes for pwm in pwms] == [1, 2, 1]
+    assert (led.writes, led.writes_saved) == (4, 2)
+    led.set_color(100, 50, 0)
+    assert led.writes == 4 and led.writes_saved == 5
+
+
+def test_levels_that_round_to_the_same_duty_cycle_are_not_written(pwms):
+    led = RGBLed(*pwms)
+    led.set_color(10, 10, 10)
+    led.set_color(10.2, 9.8, 10.4)
+    assert led.writes == 3
+
+
+def test_gamma_and_brightness(pwms):
+    led = RGBLed(*pwms, gamma=2.0, brightness=0.5)
+    # Out-of-range levels are clamped
+    led.set_color(50, 100, 150)
+    assert [pwm.duty_cycle for pwm in pwms] == [12.5, 50.0, 50.0]
+    assert gamma_lut()[0] == 0 and gamma_lut()[100] == 100
+
+
+def test_fade_ends_on_its_target():
+    effect = rgb_fade(1.0, (100, 0, 0), fps=10)
+    assert len(effect.frames) == 11
+    assert effect.frames[0] == (100, 0, 0) and effect.frames[-1] == OFF
+
+
+def test_flicker_ends_on():
+    effect = rgb_flicker(1.0, (100, 100, 0), fps=50)
+    assert effect.frames[-1] == (100, 100, 0)
+    assert set(effect.frames) == {(100, 100, 0), OFF}
@@ -0,0 +1,111 @@
+import pytest
+
+pytest.importorskip('pygame')
+
+from soundbank import SoundBank, iter_sound_paths  # noqa: E402
+
+# Decoded bytes of one second in the default mixer format, 44.1 kHz 16-bit stereo
+SECOND = 44100 * 2 * 2
+
+
+class FakeSound:
+    def __init__(self, path):
+        self.path = path
+
+    def get_length(self):
+        return 1.0
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = []
+    for name in ('a', 'b', 'c'):
+        path = tmp_path / f"{name}.wav"
+        path.write_bytes(b'')
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def loads():
+    return []
+
+
+@pytest.fixture
+def bank(loads):
+    def loader(path):
+        loads.append(path)
+        return FakeSound(path)
+    return SoundBank(max_bytes=2 * SECOND, loader=loader)
+
+
+def test_hits_do_not_decode_again(bank, loads, paths):
+    a = bank.get(paths[0])
+    assert bank.get(paths[0]) is a
+    assert loads == [paths[0]]
+    assert (bank.hits, bank.misses) == (1, 1)
+
+
+def test_least_recently_used_is_evicted(bank, loads, paths):
+    a, b, c = paths
+    bank.preload([a, b])
+    # Using a makes b the least recent, so c pushes b out
+    bank.get(a)
+    bank.get(c)
+    assert bank.stats()['evictions'] == 1 and bank.bytes_used == 2 * SECOND
+    loads.clear()
+    bank.get(a)
+    bank.get(b)
+    assert loads == [b]
+
+
+def test_durations_outlive_eviction(bank, loads, paths):
+    bank.preload(paths)
+    loads.clear()
+    assert [bank.duration(path) for path in paths] == [1.0, 1.0, 1.0]
+    assert loads == []
+
+
+def test_a_sound_over_budget_is_still_kept(loads, paths):
+    bank = SoundBank(max_bytes=SECOND // 2, loader=FakeSound)
+    bank.preload(paths[:2])
+    assert bank.stats()['sounds'] == 1 and bank.evictions == 1
+
+
+def test_iter_sound_paths():
+    sounds = {'power_on': 'on.mp3', 'warning': ['w1.mp3', 'w2.mp3']}
+    assert list(iter_sound_paths(sounds)) == ['on.mp3', 'w1.mp3', 'w2.mp3']
+
+
+def rewrite(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_refresh_stages_changed_sounds_until_swapped(bank, loads, paths):
+    a, b, _ = paths
+    old = bank.get(a)
+    rewrite(a, b'changed')
+    loads.clear()
+    assert bank.refresh([a, b]) == ([a, b], {})
+    # Playback keeps the old decode until the swap at standby
+    assert bank.get(a) is old and bank.get_latest(a) is not old
+    assert bank.swap_staged() == 2
+    assert bank.get(a) is not old
+    assert loads == [a, b]
+
+
+def test_refresh_skips_unchanged_and_staged_files(bank, loads, paths):
+    a, b, _ = paths
+    bank.get(a)
+    bank.refresh([b])
+    loads.clear()
+    assert bank.refresh([a, b]) == ([], {})
+    assert loads == []
+
+
+def test_refresh_reports_failures(bank, tmp_path):
+    missing = str(tmp_path / 'missing.wav')
+    decoded, failed = bank.refresh([missing])
+    assert decoded == [] and isinstance(failed[missing], OSError)
+    assert bank.swap_staged() == 0
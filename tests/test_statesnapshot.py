@@ -0,0 +1,45 @@
+from statesnapshot import SLOT_HEADER, SLOT_SIZE, StateSnapshot
+
+
+def test_reopen_returns_the_last_save(tmp_path):
+    path = str(tmp_path / 'state.snap')
+    snapshot = StateSnapshot(path)
+    assert snapshot.open() is None
+    snapshot.save(state='WARNING', saved_at=1.0)
+    snapshot.save(state='ALARM', saved_at=2.0)
+    snapshot.close()
+    reopened = StateSnapshot(path)
+    assert reopened.open() == {'state': 'ALARM', 'saved_at': 2.0}
+    reopened.close()
+
+
+def test_torn_save_falls_back_to_the_other_slot(tmp_path):
+    path = str(tmp_path / 'state.snap')
+    snapshot = StateSnapshot(path)
+    snapshot.open()
+    snapshot.save(state='WARNING')
+    snapshot.save(state='ALARM')
+    snapshot.close()
+    # The ALARM save (sequence 2, slot 0) was cut off mid-payload by a power cut
+    with open(path, 'r+b') as f:
+        f.seek(SLOT_HEADER.size + 2)
+        f.write(b'\xff')
+    reopened = StateSnapshot(path)
+    assert reopened.open() == {'state': 'WARNING'}
+    # The next save goes to the torn slot, never over the one that was read
+    reopened.save(state='POWERING_DOWN')
+    reopened.close()
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert b'WARNING' in data[SLOT_SIZE:] and b'POWERING_DOWN' in data[:SLOT_SIZE]
+    assert StateSnapshot(path).open() == {'state': 'POWERING_DOWN'}
+
+
+def test_garbage_file_is_ignored(tmp_path):
+    path = tmp_path / 'state.snap'
+    path.write_bytes(b'\x00junk' * 300)
+    snapshot = StateSnapshot(str(path))
+    assert snapshot.open() is None
+    snapshot.save(state='STANDBY')
+    snapshot.close()
+    assert StateSnapshot(str(path)).open() == {'state': 'STANDBY'}
@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from edgedetect import SensorEvent
+
+
+def frame_rms(frame):
+    """
+    Root-mean-square level of a frame of 16-bit mono PCM.
+    """
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    if not samples.size:
+        return 0.0
+    return float(np.sqrt(np.mean(samples * samples)))
+
+
+class EnergyVAD:
+    """
+    Cheap voice activity detector on frame energy. The noise floor follows the room while
+    nobody speaks; speech starts after start_frames loud frames in a row and ends after
+    hangover_frames quiet ones.
+    """
+    def __init__(self, threshold=300.0, ratio=3.0, start_frames=2, hangover_frames=5, adapt=0.05):
+        self.noise_floor = threshold / ratio
+        self.min_threshold = threshold
+        self.ratio = ratio
+        self.start_frames = start_frames
+        self.hangover_frames = hangover_frames
+        self.adapt = adapt
+        self.speaking = False
+        self._loud = 0
+        self._quiet = 0
+
+    @property
+    def threshold(self):
+        return max(self.min_threshold, self.noise_floor * self.ratio)
+
+    def update(self, rms):
+        """
+        Feeds one frame's level and returns True while it is inside a speech segment.
+        """
+        loud = rms > self.threshold
+        if not self.speaking:
+            if not loud:
+                self.noise_floor += self.adapt * (rms - self.noise_floor)
+            self._loud = self._loud + 1 if loud else 0
+            if self._loud >= self.start_frames:
+                self.speaking = True
+                self._quiet = 0
+        else:
+            self._quiet = 0 if loud else self._quiet + 1
+            if self._quiet >= self.hangover_frames:
+                self.speaking = False
+                self._loud = 0
+        return self.speaking
+
+
+class VoicePipeline:
+    """
+    Background voice command listener that runs alongside sentry mode. Every microphone
+    frame goes through the EnergyVAD; only speech segments, plus a few frames of pre-roll,
+    reach the keyword spotter. Detected commands are put on events as
+    SensorEvent('command', 'voice', command, timestamp), the same queue the state machine
+    already reads PIR events from, so recognition never runs on its thread.
+    """
+    def __init__(self, read_frame, spotter, events=None, vad=None, preroll_frames=3):
+        self.read_frame = read_frame
+        self.spotter = spotter
+        self.events = events if events is not None else queue.Queue()
+        self.vad = vad or EnergyVAD()
+        self.preroll = deque(maxlen=preroll_frames)
+        self.frames = 0
+        self.speech_frames = 0
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_listener(cls, listener, events=None):
+        """
+        Builds a pipeline on a keywordspot.CommandListener, reusing its open microphone,
+        spotter and calibrated energy threshold.
+        """
+        vad = EnergyVAD(threshold=listener.recognizer.energy_threshold)
+        return cls(listener.read_frame, listener.spotter, events, vad)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='voice', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def process(self, frame):
+        """
+        Runs one frame through VAD gating and, during speech, the spotter. Returns a
+        Detection when a command completes.
+        """
+        self.frames += 1
+        was_speaking = self.vad.speaking
+        if not self.vad.update(frame_rms(frame)):
+            if was_speaking:
+                # End of the segment, the next one starts with a clean decoder
+                self.spotter.reset()
+            self.preroll.append(frame)
+            return None
+        detection = None
+        if not was_speaking:
+            for buffered in self.preroll:
+                detection = detection or self.spotter.process(buffered)
+            self.preroll.clear()
+        self.speech_frames += 1
+        return detection or self.spotter.process(frame)
+
+    def _run(self):
+        while self._running:
+            try:
+                frame = self.read_frame()
+            except OSError as e:
+                # Microphone overflow or unplugged, keep listening rather than dying
+                logging.error(f"Microphone read failed: {e}")
+                time.sleep(1)
+                continue
+            detection = self.process(frame)
+            if detection is not None:
+                logging.info(f"Voice command '{detection.phrase}' -> {detection.command}")
+                self.events.put(SensorEvent('command', 'voice', detection.command, time.monotonic()))
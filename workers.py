@@ -0,0 +1,586 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent import futures
+
+from audioplayer import PlaybackHandle
+from ledscheduler import DEFAULT_FPS, LEDScheduler, hold
+
+WORKERS = ('sensor', 'audio', 'led')
+# Workers beat at least this often, and are restarted after `timeout` seconds of silence
+HEARTBEAT_INTERVAL = 0.2
+# A fresh worker gets longer to import pygame and decode sounds before its first beat counts
+STARTUP_GRACE = 15.0
+MAX_BACKOFF = 30.0
+
+
+def _worker_setup():
+    # Ctrl-C and systemd signal the whole process group; the main process decides when
+    # workers stop, after the power-down sound has played through them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+def _load_gpio(fake):
+    if fake:
+        from fakegpio import FakeGPIO
+        return FakeGPIO()
+    import RPi.GPIO as GPIO
+    return GPIO
+
+
+def _serve(commands, heartbeats, slot, handle, idle=None):
+    # Exits with the main process even if it died without stopping us
+    parent = os.getppid()
+    while os.getppid() == parent:
+        heartbeats[slot] = time.monotonic()
+        if idle is not None:
+            idle()
+        try:
+            message = commands.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            continue
+        if message is None:
+            return
+        handle(message)
+
+
+def _call(target, message, replies):
+    _, request, method, args = message
+    try:
+        replies.put(('result', request, getattr(target, method)(*args)))
+    except Exception as e:
+        replies.put(('error', request, f"{type(e).__name__}: {e}"))
+
+
+def sensor_main(config, commands, replies, heartbeats, slot, fake, level):
+    """
+    Owns the PIR pin. Edges go to the main process as ('edge', level, timestamp), and the
+    latest level is kept in shared memory for plain reads.
+    """
+    _worker_setup()
+    gpio = _load_gpio(fake)
+    pin = config['pir_pin']
+    gpio.setmode(gpio.BCM)
+    gpio.setup(pin, gpio.IN)
+
+    def on_edge(channel):
+        timestamp = time.monotonic()
+        value = bool(gpio.input(channel))
+        level.value = value
+        replies.put(('edge', value, timestamp))
+
+    def refresh():
+        # Covers a missed edge, the state machine polls this level in 'poll' mode
+        level.value = bool(gpio.input(pin))
+
+    def handle(message):
+        if message[0] == 'set':
+            # Only the fake backend can drive its input, used by benchmarks
+            gpio.set_input(pin, message[1])
+
+    refresh()
+    gpio.add_event_detect(pin, gpio.BOTH, callback=on_edge, bouncetime=config.get('pir_bouncetime', 50))
+    replies.put(('ready', os.getpid()))
+    try:
+        _serve(commands, heartbeats, slot, handle, refresh)
+    finally:
+        gpio.cleanup()
+
+
+def audio_main(config, commands, replies, heartbeats, slot):
+    """
+    Owns the mixer, the sound bank and the AudioPlayer. Decoding and playback never share
+    a GIL with the state machine.
+    """
+    _worker_setup()
+    import pygame
+    from soundbank import SoundBank, iter_sound_paths
+    from audioplayer import AudioPlayer
+
+    pygame.mixer.init(buffer=config.get('audio_buffer', 512))
+    sound_bank = SoundBank.from_config(config)
+    sound_bank.preload(iter_sound_paths(config['sounds']))
+    player = AudioPlayer(sound_bank)
+    player.start()
+    playing = {}
+    # Sound bank calls (a config reload's refresh) decode on their own thread, in order,
+    # so a long decode holds up neither playback commands nor heartbeats
+    calls = futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='sound-bank')
+
+    def finished(request, playback):
+        playing.pop(request, None)
+        replies.put(('finished', request, playback.future.result()))
+
+    def handle(message):
+        kind = message[0]
+        if kind == 'play':
+            _, request, path, options = message
+            playback = player.play(path, **options)
+            playing[request] = playback
+            replies.put(('started', request, playback.started_at))
+            playback.add_done_callback(lambda playback: finished(request, playback))
+        elif kind == 'stop':
+            playback = playing.get(message[1])
+            if playback is not None:
+                playback.stop()
+        elif kind == 'call':
+            calls.submit(_call, sound_bank, message, replies)
+
+    replies.put(('ready', os.getpid()))
+    try:
+        _serve(commands, heartbeats, slot, handle)
+    finally:
+        calls.shutdown(wait=False, cancel_futures=True)
+        player.stop()
+        pygame.mixer.quit()
+
+
+def led_main(config, commands, replies, heartbeats, slot, fake):
+    """
+    Owns the LED pin and renders effects on its own LEDScheduler.
+    """
+    _worker_setup()
+    gpio = _load_gpio(fake)
+    pin = config['led_pin']
+    gpio.setmode(gpio.BCM)
+    gpio.setup(pin, gpio.OUT)
+    pwm = gpio.PWM(pin, 100)
+    pwm.start(0)
+    scheduler = LEDScheduler(config.get('led_fps', DEFAULT_FPS))
+    channel = scheduler.add_channel('led', pwm)
+    scheduler.start()
+
+    def handle(message):
+        if message[0] == 'play':
+            _, request, effect, started_at = message
+            channel.play(effect, started_at).add_done_callback(
+                lambda future: replies.put(('done', request, future.result())))
+        elif message[0] == 'call':
+            _call(scheduler, message, replies)
+
+    replies.put(('ready', os.getpid()))
+    try:
+        _serve(commands, heartbeats, slot, handle)
+    finally:
+        scheduler.stop()
+        pwm.stop()
+        gpio.cleanup()
+
+
+class _NullPWM:
+    # The LED worker owns the real PWM, the state machine's one goes nowhere
+    def start(self, duty_cycle):
+        pass
+
+    def ChangeDutyCycle(self, duty_cycle):
+        pass
+
+    def ChangeFrequency(self, frequency):
+        pass
+
+    def stop(self):
+        pass
+
+
+class GPIOProxy:
+    """
+    RPi.GPIO as the state machine's process sees it. The sensor worker owns the PIR pin:
+    input() reads the level it last saw from shared memory and edge callbacks fire from
+    its queue, already debounced. The LED worker owns the LED pin, so setup and PWM do
+    nothing here.
+    """
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+    FALLING = 32
+    RISING = 31
+    BOTH = 33
+
+    def __init__(self, supervisor, pin):
+        self.supervisor = supervisor
+        self.pin = pin
+        self._callbacks = []
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        pass
+
+    def cleanup(self, pins=None):
+        pass
+
+    def input(self, pin):
+        return int(self.supervisor.level.value)
+
+    def PWM(self, pin, frequency):
+        return _NullPWM()
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if callback is not None:
+            self._callbacks.append(callback)
+
+    def add_event_callback(self, pin, callback):
+        self._callbacks.append(callback)
+
+    def remove_event_detect(self, pin):
+        self._callbacks.clear()
+
+    def set_input(self, pin, value):
+        """
+        Drives the PIR level of a fake-GPIO sensor worker.
+        """
+        self.supervisor.send('sensor', ('set', bool(value)))
+
+    def _edge(self, level, timestamp):
+        for callback in list(self._callbacks):
+            callback(self.pin)
+
+
+class _RemoteChannel:
+    # What PlaybackHandle.stop() calls, forwarded to the audio worker
+    def __init__(self, supervisor, request):
+        self.supervisor = supervisor
+        self.request = request
+
+    def stop(self):
+        self.supervisor.send('audio', ('stop', self.request))
+
+
+class RemoteSoundBank:
+    """
+    The parts of SoundBank the state machine and config reloader use, run in the audio worker.
+    """
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+        self.bundle = None
+        self._durations = {}
+
+    def duration(self, path):
+        if path not in self._durations:
+            self._durations[path] = self.supervisor.call('audio', 'duration', path)
+        return self._durations[path]
+
+    def refresh(self, paths):
+        return self.supervisor.call('audio', 'refresh', list(paths))
+
+    def swap_staged(self):
+        self._durations.clear()
+        return self.supervisor.call('audio', 'swap_staged')
+
+    def stats(self):
+        return self.supervisor.call('audio', 'stats')
+
+
+class AudioProxy:
+    """
+    AudioPlayer stand-in. play() returns a PlaybackHandle at once; its started_at is
+    corrected to the worker's start time and it resolves when the worker reports the end.
+    """
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+        self.sound_bank = RemoteSoundBank(supervisor)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        for playback in self.supervisor.pending('audio', PlaybackHandle):
+            playback.stop()
+
+    def play(self, path, priority=None, layer=False, fade_ms=0):
+        playback = PlaybackHandle(path)
+        request = self.supervisor.next_id()
+        playback.channel = _RemoteChannel(self.supervisor, request)
+        options = {'priority': priority, 'layer': layer, 'fade_ms': fade_ms}
+        self.supervisor.send('audio', ('play', request, path, options), playback, request)
+        return playback
+
+
+class _RemoteLEDChannel:
+    def __init__(self, supervisor, name):
+        self.supervisor = supervisor
+        self.name = name
+
+    def play(self, effect, started_at=None):
+        future = futures.Future()
+        request = self.supervisor.next_id()
+        started_at = started_at if started_at is not None else time.monotonic()
+        self.supervisor.send('led', ('play', request, effect, started_at), future, request)
+        return future
+
+    def write(self, duty_cycle):
+        self.play(hold(duty_cycle))
+
+
+class LEDProxy:
+    """
+    LEDScheduler stand-in. Effects are sent whole to the LED worker, which renders them;
+    CLOCK_MONOTONIC is shared between processes, so started_at lines up across them.
+    """
+    def __init__(self, supervisor, fps=DEFAULT_FPS):
+        self.supervisor = supervisor
+        self.fps = fps
+
+    def add_channel(self, name, pwm):
+        return _RemoteLEDChannel(self.supervisor, name)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return self.supervisor.call('led', 'stats')
+
+
+class Worker:
+    def __init__(self, name, target, extra=()):
+        self.name = name
+        self.target = target
+        self.extra = extra
+        self.commands = None
+        self.replies = None
+        self.process = None
+        self.pending = {}
+        self.ready = threading.Event()
+        self.restarts = 0
+        self.restart_times = []
+        self.launched_at = None
+        self.restarted_at = None
+        self.quick_crashes = 0
+        self.backoff = 0.0
+        self.next_launch = 0.0
+
+
+class Supervisor:
+    """
+    Runs the PIR, audio and LED hardware in worker processes of their own, so a slow
+    decode, LED frame or log flush never holds the GIL the state machine needs. gpio,
+    audio and leds are stand-ins for RPi.GPIO, AudioPlayer and LEDScheduler that talk to
+    the workers over multiprocessing queues; the sensor worker also publishes the PIR
+    level in shared memory. A monitor thread restarts any worker that exits or stops
+    heartbeating. The state machine, armed flag included, lives in this process and carries
+    on; work in flight on a restarted worker resolves as not completed.
+    """
+    def __init__(self, config, fake_gpio=False, journal=None, timeout=3.0):
+        self.config = config
+        self.journal = journal
+        self.timeout = timeout
+        # Spawned, not forked: SDL and RPi.GPIO don't survive a fork of a threaded process
+        self.context = multiprocessing.get_context('spawn')
+        self.heartbeats = self.context.Array('d', len(WORKERS), lock=False)
+        self.level = self.context.Value('b', 0, lock=False)
+        self.workers = {
+            'sensor': Worker('sensor', sensor_main, (fake_gpio, self.level)),
+            'audio': Worker('audio', audio_main),
+            'led': Worker('led', led_main, (fake_gpio,)),
+        }
+        self.gpio = GPIOProxy(self, config['pir_pin'])
+        self.audio = AudioProxy(self)
+        self.leds = LEDProxy(self, config.get('led_fps', DEFAULT_FPS))
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._monitor = None
+
+    def start(self):
+        for worker in self.workers.values():
+            self._launch(worker)
+        self._monitor = threading.Thread(target=self._watch, name='supervisor', daemon=True)
+        self._monitor.start()
+
+    def wait_ready(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self.workers.values():
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if not worker.ready.wait(remaining):
+                return False
+        return True
+
+    def stop(self):
+        self._stopping.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=2)
+        for worker in self.workers.values():
+            if worker.commands is not None:
+                worker.commands.put(None)
+        for worker in self.workers.values():
+            if worker.process is None:
+                continue
+            worker.process.join(timeout=2)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join(timeout=1)
+        for worker in self.workers.values():
+            self._fail_pending(worker)
+
+    def next_id(self):
+        return next(self._ids)
+
+    def send(self, name, message, pending=None, request=None):
+        worker = self.workers[name]
+        with self._lock:
+            # Down for a crash-loop backoff: nothing would ever answer, so pending fails now
+            if worker.commands is not None:
+                if pending is not None:
+                    worker.pending[request] = pending
+                worker.commands.put(message)
+                return
+        if pending is not None:
+            self._fail(worker, pending)
+
+    def call(self, name, method, *args, timeout=10.0):
+        """
+        Runs method(*args) on the worker's sound bank or LED scheduler and returns the result.
+        """
+        future = futures.Future()
+        request = self.next_id()
+        self.send(name, ('call', request, method, args), future, request)
+        return future.result(timeout)
+
+    def pending(self, name, kind):
+        with self._lock:
+            return [item for item in self.workers[name].pending.values() if isinstance(item, kind)]
+
+    def stats(self):
+        return {name: {'restarts': worker.restarts, 'pid': worker.process.pid if worker.process else None,
+                       'restart_seconds': [round(seconds, 3) for seconds in worker.restart_times]}
+                for name, worker in self.workers.items()}
+
+    def _launch(self, worker):
+        slot = WORKERS.index(worker.name)
+        worker.ready.clear()
+        worker.launched_at = time.monotonic()
+        self.heartbeats[slot] = worker.launched_at
+        # Fresh queues every launch: a worker killed inside get() or put() takes the queue's
+        # lock with it, and its half-written messages with them. Anything still pending was
+        # sent to the old queue and will never be answered
+        with self._lock:
+            worker.commands = self.context.Queue()
+            worker.replies = self.context.Queue()
+            stale, worker.pending = worker.pending, {}
+        for item in stale.values():
+            self._fail(worker, item)
+        threading.Thread(target=self._pump, args=(worker, worker.replies), name=f'{worker.name}-replies',
+                         daemon=True).start()
+        worker.process = self.context.Process(
+            target=worker.target, name=f'sentry-{worker.name}', daemon=True,
+            args=(self.config, worker.commands, worker.replies, self.heartbeats, slot) + worker.extra)
+        worker.process.start()
+
+    def _watch(self):
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            now = time.monotonic()
+            for slot, name in enumerate(WORKERS):
+                worker = self.workers[name]
+                if worker.process is None:
+                    # Sitting out a crash-loop backoff
+                    if now >= worker.next_launch:
+                        self._launch(worker)
+                    continue
+                limit = self.timeout if worker.ready.is_set() else STARTUP_GRACE
+                if not worker.process.is_alive():
+                    reason = f"exited with code {worker.process.exitcode}"
+                elif now - self.heartbeats[slot] > limit:
+                    reason = f"missed heartbeats for {now - self.heartbeats[slot]:.1f}s"
+                else:
+                    continue
+                self._restart(worker, reason)
+
+    def _restart(self, worker, reason):
+        now = time.monotonic()
+        logging.error(f"{worker.name} worker {reason}, restarting it")
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join(timeout=1)
+        # From here send() fails its work at once instead of queueing it for a dead worker
+        with self._lock:
+            worker.commands = None
+            worker.process = None
+        self._fail_pending(worker)
+        # Restarted at once, unless it keeps dying within a minute of launch: then after
+        # 1 s, 2 s, 4 s ... up to MAX_BACKOFF
+        if now - worker.launched_at > 60:
+            worker.quick_crashes = 0
+        worker.backoff = min(MAX_BACKOFF, 2.0 ** (worker.quick_crashes - 1)) if worker.quick_crashes else 0.0
+        worker.quick_crashes += 1
+        worker.next_launch = now + worker.backoff
+        worker.restarts += 1
+        worker.restarted_at = now
+        if self.journal is not None:
+            self.journal.record('worker_restart', worker=worker.name, reason=reason, restarts=worker.restarts)
+        if worker.backoff == 0:
+            self._launch(worker)
+
+    def _fail_pending(self, worker):
+        with self._lock:
+            pending, worker.pending = worker.pending, {}
+        for item in pending.values():
+            self._fail(worker, item)
+
+    def _fail(self, worker, item):
+        # Resolves work the worker will never finish: playbacks and LED effects as not
+        # completed, calls with RuntimeError
+        if isinstance(item, PlaybackHandle):
+            item._finish(False)
+        elif not item.done():
+            if worker.name == 'led':
+                item.set_result(False)
+            else:
+                item.set_exception(RuntimeError(f"{worker.name} worker restarted"))
+
+    def _pump(self, worker, replies):
+        # Reads one launch's replies, until the worker is relaunched with new queues
+        while worker.replies is replies and not self._stopping.is_set():
+            try:
+                message = replies.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                continue
+            except Exception as e:
+                logging.error(f"Unreadable reply from the {worker.name} worker: {e}")
+                continue
+            try:
+                self._dispatch(worker, message)
+            except Exception as e:
+                logging.error(f"Bad reply from the {worker.name} worker: {e}")
+
+    def _dispatch(self, worker, message):
+        kind = message[0]
+        if kind == 'edge':
+            self.gpio._edge(*message[1:])
+        elif kind == 'ready':
+            worker.ready.set()
+            if worker.restarted_at is not None:
+                seconds = time.monotonic() - worker.restarted_at
+                worker.restart_times.append(seconds)
+                worker.restarted_at = None
+                logging.info(f"{worker.name} worker back up in {seconds:.2f}s (pid {message[1]})")
+        elif kind == 'started':
+            playback = worker.pending.get(message[1])
+            if playback is not None:
+                playback.started_at = message[2]
+        else:
+            with self._lock:
+                item = worker.pending.pop(message[1], None)
+            if item is None:
+                return
+            if kind == 'finished':
+                item._finish(message[2])
+            elif kind in ('done', 'result'):
+                item.set_result(message[2])
+            elif kind == 'error':
+                item.set_exception(RuntimeError(message[2]))
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import signal
+import sys
+from logging.handlers import RotatingFileHandler
+
+import pygame
+
+from asyncengine import AsyncStateMachine, run_machines
+from audioplayer import AudioPlayer
+from journal import EventJournal
+from ledscheduler import LEDScheduler
+from soundbank import SoundBank, iter_sound_paths
+from voicepipeline import VoicePipeline
+
+# Per-zone keys that fall back to the top-level value in config.json when a zone omits them
+ZONE_DEFAULTS = ('sounds', 'unauthorized_pause', 'warning_delay', 'alarm_delay')
+
+
+def load_zones(config):
+    """
+    Expands the "zones" list of a config into complete per-zone settings. A config without
+    "zones" is a single zone built from the top-level pir_pin and led_pin.
+    """
+    zones = config.get('zones') or [{'name': 'main', 'pir_pin': config['pir_pin'], 'led_pin': config['led_pin']}]
+    expanded = []
+    seen_pins = set()
+    for index, zone in enumerate(zones):
+        zone = dict(zone)
+        zone.setdefault('name', f"zone{index + 1}")
+        for key in ZONE_DEFAULTS:
+            if key not in zone and key in config:
+                zone[key] = config[key]
+        # A zone may override only some sounds, e.g. a different alarm
+        if 'sounds' in config and zone['sounds'] is not config['sounds']:
+            zone['sounds'] = {**config['sounds'], **zone['sounds']}
+        for pin in (zone['pir_pin'], zone['led_pin']):
+            if pin in seen_pins:
+                raise ValueError(f"GPIO {pin} is used by more than one zone ({zone['name']})")
+            seen_pins.add(pin)
+        expanded.append(zone)
+    return expanded
+
+
+class ZoneManager:
+    """
+    Drives any number of PIR/LED/speaker zones from one process: a single GPIO setup,
+    mixer, sound bank and audio player, and one AsyncStateMachine per zone. All zones run
+    as coroutines on one asyncio loop and share one sensor dispatcher, so adding a zone
+    adds no threads.
+    """
+    def __init__(self, config_file, gpio=None):
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+
+        log_handler = RotatingFileHandler('intrusion_log.log', maxBytes=1e6, backupCount=5)
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s', handlers=[log_handler])
+
+        self.journal = EventJournal.from_config(config)
+        self.journal.start()
+
+        self.zones = load_zones(config)
+        self.pir_bouncetime = config.get('pir_bouncetime', 50)
+
+        if gpio is None:
+            import RPi.GPIO as gpio
+        self.gpio = gpio
+        self.gpio.setmode(self.gpio.BCM)
+
+        pygame.mixer.init()
+        self.sound_bank = SoundBank.from_config(config)
+        self.sound_bank.preload(sorted({path for zone in self.zones for path in iter_sound_paths(zone['sounds'])}))
+        # Enough mixer channels for every zone to play at once
+        self.audio = AudioPlayer(self.sound_bank, num_channels=max(8, len(self.zones)))
+        self.audio.start()
+
+        # One scheduler thread renders the LED effects of every zone
+        self.leds = LEDScheduler(config.get('led_fps', 50))
+        self.leds.start()
+
+        self.machines = []
+        self.led_pwms = []
+        for zone in self.zones:
+            self.gpio.setup(zone['pir_pin'], self.gpio.IN)
+            self.gpio.setup(zone['led_pin'], self.gpio.OUT)
+            led_pwm = self.gpio.PWM(zone['led_pin'], 100)
+            led_pwm.start(0)
+            self.led_pwms.append(led_pwm)
+            self.machines.append(AsyncStateMachine(
+                zone['name'], self.gpio, zone['pir_pin'], self.leds.add_channel(zone['name'], led_pwm),
+                zone['sounds'], self.audio,
+                zone.get('unauthorized_pause', (0.5, 1)), zone.get('warning_delay', 3), zone.get('alarm_delay', 5),
+                self.journal))
+        # Voice commands ('arm'/'disarm') apply to every zone
+        self.voice = None
+        if 'voice' in config:
+            from keywordspot import CommandListener
+            listener = CommandListener(config['voice']['model_path'], config['voice'].get('commands'))
+            self.voice = VoicePipeline.from_listener(listener)
+
+        signal.signal(signal.SIGINT, self._exit)
+        signal.signal(signal.SIGTERM, self._exit)
+        logging.info(f"Zone manager started with {len(self.zones)} zones: {', '.join(z['name'] for z in self.zones)}")
+
+    async def run_async(self):
+        await run_machines(self.machines, self.gpio, self.pir_bouncetime, self.voice)
+
+    def run(self):
+        try:
+            asyncio.run(self.run_async())
+        finally:
+            self.shutdown()
+
+    def _exit(self, signum=None, frame=None):
+        # Unwinds asyncio.run() so run() reaches shutdown()
+        sys.exit(0)
+
+    def shutdown(self):
+        logging.info("Shutting down zone manager...")
+        self.audio.stop()
+        self.leds.stop()
+        for led_pwm in self.led_pwms:
+            led_pwm.stop()
+        self.gpio.cleanup()
+        pygame.mixer.quit()
+        self.journal.close()
+
+
+if __name__ == "__main__":
+    ZoneManager('config.json').run()